@@ -1,75 +1,234 @@
 from __future__ import print_function
 
+from   concurrent.futures import ProcessPoolExecutor
 import datetime
 from   functools import partial
 import logging
 import logging.config
 import os
-import time
 
-from   core import Config, Strategy, execute_signal
+import charts as chart_renderer
+from   core import Config
 from   coroutines import initial_breakout, time_based, stop_loss, stop_profit
-from   data_providers import gen_csv_data, gen_time_series
-from   positions import Pnl
+from   data_providers import gen_csv_data
+from   positions import Pnl, aggregate
+import profiling
+from   result_cache import ResultCache
+from   session import Session
+import live as live_engine
+import storage
 import utils
-import pandas as pd
+import vectorized as vector_engine
 
-def run( configs, live=False, specific_day=None, cash=25000, commission=0, interval=1, save_charts=True ):
+def run( configs, live=False, specific_day=None, cash=25000, commission=0, interval=1, save_charts=True, vectorized=False, charts=True, session=None, merge=False, bar_size=None, partial_bars=False,
+         window=None, profile=None, share_rules=False ):
     ''' main event loop 
 
         if 'live' mode is False, we're testing and running against previously recorded data.
+        Live mode runs on the asyncio event loop in live.py, polling every 'interval' minutes, until Ctrl-C.
         The 'specific_day' argument allows to run against a specific pre-recorded day. By default, all data is replayed
+        The 'vectorized' argument runs the test with the vectorized engine, when all the rules are built-in ones
+        With 'charts' set to False no charts are saved or shown at all
+        The 'session' argument is the Session to run in; by default the run books into the Pnl singleton.
+        Runs in separate sessions are independent and can run concurrently.
+        With 'merge' the symbols are replayed in time_stamp order (see Session.replay) instead of round-robin.
+        With 'bar_size' ( '1s', '1m', '5m' ) ticks or second level data are aggregated into bars of that size, and 
+        the rules only run on complete bars - or on every update of the bar in progress, with 'partial_bars'.
+        With 'window' the rules see the last 'window' points of the day only; live, this is the bounded memory mode
+        for long running sessions, see live.run_async.
+        With 'profile' the time spent in each stage of the tick path and in each rule is measured (see profiling.py),
+        and the table is logged with the report - or written to the JSON file 'profile' names. Profiled runs use
+        the tick loop, even with 'vectorized'.
+        With 'share_rules' the configs on a symbol share their identical rules, which run once per point instead of
+        once per config, with the same results (see rule_graph.py). The vectorized engine ignores it.
     '''
-    if not live:
-        interval = 0 # no need to sleep when testing
-        gen_test_data = partial( gen_csv_data, specific_day=specific_day ) # pass the specific_day argument to the coroutine
-        dataProvider=gen_test_data
-        charts_folder=os.path.join('charts', 'testing')
+    if live:
+        return live_engine.run( configs, cash=cash, commission=commission, interval=interval, save_charts=save_charts, charts=charts, session=session,
+                                bar_size=bar_size, partial_bars=partial_bars, window=window )
+
+    if session is None:
+        session = Session( Pnl() )
+    if profile and session.profiler is None:
+        session.profiler = profiling.Profiler()
+
+    if vectorized and not profile:
+        if vector_engine.supports( configs ) and not partial_bars:
+            return vector_engine.run( configs, specific_day=specific_day, cash=cash, commission=commission, save_charts=save_charts, charts=charts, session=session,
+                                      merge=merge, bar_size=bar_size )
+        logging.info( 'Custom rules found, falling back to the tick loop' )
+
+    gen_test_data = partial( gen_csv_data, specific_day=specific_day, bar_size=bar_size, partial=partial_bars ) # pass the specific_day argument to the coroutine
+    charts_folder=os.path.join('charts', 'testing')
+
+    session.open( configs, gen_test_data, cash, commission, keep_points=charts, window=window, share_rules=share_rules )
+    if merge:
+        session.replay()
     else:
-        dataProvider=gen_time_series
-        charts_folder = os.path.join('charts', 'live')
-
-    pnl = Pnl()
-    pnl.initialize( configs, cash, commission )
-
-    strategies = [ Strategy( config, dataProvider, pnl, live=live ) for config in configs ]
-
-    while True:
-        active_strategies = [ strategy for strategy in strategies if strategy.active ]
-        if not active_strategies:
-            logging.debug( 'All Done!' )
-            logging.info( pnl.get_report() )
-            utils.plot( pnl, save_charts, specific_day is None, charts_folder )
-            break # we're done
-        
-        for strategy in active_strategies:
-            signal = strategy.tick()
-            if signal:
-                trade = execute_signal( signal )
-                if trade:
-                    pnl.handle_fill( trade )
-
-                
-        time.sleep( interval * 60 )
-
-def run_dates (configs, save_charts):
-    '''Process one day at a time, export and combine charts'''
+        session.process() # no need to sleep when testing
+
+    logging.debug( 'All Done!' )
+    report = session.pnl.get_report()
+    logging.info( report )
+    if profile:
+        if isinstance( profile, str ):
+            session.profiler.write( profile )
+        else:
+            logging.info( '\n{}'.format( session.profiler.table() ) )
+    if charts:
+        utils.plot( session.pnl, save_charts, specific_day is None, charts_folder )
+    return report
+
+def run_days( configs, dates, cash=25000, commission=0, save_charts=True, charts=True, session=None, trades=None, merge=False, bar_size=None, partial_bars=False,
+              share_rules=False ):
+    ''' Replay several days in a single pass. Strategies and feeds are built once and each symbol's data is read once
+        through its column cache, one day slice at a time. Per-day state (rules, strategies, cash and positions) is
+        reset at every day boundary, so each day produces the same report and charts as a separate run() for that day.
+
+        Returns a list of ( date, PnlReport ) tuples. See run_dates() for 'trades' and run() for 'merge', 'bar_size', 'partial_bars' and 'share_rules'.
+    '''
+    charts_folder = os.path.join('charts', 'testing')
+    if session is None:
+        session = Session( Pnl() )
+    session.open( configs, lambda symbol: iter( () ), cash, commission, keep_points=charts, share_rules=share_rules ) # data is set per day below
+
+    reports = []
+    for day in dates:
+        session.pnl.initialize( configs, cash, commission, keep_points=charts )
+        for strategy in session.strategies:
+            strategy.config.reset()
+        for symbol, feed in session.feeds.items():
+            feed.reset( gen_csv_data( symbol, specific_day=day, bar_size=bar_size, partial=partial_bars ) )
+
+        if merge:
+            session.replay()
+        else:
+            session.process()
+
+        logging.debug( 'All Done!' )
+        report = session.pnl.get_report()
+        logging.info( report )
+        if charts:
+            utils.plot( session.pnl, save_charts, False, charts_folder )
+        _log_trades( trades, day, session.pnl )
+        reports.append( ( day, report ) )
+    return reports
+
+def run_dates (configs, save_charts, single_pass=False, cash=25000, commission=0, vectorized=False, charts=True, session=None, workers=None, trades=None, merge=False, bar_size=None, partial_bars=False,
+               share_rules=False, cache=None):
+    '''Process one day at a time, export and combine charts.
+
+       Every day starts from fresh copies of the rules, so days don't depend on each other.
+       With 'single_pass' the days are replayed by run_days() instead of one run() call per day.
+       With 'vectorized' each day is run by the vectorized engine, if it supports the configs.
+       With 'charts' set to False no charts are saved, shown or combined.
+       The 'session' argument is the Session the days run in, see run(). 
+       With 'workers' above 1 the dates are split into contiguous shards, which run in that many processes, each
+       in its own session; the rules have to be created by @coroutine factories so the configs can be sent over.
+       When 'trades' is a list, ( date, symbol, buys, sells ) is appended to it for every day and symbol.
+       With 'merge' the symbols are replayed in time_stamp order, 'bar_size' and 'partial_bars' aggregate the data into bars, 
+       'share_rules' runs the identical rules of the configs once per point, see run().
+       With 'cache' (True for data/cache/results, or a ResultCache) the days whose configs, settings and data haven't
+       changed since they were cached load their reports and trades from disk instead of running; their charts
+       aren't drawn again. See result_cache.py.
+       Returns the per-day ( date, PnlReport ) list and the aggregate PnlReport.
+    '''
     charts_folder=os.path.join('charts', 'testing') 
-    dates = get_dates( configs[0].symbol )
-    for specific_day in dates:
-        run( configs, live = False, specific_day = datetime.datetime.combine(specific_day, datetime.datetime.min.time()), save_charts = save_charts )
-        if (len(configs)) > 1 & save_charts:
-            utils.combine_charts(charts_folder, combine_pattern = specific_day)                    
+    dates = [datetime.datetime.combine(specific_day, datetime.datetime.min.time()) for specific_day in get_dates( configs[0].symbol )]
+    options = dict( single_pass=single_pass, cash=cash, commission=commission, save_charts=save_charts, vectorized=vectorized, charts=charts, merge=merge, bar_size=bar_size, partial_bars=partial_bars,
+                    share_rules=share_rules )
+    if cache:
+        cache = cache if isinstance( cache, ResultCache ) else ResultCache()
+        keys = cache.keys( configs, dates, cash=cash, commission=commission, merge=merge, bar_size=bar_size, partial_bars=partial_bars ) or dict.fromkeys( dates )
+        cached = { day: cache.get( keys[ day ], day ) for day in dates if keys[ day ] }
+        cached = { day: result for day, result in cached.items() if result is not None }
+        to_run, day_trades = [ day for day in dates if day not in cached ], []
+    else:
+        to_run, day_trades = dates, trades
+
+    with chart_renderer.batch(): # render the days' charts in parallel, all written before they're combined
+        if not to_run:
+            reports = []
+        elif workers and workers > 1 and len( to_run ) > 1:
+            reports = _run_sharded( configs, to_run, workers, options, day_trades )
+        else:
+            reports = _run_shard( configs, to_run, session=session, trades=day_trades, **options )
+
+    if cache:
+        reports = _cached_reports( cache, keys, cached, reports, day_trades, trades )
+
+    save_charts = save_charts and charts
+    if len(configs) > 1 and save_charts:
+        for specific_day in dates:
+            utils.combine_charts(charts_folder, combine_pattern = specific_day.date())
     if (save_charts):
         for eachconfig in configs:
             utils.combine_charts(charts_folder, combine_pattern = eachconfig.symbol)
 
+    reports = [ (specific_day.date(), report) for specific_day, report in reports ]
+    total = aggregate( [ report for _, report in reports ] )
+    logging.info( 'Total: {}'.format( total ) )
+    return reports, total
+
+def _run_shard( configs, dates, single_pass, cash, commission, save_charts, vectorized, charts, merge, bar_size, partial_bars, share_rules, session=None, trades=None ):
+    ''' run_dates() for a run of dates, in this process '''
+    if session is None:
+        session = Session( Pnl() )
+    if single_pass and not vectorized:
+        return run_days( configs, dates, cash=cash, commission=commission, save_charts=save_charts, charts=charts, session=session, trades=trades, merge=merge,
+                         bar_size=bar_size, partial_bars=partial_bars, share_rules=share_rules )
+
+    reports = []
+    for specific_day in dates:
+        for config in configs:
+            config.reset()
+        report = run( configs, live = False, specific_day = specific_day, cash = cash, commission = commission, save_charts = save_charts, vectorized = vectorized, charts = charts, session = session, merge = merge, bar_size = bar_size, partial_bars = partial_bars, share_rules = share_rules )
+        _log_trades( trades, specific_day, session.pnl )
+        reports.append( ( specific_day, report ) )
+    return reports
+
+def _run_sharded( configs, dates, workers, options, trades ):
+    ''' run_dates() over a process pool: shards of dates go out, their reports and trades come back in date order '''
+    for config in configs:
+        storage.load( config.symbol ) # bring the caches up to date once, before the workers map them
+
+    # a few shards per worker keeps the pool busy when some days take longer than others
+    shard_size = max( 1, len( dates ) // ( 4 * workers ) )
+    shards = [ dates[ i:i + shard_size ] for i in range( 0, len( dates ), shard_size ) ]
+    with ProcessPoolExecutor( max_workers=workers ) as executor:
+        results = list( executor.map( _run_worker, [ configs ] * len( shards ), shards, [ options ] * len( shards ) ) )
+
+    reports = []
+    for shard_reports, shard_trades in results:
+        reports.extend( shard_reports )
+        if trades is not None:
+            trades.extend( shard_trades )
+    return reports
+
+def _run_worker( configs, dates, options ):
+    chart_renderer.workers = 0 # the worker processes render their charts themselves
+    trades = []
+    return _run_shard( configs, dates, session=Session(), trades=trades, **options ), trades
+
+def _cached_reports( cache, keys, cached, reports, day_trades, trades ):
+    ''' store the days just run, and merge them with the cached ones: reports and trades in date order '''
+    for day, report in reports:
+        result = ( report, [ trade for trade in day_trades if trade[ 0 ] == day.date() ] )
+        if keys[ day ]:
+            cache.put( keys[ day ], day, *result )
+        cached[ day ] = result
+    days = sorted( cached )
+    if trades is not None:
+        trades.extend( trade for day in days for trade in cached[ day ][ 1 ] )
+    logging.info( 'Loaded {} of {} days from the result cache'.format( len( days ) - len( reports ), len( days ) ) )
+    return [ ( day, cached[ day ][ 0 ] ) for day in days ]
+
+def _log_trades( trades, day, pnl ):
+    if trades is not None:
+        trades.extend( ( day.date(), symbol, list( position.buys ), list( position.sells ) ) for symbol, position in pnl.positions.items() )
+
 def get_dates (symbol):
-    '''Get unique dates from symbol CSV'''
-    df = pd.read_csv(os.path.join('data', symbol + '.csv'), header=None, index_col=0)
-    df.index = pd.to_datetime(df.index, format='%Y-%m-%d %H:%M:%S')
-    df['date'] = df.index.date     
-    return df['date'].unique()
+    '''Get unique dates from symbol CSV, read from the date index of its column cache'''
+    return storage.load(symbol).dates()
           
 if __name__ == '__main__':
     # init logging
@@ -0,0 +1,61 @@
+''' Loader benchmark: builds the column cache of a synthetic 1M-row csv with the per-row strptime parser the
+    cache used to be built with, then with the chunked, vectorized parser, and reports the speedup.
+
+    Usage: python benchmarks/bench_loader.py [rows]
+'''
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+import numpy as np
+
+import storage
+
+
+def write_csv( path, rows ):
+    start = datetime.datetime( 2020, 1, 2, 9, 30 )
+    prices = 100 + np.cumsum( np.random.RandomState( 0 ).normal( 0, 0.05, rows ) )
+    with open( path, 'w' ) as f:
+        for i in range( rows ):
+            f.write( '{:%Y-%m-%d %H:%M:%S},{:.2f}\n'.format( start + datetime.timedelta( seconds=5 * i ), prices[ i ] ) )
+
+def parse_per_row( source ):
+    ''' the loader before: strptime and float() on every row '''
+    time_stamps, prices = [], []
+    with open( source, 'rb' ) as f:
+        for line in f:
+            if line.strip():
+                time_stamp, price = storage.parse_row( line )
+                time_stamps.append( time_stamp )
+                prices.append( price )
+    return np.array( time_stamps, dtype=np.int64 ), np.array( prices, dtype=np.float64 )
+
+def timed( func, *args ):
+    started = time.perf_counter()
+    result = func( *args )
+    return time.perf_counter() - started, result
+
+def main( rows=1000000 ):
+    folder = tempfile.mkdtemp()
+    try:
+        write_csv( os.path.join( folder, 'BENCH.csv' ), rows )
+        store = storage.ColumnStore( 'BENCH', folder )
+
+        before, ( time_stamps, prices ) = timed( parse_per_row, store.source )
+        after, store = timed( store.open )
+
+        assert np.array_equal( time_stamps, store.time_stamps ) and np.array_equal( prices, store.prices )
+        print( '{:,} rows'.format( rows ) )
+        print( 'per-row parse:    {:7.3f}s'.format( before ) )
+        print( 'vectorized build: {:7.3f}s (parse, index and cache files)'.format( after ) )
+        print( 'speedup:          {:7.1f}x'.format( before / after ) )
+    finally:
+        shutil.rmtree( folder )
+
+if __name__ == '__main__':
+    main( *[ int( arg ) for arg in sys.argv[ 1: ] ] )
@@ -0,0 +1,204 @@
+''' Benchmarks of the backtest hot paths, on synthetic data from generate_test_data ( symbols x days ).
+
+    Measures:
+        tick_rate       - Feed.tick() points per second, through the tick loop of a Session
+        loader_rate     - gen_csv_data() points per second, from the column cache
+        cache_build     - seconds to build the column caches of all the csv files
+        run             - app.run() seconds, all the data in one go
+        run_dates       - app.run_dates() seconds, one day at a time
+        peak_memory     - peak traced memory of app.run(), in MB
+        chart_render    - seconds to render one day chart, in process
+
+    Every measurement is the best of 'repeat' runs. Results are written as JSON; with --baseline they're compared
+    against an earlier results file and the run fails when a measurement got worse by more than --tolerance.
+
+    Usage: python benchmarks/bench_suite.py [--symbols 4] [--days 20] [--repeat 3] [--out results.json]
+                                            [--baseline baseline.json] [--tolerance 0.1]
+'''
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+import numpy as np
+
+import app
+import charts
+from   core import Config
+from   coroutines import initial_breakout, time_based, stop_loss, stop_profit
+from   data_providers import gen_csv_data
+from   generate_test_data import generate_multi_day_data, save_to_csv
+from   session import Session
+import storage
+
+# name -> ( unit, higher is better )
+METRICS = {
+    'tick_rate':    ( 'points/s', True ),
+    'loader_rate':  ( 'points/s', True ),
+    'cache_build':  ( 's', False ),
+    'run':          ( 's', False ),
+    'run_dates':    ( 's', False ),
+    'peak_memory':  ( 'MB', False ),
+    'chart_render': ( 's', False ),
+}
+
+
+def make_data( symbols, days, seed=42 ):
+    ''' data/<symbol>.csv for 'symbols' symbols over 'days' calendar days, in the current directory.
+        Returns the symbols and the number of points
+    '''
+    random.seed( seed )
+    names, points = [ 'SYM{}'.format( i ) for i in range( symbols ) ], 0
+    for name in names:
+        prices = generate_multi_day_data( name, num_days=days )
+        with contextlib.redirect_stdout( io.StringIO() ):
+            save_to_csv( name, prices, data_dir='data' )
+        points += len( prices )
+    return names, points
+
+def make_configs( symbols ):
+    return [ Config( symbol=symbol, equity_pct=0.9 / len( symbols ),
+                     entry_rules=[initial_breakout(30)],
+                     exit_rules =[time_based(15,55), stop_loss(0.005), stop_profit(0.005)] ) for symbol in symbols ]
+
+def best( func, repeat ):
+    ''' smallest wall time of 'repeat' calls '''
+    times = []
+    for _ in range( repeat ):
+        started = time.perf_counter()
+        func()
+        times.append( time.perf_counter() - started )
+    return min( times )
+
+def tick_loop( symbols ):
+    ''' every point of every symbol through Feed.tick(), returns the number of ticks '''
+    session = Session().open( make_configs( symbols ), gen_csv_data, keep_points=False )
+    ticks = 0
+    for feed in session.feeds.values():
+        while feed.active:
+            for signal in feed.tick():
+                session.execute( signal )
+            ticks += 1
+    return ticks - len( session.feeds ) # the last tick of each one only finds the end of the data
+
+def load_all( symbols ):
+    return sum( 1 for symbol in symbols for _ in gen_csv_data( symbol ) )
+
+def build_caches( symbols ):
+    for symbol in symbols:
+        store = storage.ColumnStore( symbol )
+        store.build( store.source_stamp() )
+
+def peak_memory( symbols ):
+    tracemalloc.start()
+    try:
+        app.run( make_configs( symbols ), charts=False )
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+def chart_render( symbols, repeat ):
+    ''' seconds per day chart, rendered in this process '''
+    day = datetime.datetime.combine( app.get_dates( symbols[0] )[0], datetime.time() )
+    session = Session()
+    app.run( make_configs( symbols ), specific_day=day, charts=False, session=session )
+    session.open( make_configs( symbols ), lambda symbol: gen_csv_data( symbol, day ) ).process()
+
+    workers, charts.workers = charts.workers, 0
+    try:
+        return best( lambda: charts.plot( session.pnl, True, False, os.path.join( 'charts', 'bench' ) ), repeat ) / len( symbols )
+    finally:
+        charts.workers = workers
+
+def measure( symbols=4, days=20, repeat=3 ):
+    ''' run all the benchmarks in a scratch directory, returns the results dict '''
+    cwd, folder = os.getcwd(), tempfile.mkdtemp()
+    logging.disable( logging.CRITICAL )
+    os.chdir( folder )
+    try:
+        names, points = make_data( symbols, days )
+        values = {}
+        values[ 'cache_build' ] = best( lambda: build_caches( names ), repeat )
+
+        ticks = tick_loop( names ) # warm up, and count the ticks
+        values[ 'tick_rate' ]   = ticks / best( lambda: tick_loop( names ), repeat )
+        values[ 'loader_rate' ] = points / best( lambda: load_all( names ), repeat )
+        values[ 'run' ]         = best( lambda: app.run( make_configs( names ), charts=False ), repeat )
+        values[ 'run_dates' ]   = best( lambda: app.run_dates( make_configs( names ), save_charts=False, charts=False ), repeat )
+        values[ 'peak_memory' ] = peak_memory( names )
+        values[ 'chart_render' ] = chart_render( names, repeat )
+    finally:
+        os.chdir( cwd )
+        shutil.rmtree( folder )
+        logging.disable( logging.NOTSET )
+
+    return {
+        'meta': { 'symbols': symbols, 'days': days, 'points': points, 'ticks': ticks, 'repeat': repeat,
+                  'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.platform(),
+                  'date': datetime.datetime.now().isoformat( timespec='seconds' ) },
+        'results': { name: { 'value': value, 'unit': METRICS[ name ][0], 'higher_is_better': METRICS[ name ][1] }
+                     for name, value in values.items() },
+    }
+
+def compare( results, baseline, tolerance=0.1 ):
+    ''' [ ( name, baseline value, value, change, regressed ) ] for the measurements found in both.
+        'change' is the relative change, positive when better; a regression is a change below -tolerance
+    '''
+    rows = []
+    for name, result in sorted( results[ 'results' ].items() ):
+        before = baseline[ 'results' ].get( name )
+        if not before or not before[ 'value' ]:
+            continue
+        change = ( result[ 'value' ] - before[ 'value' ] ) / before[ 'value' ]
+        if not result[ 'higher_is_better' ]:
+            change = -change
+        rows.append( ( name, before[ 'value' ], result[ 'value' ], change, change < -tolerance ) )
+    return rows
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Benchmarks of the backtest hot paths' )
+    parser.add_argument( '--symbols', type=int, default=4 )
+    parser.add_argument( '--days', type=int, default=20, help='calendar days of data, weekends are skipped' )
+    parser.add_argument( '--repeat', type=int, default=3 )
+    parser.add_argument( '--out', default='benchmark_results.json' )
+    parser.add_argument( '--baseline', help='results file to compare against' )
+    parser.add_argument( '--tolerance', type=float, default=0.1, help='relative slowdown flagged as a regression' )
+    args = parser.parse_args( argv )
+
+    results = measure( args.symbols, args.days, args.repeat )
+    with open( args.out, 'w' ) as f:
+        json.dump( results, f, indent=2 )
+
+    meta = results[ 'meta' ]
+    print( '{symbols} symbols x {days} days, {points:,} points'.format( **meta ) )
+    for name, result in sorted( results[ 'results' ].items() ):
+        print( '{:14} {:>14,.3f} {}'.format( name, result[ 'value' ], result[ 'unit' ] ) )
+    print( 'written to {}'.format( args.out ) )
+
+    if not args.baseline:
+        return 0
+    with open( args.baseline ) as f:
+        baseline = json.load( f )
+    if ( baseline[ 'meta' ][ 'symbols' ], baseline[ 'meta' ][ 'days' ] ) != ( meta[ 'symbols' ], meta[ 'days' ] ):
+        print( 'warning: the baseline ran on {symbols} symbols x {days} days'.format( **baseline[ 'meta' ] ) )
+
+    rows = compare( results, baseline, args.tolerance )
+    print( '\ncompared to {}'.format( args.baseline ) )
+    for name, before, after, change, regressed in rows:
+        print( '{:14} {:>14,.3f} -> {:>14,.3f} {:+7.1%}{}'.format( name, before, after, change, '  REGRESSION' if regressed else '' ) )
+    return 1 if any( row[ -1 ] for row in rows ) else 0
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -0,0 +1,226 @@
+''' Chart rendering.
+
+    Day charts are rendered on a process pool, which is shut down once they're written; a lone chart renders in the
+    calling process. Every chart is a small HTML document holding one figure, which loads
+    plotly.js from a single plotly.min.js next to it instead of embedding its own copy of the bundle.
+    combine() gathers the figures of many chart files into one HTML document.
+
+    Inside a batch() renders are queued and only waited for when the batch ends, so the charts of many days render
+    in parallel; outside of one every plot() waits for its own charts.
+'''
+from   concurrent.futures import ProcessPoolExecutor
+from   contextlib import contextmanager
+import datetime
+import glob
+import logging
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+from   plotly.offline import get_plotlyjs
+
+PLOTLY_JS      = 'plotly.min.js'
+FIGURE_START   = '<!-- figure -->'
+FIGURE_END     = '<!-- /figure -->'
+DOCUMENT       = '''<html>
+<head><meta charset="utf-8" /><title>{title}</title><script src="''' + PLOTLY_JS + '''"></script></head>
+<body>
+{figures}
+</body>
+</html>
+'''
+
+workers    = None # rendering processes: None for one per cpu, 0 to render in the calling process
+max_points = 4000 # price points per chart, see downsample(); None to plot every point
+
+_executor = None
+_queued   = [] # jobs not sent to the pool yet
+_pending  = []
+_batches  = 0
+
+
+def figure( symbol, date, time_stamps, prices, buys, sells, pnl, qty, points=None ):
+    ''' day chart: prices, with buy and sell markers at the prices of the trades' time stamps.
+        Long price series are downsampled to about 'points' (default: max_points),
+        the points of the trades are always kept
+
+        Arguments:
+        ---------
+            date        - datetime.date of the day
+            time_stamps - datetime64 array of the price points' time stamps
+            prices      - array of prices
+            buys        - list of ( 'YYYY-MM-DD HH:MM:SS', desc ) buy trades
+            sells       - list of ( 'YYYY-MM-DD HH:MM:SS', desc ) sell trades
+    '''
+    fig = go.Figure()
+    traded = []
+    for name, trades, position, color, symbol_marker in ( ( 'Buy', buys, 'bottom center', 'green', 'triangle-up' ),
+                                                          ( 'Sell', sells, 'top center', 'red', 'triangle-down' ) ):
+        index, text = _markers( time_stamps, trades )
+        x, y = time_stamps[ index ], prices[ index ]
+        traded.append( index )
+        fig.add_trace(go.Scatter(x=x, y=y,
+                            mode='markers+text',
+                            marker_size=15,
+                            name=name,
+                            text=text,
+                            textposition=position,
+                            marker=dict(color=color, symbol=symbol_marker)))
+    kept = downsample( prices, points or max_points, np.concatenate( traded ) )
+    fig.add_trace(go.Scatter(x=time_stamps[ kept ], y=prices[ kept ],
+                        mode='lines',
+                        name='Prices',
+                        line=dict(color='rgb(107,105,172)')))
+
+    fig.update_layout(
+        title="{}    Date: {}, PnL: ${}, Size: {}".format( symbol, date, int(pnl), int(qty) ),
+        xaxis_title="Time",
+        yaxis_title="Price",
+        showlegend=False
+    )
+    return fig
+
+def downsample( prices, target, keep=() ):
+    ''' Min/max bucketing: sorted indices of about 'target' points that keep the shape of the series.
+        The series is cut into target / 2 buckets and the lowest and the highest price of each are kept, so every
+        spike survives, along with the first and last points and the indices in 'keep'.
+    '''
+    count = len( prices )
+    if not target or count <= target:
+        return np.arange( count )
+    buckets = max( target // 2, 1 )
+    size    = -( -count // buckets )
+    offsets = np.arange( 0, buckets * size, size )
+    lows    = _buckets( prices, buckets, size, np.inf ).argmin( axis=1 ) + offsets
+    highs   = _buckets( prices, buckets, size, -np.inf ).argmax( axis=1 ) + offsets
+    index   = np.unique( np.concatenate( [ [ 0, count - 1 ], lows, highs, np.asarray( keep, dtype=np.int64 ) ] ) )
+    return index[ index < count ] # buckets made of padding only
+
+def write( fig, filename ):
+    ''' save the figure as a chart file that loads the shared plotly.min.js '''
+    folder = os.path.dirname( filename )
+    _write_plotlyjs( folder )
+    div = fig.to_html( full_html=False, include_plotlyjs=False )
+    _write( filename, DOCUMENT.format( title=os.path.basename( filename ), figures=FIGURE_START + div + FIGURE_END ) )
+
+def render( job ):
+    ''' figure() and write() in one go, for the process pool: job is ( filename, figure() arguments ) '''
+    filename, args = job
+    write( figure( *args ), filename )
+    return filename
+
+def plot( pnl, save, is_multiday, charts_folder, history=None ):
+    ''' Plot buys and sells for each each position, if running for a single day.
+        If 'save' is set the charts are rendered to charts_folder/<date>_<symbol>.html, otherwise they're shown.
+        The prices are the positions' all_points, or 'history( symbol )' - ( time stamps, prices ) arrays - if given.
+    '''
+    if is_multiday:
+        return
+    for symbol, position in pnl.positions.items():
+        if history is not None:
+            time_stamps, prices = history( symbol )
+            time_stamps = np.asarray( time_stamps ).astype( 'datetime64[us]' )
+        else:
+            time_stamps = np.array( [ point[0] for point in position.all_points ], dtype='datetime64[us]' )
+            prices      = np.array( [ point[1] for point in position.all_points ], dtype=np.float64 )
+        if not len( prices ):
+            continue # no data for the symbol, nothing to plot
+        date        = time_stamps[ -1 ].astype( datetime.datetime ).date()
+        args = ( symbol, date, time_stamps, prices, list( position.buys ), list( position.sells ), position.realized_pl + position.mtm_pl, position.total_qty,
+                 max_points ) # resolved here: the rendering processes don't see changes to the setting
+        if save:
+            submit( ( os.path.abspath( os.path.join( charts_folder, '{}_{}.html'.format( date, symbol ) ) ), args ) )
+        else:
+            figure( *args ).show()
+    if not _batches:
+        wait()
+
+def submit( job ):
+    ''' queue a render() job. The pool only starts once there's a second job to render alongside the first '''
+    global _executor
+    if workers == 0:
+        render( job )
+        return
+    _queued.append( job )
+    if len( _queued ) + len( _pending ) > 1:
+        if _executor is None:
+            _executor = ProcessPoolExecutor( max_workers=workers )
+        _pending.extend( _executor.submit( render, queued ) for queued in _queued )
+        del _queued[:]
+
+def wait():
+    ''' block until the queued charts are written, then shut the process pool down '''
+    global _executor, _pending
+    jobs, futures, _pending = list( _queued ), _pending, []
+    del _queued[:]
+    try:
+        for job in jobs: # a lone job: not worth starting the pool
+            render( job )
+        for future in futures:
+            future.result()
+    finally:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+@contextmanager
+def batch():
+    ''' queue the charts plotted inside, and wait for all of them at the end '''
+    global _batches
+    _batches += 1
+    try:
+        yield
+    finally:
+        _batches -= 1
+        if not _batches:
+            wait()
+
+def combine( directory, combine_pattern ):
+    ''' Combine the charts in a directory whose file names contain the pattern into one document,
+        <pattern>_combined.html, with all their figures
+    '''
+    outfilename = os.path.join( directory, '{}_combined.html'.format( combine_pattern ) )
+    figures = []
+    for filename in sorted( glob.glob( os.path.join( directory, '*{}*.html'.format( combine_pattern ) ) ) ):
+        if filename.endswith( '_combined.html' ):
+            continue
+        with open( filename ) as f:
+            content = f.read()
+        start, end = content.find( FIGURE_START ), content.rfind( FIGURE_END )
+        if start < 0 or end < 0:
+            logging.debug( 'Skipping {}, not a chart file'.format( filename ) )
+            continue
+        figures.append( content[ start:end + len( FIGURE_END ) ] )
+
+    _write_plotlyjs( directory )
+    _write( outfilename, DOCUMENT.format( title=combine_pattern, figures='\n'.join( figures ) ) )
+    return outfilename
+
+def _markers( time_stamps, trades ):
+    # indices of the trades' time stamps in the series, and their descriptions
+    if not trades:
+        return np.empty( 0, dtype=np.int64 ), []
+    at = np.array( [ time_stamp for time_stamp, _ in trades ], dtype=time_stamps.dtype )
+    index = np.minimum( np.searchsorted( time_stamps, at ), len( time_stamps ) - 1 )
+    found = time_stamps[ index ] == at
+    return index[ found ], [ desc for ( _, desc ), ok in zip( trades, found ) if ok ]
+
+def _buckets( prices, buckets, size, pad ):
+    padded = np.full( buckets * size, pad )
+    padded[ :len( prices ) ] = prices
+    return padded.reshape( buckets, size )
+
+def _write_plotlyjs( folder ):
+    path = os.path.join( folder, PLOTLY_JS )
+    if not os.path.exists( path ):
+        _write( path, get_plotlyjs() )
+
+def _write( path, text ):
+    # write next to the target and swap it in: several processes may write the same file
+    folder = os.path.dirname( path )
+    if folder:
+        os.makedirs( folder, exist_ok=True )
+    tmp = '{}.{}.tmp'.format( path, os.getpid() )
+    with open( tmp, 'w', encoding='utf-8' ) as f:
+        f.write( text )
+    os.replace( tmp, path )
@@ -4,27 +4,134 @@ import datetime
 import logging
 import time
 
+import coroutines
 from   coroutines import time_based
 from   custom import submit_order
 from   positions import Pnl
+import profiling
+from   rule_graph import RuleGraph
 import utils 
+import numpy as np
 import pandas as pd
 
 Point = namedtuple( 'Point', ['time_stamp', 'price'] )
 
 
-class Strategy( object ):
-    
-    def __init__( self, config, dataProvider, pnl, live=False ):
-        self.time_series = dataProvider( config.symbol )
-        self.config      = config
-        self.in_position = False
-        self.active      = True
-        self.eod_exit    = time_based( 15, 59 ) # end-of-day exit hard-coded rule
-        self.pnl         = pnl
-        self.live        = live # are we running in Live mode or in Test mode?
-        self.all_points  = []
-        self.curr_date   = datetime.datetime( 1900, 1, 1 ).date()
+class Bar( namedtuple( 'Bar', ['time_stamp', 'price', 'open', 'high', 'low', 'volume'] ) ):
+    ''' OHLCV bar, time stamped with the start of its period. 'price' is the close, so a Bar goes wherever a Point does '''
+    __slots__ = ()
+
+    @property
+    def close( self ):
+        return self.price
+
+
+class PriceBuffer( object ):
+    ''' Append-only, array-backed buffer of the day's price points.
+
+        Storage is preallocated and doubles when full, so appends are amortized O(1).
+        view() hands out a zero-copy snapshot of what has been appended so far.
+
+        With 'window' the buffer is a fixed-size ring of the last 'window' points instead. Every point is written
+        twice, 'window' slots apart, so the window is always one contiguous slice and views stay zero-copy;
+        a view only holds until the next append though, which overwrites its oldest point.
+    '''
+    def __init__( self, capacity=512, window=None ):
+        self.capacity = capacity
+        self.window   = window
+        self.reset()
+
+    def reset( self ):
+        ''' start a new day - fresh arrays, so views handed out earlier stay intact '''
+        capacity = 2 * self.window if self.window else self.capacity
+        self.time_stamps = np.empty( capacity, dtype='datetime64[us]' )
+        self.prices      = np.empty( capacity, dtype=np.float64 )
+        self.size        = 0 # points appended
+
+    def append( self, point ):
+        if self.window:
+            slot = self.size % self.window
+            self.time_stamps[ slot ] = self.time_stamps[ slot + self.window ] = point.time_stamp
+            self.prices[ slot ]      = self.prices[ slot + self.window ]      = point.price
+            self.size += 1
+            return
+        if self.size == len( self.prices ):
+            self._grow()
+        self.time_stamps[ self.size ] = point.time_stamp
+        self.prices[ self.size ]      = point.price
+        self.size += 1
+
+    def view( self ):
+        if self.window and self.size > self.window:
+            start = self.size % self.window
+            return PriceView( self.time_stamps[ start: ], self.prices[ start: ], self.window )
+        return PriceView( self.time_stamps, self.prices, self.size )
+
+    def __len__( self ):
+        return min( self.size, self.window ) if self.window else self.size
+
+    def _grow( self ):
+        capacity = 2 * len( self.prices )
+        time_stamps = np.empty( capacity, dtype=self.time_stamps.dtype )
+        prices      = np.empty( capacity, dtype=self.prices.dtype )
+        time_stamps[ :self.size ] = self.time_stamps[ :self.size ]
+        prices[ :self.size ]      = self.prices[ :self.size ]
+        self.time_stamps = time_stamps
+        self.prices      = prices
+
+
+class PriceView( object ):
+    ''' Read-only window over the first 'size' points of a PriceBuffer. This is the 'df' rules receive.
+
+        'time_stamps' and 'prices' are NumPy views over the buffer (no copies). Anything else - len() aside - 
+        is delegated to a pandas DataFrame with Point._fields columns, which is built on first use only.
+    '''
+    def __init__( self, time_stamps, prices, size ):
+        self.time_stamps = time_stamps[ :size ]
+        self.prices      = prices[ :size ]
+        self._frame      = None
+
+    @property
+    def frame( self ):
+        if self._frame is None:
+            self._frame = pd.DataFrame( { 'time_stamp': self.time_stamps, 'price': self.prices }, columns=Point._fields, copy=False )
+        return self._frame
+
+    def __len__( self ):
+        return len( self.prices )
+
+    def __getitem__( self, key ):
+        return self.frame[ key ]
+
+    def __getattr__( self, name ):
+        # only called for attributes not found on the view itself
+        if name.startswith( '__' ):
+            raise AttributeError( name )
+        return getattr( self.frame, name )
+
+
+NO_SIGNALS = () # returned for the points that raise no signal
+
+class Feed( object ):
+    ''' One symbol's data, shared by all the strategies trading the symbol.
+
+        The feed pulls every point from the symbol's time-series once and does the per-symbol work once - the trading
+        hours filter, the day's price buffer, the live recording and the position's market data update - then each
+        subscribed strategy runs its rules on the point and on the same buffer view. So the cost of the data grows
+        with the number of symbols, not with the number of configs.
+    '''
+    def __init__( self, symbol, time_series, pnl, live=False, window=None, profiler=None, share_rules=False ):
+        ''' 'window' bounds the rules' history: they see the last 'window' points of the day, or all of them by default.
+            With 'share_rules' the identical rules of the subscribers are evaluated once per point, see rule_graph
+        '''
+        self.symbol     = symbol
+        self.pnl        = pnl
+        self.live       = live # are we running in Live mode or in Test mode?
+        self.profiler   = profiler # profiling.Profiler, or None
+        self.prices     = PriceBuffer( window=window )
+        self.strategies = [] # subscribers, in subscription order
+        self.signaled   = [] # the strategies the signals process() last returned came from, in the same order
+        self.graph      = RuleGraph() if share_rules else None
 
         # these could come from config eventually
         start_hour = 9
@@ -37,55 +144,175 @@ class Strategy( object ):
         self.start_time = int(start_hour)*60 + int(start_minute)
         self.end_time   = int(end_hour)*60   + int(end_minute)
 
+        self.reset( time_series )
+
+    def reset( self, time_series ):
+        ''' start over on a new time-series, the subscribers too '''
+        self.time_series = time_series
+        self.active      = True
+        self.curr_date   = datetime.datetime( 1900, 1, 1 ).date()
+        self.prices.reset()
+        for strategy in self.strategies:
+            strategy.reset()
+        self.share_rules()
+
+    def subscribe( self, strategy ):
+        self.strategies.append( strategy )
+
+    def share_rules( self ):
+        ''' with 'share_rules', give the subscribers shared copies of the rules they have in common - the end-of-day
+            exit at least. Call it once they all subscribed
+        '''
+        graph = self.graph
+        if graph is None:
+            return
+        graph.clear()
+        for strategy in self.strategies:
+            for cr in [ strategy.eod_exit ] + strategy.config.entry_rules + strategy.config.exit_rules:
+                graph.add( cr )
+        for strategy in self.strategies:
+            strategy.eod_exit = graph.share( strategy.eod_exit )
+            strategy.config.entry_rules = [ graph.share( cr ) for cr in strategy.config.entry_rules ]
+            strategy.config.exit_rules  = [ graph.share( cr ) for cr in strategy.config.exit_rules ]
+
+    def close( self ):
+        ''' no more data: deactivate the feed and its subscribers '''
+        self.active = False
+        for strategy in self.strategies:
+            strategy.active = False
+
     def tick( self ):
-        ''' get the next data point and process it '''
+        ''' get the next data point and process it. Returns the signals to execute '''
         try:
+            if self.profiler is None:
+                return self.process( next( self.time_series ) )
+            started = profiling.now()
             point = next( self.time_series )
-
-            # skip pre-market and after-market data
-            current_time =  point.time_stamp.hour*60 + point.time_stamp.minute
-
-            if  current_time < self.start_time or current_time >= self.end_time:
-                return None
-
-            if self.curr_date != point.time_stamp.date():
-                self.curr_date = point.time_stamp.date()
-                self.all_points = []
-
-            self.all_points.append( point )
-            df = pd.DataFrame( self.all_points, columns=Point._fields )
-
-            if self.live:
-                utils.save_point( self.config.symbol, point )
-            
-            # track mtm pnl in response to market data changes
-            self.pnl.market_data_update( self.config.symbol, point )
-
-            # default exit at eod, if still in position
-            eod_exit = self.eod_exit.send( (point, df) )
-            if eod_exit and self.in_position:
-                self.in_position = False
-                return eod_exit
-            
-            # apply entry/exit rules
-            if self.in_position:
-                signal = self.config.run_exit_rules( point, df )
-            else:
-                signal = self.config.run_entry_rules( point, df )
-            
-            # if signal is generated - return it for execution    
-            if signal:
-                self.in_position = signal.is_entry                
-                return signal 
+            self.profiler.add( 'data', started )
+            return self.process( point )
 
         except StopIteration:
-            self.active = False
-            logging.debug('{} finished.'.format ( self.config.symbol ) )
+            self.close()
+            logging.debug('{} finished.'.format ( self.symbol ) )
 
         except Exception as ex:
-            # if any exception has occured, the strategy is inactivated
-            self.active = False
-            logging.error( '{} setting active to False.'.format ( self.config.symbol ) )
+            # if any exception has occured, the feed and its strategies are inactivated
+            self.close()
+            logging.error( '{} setting active to False.'.format ( self.symbol ) )
+        return NO_SIGNALS
+
+    def process( self, point ):
+        ''' update the feed with a data point and run the rules of every active subscriber on it.
+            Returns the signals to execute, in subscription order
+        '''
+        profiler = self.profiler
+        if profiler is None:
+            return self._process( point, None )
+        started = profiling.now()
+        signals = self._process( point, profiler )
+        profiler.add( 'process', started )
+        return signals
+
+    def _process( self, point, profiler ):
+        df = self.update( point, profiler )
+        if df is None:
+            return NO_SIGNALS
+        if self.graph is not None:
+            self.graph.tick += 1
+
+        signals = NO_SIGNALS
+        for strategy in self.strategies:
+            if not strategy.active:
+                continue
+            try:
+                signal = strategy.evaluate( point, df, profiler )
+            except Exception:
+                # if any exception has occured, the strategy is inactivated
+                strategy.active = False
+                logging.error( '{} setting active to False.'.format( strategy.config.symbol ) )
+                self.active = any( subscriber.active for subscriber in self.strategies )
+                continue
+            if signal:
+                if signals is NO_SIGNALS:
+                    signals, self.signaled = [], []
+                signals.append( signal )
+                self.signaled.append( strategy ) # the strategies of the signals returned, see Session.step
+        return signals
+
+    def update( self, point, profiler=None ):
+        ''' the per-symbol work on a data point. Returns the rules' df, or None outside of trading hours '''
+        if profiler is not None:
+            started = profiling.now()
+
+        # skip pre-market and after-market data
+        current_time =  point.time_stamp.hour*60 + point.time_stamp.minute
+
+        if  current_time < self.start_time or current_time >= self.end_time:
+            return None
+
+        if self.curr_date != point.time_stamp.date():
+            self.curr_date = point.time_stamp.date()
+            self.prices.reset()
+
+        self.prices.append( point )
+        df = self.prices.view()
+        if profiler is not None:
+            started = profiler.add( 'buffer', started )
+
+        if self.live:
+            utils.save_point( self.symbol, point )
+            if profiler is not None:
+                started = profiler.add( 'record', started )
+
+        # track mtm pnl in response to market data changes
+        self.pnl.market_data_update( self.symbol, point )
+        if profiler is not None:
+            profiler.add( 'pnl', started )
+        return df
+
+class Strategy( object ):
+    ''' A config's rules, run on the points of its symbol's Feed '''
+
+    def __init__( self, config, feed, session=None, rank=0 ):
+        self.config   = config
+        self.feed     = feed
+        self.session  = session # Session the strategy runs in, if any
+        self.rank     = rank # position of the config in the session's configs: signals of a pass execute in that order
+        self.profiler = session.profiler if session is not None else None # profiling.Profiler, or None
+        feed.subscribe( self )
+        self.reset()
+
+    def reset( self ):
+        ''' start over, flat - same state as a freshly built Strategy '''
+        self.in_position = False
+        self.active      = True
+        self.eod_exit    = time_based( 15, 59 ) # end-of-day exit hard-coded rule
+
+    def evaluate( self, point, df, profiler=None ):
+        ''' run the rules on a data point the feed was updated with. Returns the signal to execute, if any '''
+        if profiler is not None:
+            started = profiling.now()
+
+        # default exit at eod, if still in position
+        eod_exit = self.eod_exit.send( (point, df) ) if profiler is None else profiler.send( self.eod_exit, (point, df) )
+        if eod_exit and self.in_position:
+            self.in_position = False
+            if profiler is not None:
+                profiler.add( 'rules', started )
+            return eod_exit
+        
+        # apply entry/exit rules
+        if self.in_position:
+            signal = self.config.run_exit_rules( point, df, profiler )
+        else:
+            signal = self.config.run_entry_rules( point, df, profiler )
+        if profiler is not None:
+            profiler.add( 'rules', started )
+        
+        # if signal is generated - return it for execution    
+        if signal:
+            self.in_position = signal.is_entry                
+            return signal 
 
 
 class Config( object ):
@@ -95,18 +322,37 @@ class Config( object ):
         self.entry_rules = entry_rules
         self.exit_rules  = exit_rules
         self.symbol      = symbol
+
+    def reset( self ):
+        ''' replace the rules with fresh copies, so nothing carries over from earlier runs.
+            Rules that weren't created by a @coroutine factory can't be rebuilt and are kept as they are
+        '''
+        self.entry_rules = [ coroutines.rebuild( cr ) if coroutines.describe( cr ) else cr for cr in self.entry_rules ]
+        self.exit_rules  = [ coroutines.rebuild( cr ) if coroutines.describe( cr ) else cr for cr in self.exit_rules ]
+
+    def __getstate__( self ):
+        # coroutines can't be pickled - send the specs they were built from instead
+        state = dict( self.__dict__ )
+        state[ 'entry_rules' ] = [ coroutines.spec_tree( cr ) for cr in self.entry_rules ]
+        state[ 'exit_rules' ]  = [ coroutines.spec_tree( cr ) for cr in self.exit_rules ]
+        return state
+
+    def __setstate__( self, state ):
+        self.__dict__.update( state )
+        self.entry_rules = [ coroutines.build( spec ) for spec in self.entry_rules ]
+        self.exit_rules  = [ coroutines.build( spec ) for spec in self.exit_rules ]
         
-    def run_exit_rules( self, point, df ):
+    def run_exit_rules( self, point, df, profiler=None ):
         for func in self.exit_rules:
-            result = func.send( (point, df) )
+            result = func.send( (point, df) ) if profiler is None else profiler.send( func, (point, df) )
             if result: # if any exit rule matches
                 result.is_entry = False
                 result.symbol   = self.symbol
                 return result
         
-    def run_entry_rules( self, point, df ):
+    def run_entry_rules( self, point, df, profiler=None ):
         for func in self.entry_rules:
-            result = func.send( (point, df) )
+            result = func.send( (point, df) ) if profiler is None else profiler.send( func, (point, df) )
             if result: # if any entry rule matches
                 result.is_entry = True
                 result.symbol   = self.symbol
@@ -114,7 +360,8 @@ class Config( object ):
                 return result
 
 class Trade( object ):
-    
+    __slots__ = ( 'symbol', 'qty', 'price', 'is_entry', 'time_stamp', 'desc' )
+
     def __init__( self, signal, qty, price ):
         self.symbol     = signal.symbol
         self.qty        = qty
@@ -126,13 +373,11 @@ class Trade( object ):
     def __repr__(self):
         return "<{klass} {attrs}>".format(
             klass=self.__class__.__name__,
-            attrs=" ".join("{}={!r}".format(k, v) for k, v in self.__dict__.items()),
+            attrs=" ".join("{}={!r}".format(k, getattr(self, k)) for k in self.__slots__),
             )
 
-def execute_signal( signal ):
-    ''' submit signal for execution and record completion '''
-
-    pnl = Pnl()
+def size_signal( signal, pnl ):
+    ''' quantity to trade for the signal, or None if there isn't enough cash to open the position '''
     if signal.is_entry:
         needed_cash = pnl.starting_equity * signal.equity_pct
         if needed_cash > pnl.available_cash:
@@ -147,9 +392,19 @@ def execute_signal( signal ):
     else:
         position = pnl.positions[ signal.symbol ]
         qty = position.qty
+    return qty
+
+def execute_signal( signal, pnl=None ):
+    ''' submit signal for execution and record completion. Sizes against the Pnl singleton unless given a portfolio '''
+
+    if pnl is None:
+        pnl = Pnl()
+    qty = size_signal( signal, pnl )
+    if qty is None:
+        return None
         
     logging.debug( 'Executing signal: {}'.format( signal ) )
 
     fill_price = submit_order( signal.symbol, qty, signal.is_entry )
 
-    return Trade( signal, qty, fill_price or signal.point.price )
\ No newline at end of file
+    return Trade( signal, qty, fill_price or signal.point.price )
@@ -1,17 +1,69 @@
 from __future__ import print_function
 
+from   collections import namedtuple
 import datetime
+import functools
+import inspect
 import six
+import weakref
 from   signals import Signal
 
+# how each primed coroutine was created: the decorated factory and the arguments it was called with
+RuleSpec = namedtuple( 'RuleSpec', ['factory', 'args', 'kwargs'] )
+_specs = weakref.WeakKeyDictionary()
+
 def coroutine(func):
     ''' Decorator for coroutines to prime them '''
+    @functools.wraps(func)
     def start(*args,**kwargs):
         cr = func(*args,**kwargs)
         six.next( cr )
+        _specs[ cr ] = RuleSpec( start, args, kwargs )
         return cr
     return start
 
+def describe( cr ):
+    ''' RuleSpec the coroutine was created from, or None if it wasn't created by a @coroutine factory '''
+    return _specs.get( cr )
+
+def register( cr, spec ):
+    ''' describe() 'cr' as created from the RuleSpec - for stand-ins of coroutines, see rule_graph '''
+    _specs[ cr ] = spec
+
+def spec_tree( cr ):
+    ''' picklable RuleSpec of the coroutine, with the coroutines among its arguments (all_conditions elements) 
+        turned into RuleSpecs too. Raises ValueError for coroutines not created by a @coroutine factory
+    '''
+    spec = describe( cr )
+    if spec is None:
+        raise ValueError( '{!r} was not created by a @coroutine factory'.format( cr ) )
+    return RuleSpec( spec.factory, _map_args( spec.args, _to_spec ), { k: _to_spec( v ) for k, v in spec.kwargs.items() } )
+
+def build( spec ):
+    ''' new, primed coroutine from a spec_tree() '''
+    return spec.factory( *_map_args( spec.args, _from_spec ), **{ k: _from_spec( v ) for k, v in spec.kwargs.items() } )
+
+def rebuild( cr ):
+    ''' a fresh copy of the coroutine, in the state it was created in '''
+    return build( spec_tree( cr ) )
+
+def _map_args( args, func ):
+    return tuple( func( arg ) for arg in args )
+
+def _to_spec( value ):
+    if inspect.isgenerator( value ):
+        return spec_tree( value )
+    if isinstance( value, ( list, tuple ) ):
+        return type( value )( _to_spec( v ) for v in value )
+    return value
+
+def _from_spec( value ):
+    if isinstance( value, RuleSpec ):
+        return build( value )
+    if isinstance( value, ( list, tuple ) ):
+        return type( value )( _from_spec( v ) for v in value )
+    return value
+
 @coroutine
 def time_based( hour, minute ):
     ''' Raise signal when the timestamp of an incoming price point matches the passed in hour/minute '''
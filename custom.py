@@ -18,3 +18,11 @@ def submit_order( symbol, qty, is_entry ):
     '''
     return 0
 
+
+
+def submit_orders( orders ):
+    ''' TODO: optional - submit a batch of orders in one broker API call, and return their fill prices in the same order.
+        'orders' is a list of ( symbol, qty, is_entry ) tuples, all generated during the same minute.
+        Return None if your broker has no bulk API: the orders are then sent one by one through submit_order
+    '''
+    return None
@@ -1,22 +1,131 @@
-import csv
 import datetime
-import os
 
-from   core import Point
+import numpy as np
+
+from   core import Bar, Point
 from   custom import get_data_point
+import storage
+
+CHUNK_SIZE = 4096 # rows converted to Points at a time
+BAR_UNITS  = { 's': 1, 'm': 60, 'h': 3600 }
+
+def bar_seconds( bar_size ):
+    ''' '1s', '1m', '5m', '1h' (or a number of seconds) -> seconds '''
+    if isinstance( bar_size, int ):
+        return bar_size
+    try:
+        return int( bar_size[ :-1 ] ) * BAR_UNITS[ bar_size[ -1 ] ]
+    except ( KeyError, ValueError, IndexError ):
+        raise ValueError( 'Invalid bar size {!r}, expected something like 1s, 1m or 5m'.format( bar_size ) )
+
+
+class BarAggregator( object ):
+    ''' Turns ticks into OHLCV bars of 'bar_size', time stamped with the start of their period.
+
+        add() returns the bars a tick completes: a bar is complete once a tick of a later period arrives.
+        With 'partial' it also returns the bar in progress after every tick, so downstream sees each update
+        of a bar, the last one being the complete bar. Volume is the sum of the ticks' sizes, or their count.
+    '''
+    def __init__( self, bar_size='1m', partial=False ):
+        self.seconds = bar_seconds( bar_size )
+        self.partial = partial
+        self.bar     = None
+
+    def add( self, point, size=1 ):
+        start = self._start( point.time_stamp )
+        bar   = self.bar
+        done  = []
+        if bar is not None and start == bar.time_stamp:
+            self.bar = Bar( start, point.price, bar.open, max( bar.high, point.price ), min( bar.low, point.price ), bar.volume + size )
+        else:
+            if bar is not None and not self.partial:
+                done.append( bar ) # already passed on, in partial mode
+            self.bar = Bar( start, point.price, point.price, point.price, point.price, size )
+        if self.partial:
+            done.append( self.bar )
+        return done
 
-def gen_time_series( symbol=None ):
-    ''' generate time-series of prices '''
+    def flush( self ):
+        ''' end of data: the bar in progress, as the last complete bar '''
+        bar, self.bar = self.bar, None
+        return [ bar ] if bar is not None and not self.partial else []
+
+    def _start( self, time_stamp ):
+        midnight = datetime.datetime.combine( time_stamp.date(), datetime.time() )
+        offset = int( ( time_stamp - midnight ).total_seconds() ) // self.seconds * self.seconds
+        return midnight + datetime.timedelta( seconds=offset )
+
+def aggregate( points, bar_size='1m', partial=False ):
+    ''' generate bars from a time-series of points, see BarAggregator '''
+    aggregator = BarAggregator( bar_size, partial )
+    for point in points:
+        for bar in aggregator.add( point ):
+            yield bar
+    for bar in aggregator.flush():
+        yield bar
+
+def bars_from_arrays( time_stamps, prices, seconds ):
+    ''' vectorized aggregation of sorted epoch seconds and prices into bars of 'seconds':
+        ( start epoch seconds, open, high, low, close, volume ) arrays
+    '''
+    if not len( time_stamps ):
+        empty = np.empty( 0 )
+        return empty.astype( np.int64 ), empty, empty, empty, empty, empty.astype( np.int64 )
+    # periods count from midnight, like BarAggregator's - epoch seconds are wall clock, so midnights are whole days
+    time_stamps = np.asarray( time_stamps )
+    midnights   = time_stamps - time_stamps % storage.SECONDS_PER_DAY
+    buckets     = midnights + ( time_stamps - midnights ) // seconds * seconds
+    starts      = np.concatenate( [ [0], np.flatnonzero( np.diff( buckets ) ) + 1 ] )
+    ends        = np.append( starts[ 1: ], len( buckets ) )
+    prices      = np.asarray( prices )
+    return ( buckets[ starts ], prices[ starts ], np.maximum.reduceat( prices, starts ), np.minimum.reduceat( prices, starts ),
+             prices[ ends - 1 ], ends - starts )
+
+def gen_time_series( symbol=None, bar_size=None, partial=False ):
+    ''' generate time-series of prices. With 'bar_size' the ticks are aggregated into bars, see BarAggregator '''
+    if bar_size:
+        for bar in aggregate( gen_time_series( symbol ), bar_size, partial ):
+            yield bar
+        return
     while True:
         time_stamp, price = get_data_point( symbol )
         yield Point( time_stamp=time_stamp, price=price )
 
-def gen_csv_data( symbol=None, specific_day=None ):
-    with open( os.path.join('data', symbol + '.csv'), 'r') as f:
-        reader = csv.reader( f )
-        for row in reader:
-            time_stamp = datetime.datetime.strptime( row[0], '%Y-%m-%d %H:%M:%S' )
-            if specific_day and specific_day.date() != time_stamp.date():
-                continue
-            price = float( row[1] )
-            yield Point( time_stamp=time_stamp, price=price )
\ No newline at end of file
+def gen_csv_data( symbol=None, specific_day=None, bar_size=None, partial=False ):
+    ''' replay data/<symbol>.csv through its memory-mapped column cache, one Point at a time.
+        The 'specific_day' argument seeks straight to that day's rows using the cache's date index.
+        With 'bar_size' second or tick level data is replayed as bars of that size ('1s', '1m', '5m'), see BarAggregator.
+    '''
+    if bar_size and partial:
+        for bar in aggregate( gen_csv_data( symbol, specific_day ), bar_size, partial ):
+            yield bar
+        return
+    for batch in gen_csv_batches( symbol, specific_day, bar_size=bar_size ):
+        for point in batch:
+            yield point
+
+def gen_csv_batches( symbol=None, specific_day=None, batch_size=CHUNK_SIZE, bar_size=None ):
+    ''' same as gen_csv_data, but yields lists of up to 'batch_size' Points, or complete Bars '''
+    store = storage.load( symbol )
+    if specific_day:
+        row_ranges = store.day_rows( specific_day )
+    elif bar_size:
+        row_ranges = [ ( first, last ) for _, first, last, _ in store.index.tolist() ] # a day at a time
+    else:
+        row_ranges = [ ( 0, len( store ) ) ]
+
+    for first, last in row_ranges:
+        if bar_size:
+            columns = bars_from_arrays( store.time_stamps[ first:last ], store.prices[ first:last ], bar_seconds( bar_size ) )
+            starts, columns = columns[ 0 ], [ column.tolist() for column in columns[ 1: ] ]
+            for start in range( 0, len( starts ), batch_size ):
+                end = start + batch_size
+                time_stamps = storage.to_datetimes( starts[ start:end ] )
+                opens, highs, lows, closes, volumes = [ column[ start:end ] for column in columns ]
+                yield [ Bar( *bar ) for bar in zip( time_stamps, closes, opens, highs, lows, volumes ) ]
+            continue
+
+        for start in range( first, last, batch_size ):
+            end = min( start + batch_size, last )
+            time_stamps = storage.to_datetimes( store.time_stamps[ start:end ] )
+            yield [ Point( time_stamp, price ) for time_stamp, price in zip( time_stamps, store.prices[ start:end ].tolist() ) ]
@@ -0,0 +1,141 @@
+''' Non-blocking order execution.
+
+    An ExecutionPool takes signals from the tick loop and returns right away. Orders are sized on submission,
+    against cash that already excludes what pending entries reserved. All the orders generated during the same
+    minute go out together from a worker thread: in one custom.submit_orders call when the broker supports bulk
+    orders, one submit_order call per order otherwise. Fills are booked into the portfolio by poll(), in the
+    thread that owns the portfolio, and in submission order for each symbol.
+'''
+from   collections import defaultdict, deque
+from   concurrent.futures import ThreadPoolExecutor, wait
+import logging
+
+from   core import Trade, size_signal
+import custom
+
+
+class Order( object ):
+    ''' A sized signal on its way to the broker '''
+    def __init__( self, signal, qty, reserved ):
+        self.signal   = signal
+        self.qty      = qty
+        self.reserved = reserved # cash set aside for the order
+        self.future   = None     # set once the order's batch is sent out
+        self.index    = None     # position in a bulk submission, whose future returns all the fill prices
+
+    def done( self ):
+        return self.future is not None and self.future.done()
+
+    def fill_price( self ):
+        result = self.future.result()
+        return result if self.index is None else result[ self.index ]
+
+    def __repr__( self ):
+        return '<Order {} qty={} entry={}>'.format( self.signal.symbol, self.qty, self.signal.is_entry )
+
+
+class ExecutionPool( object ):
+    ''' Queues signals and submits them from a pool of worker threads.
+
+        'submit_order' and 'submit_orders' default to the hooks in custom.py. When submit_orders returns None
+        bulk orders are taken as unsupported, and every later order goes out on its own.
+        The portfolio is only touched by submit() and poll() (and drain(), which polls): call them from one thread.
+    '''
+    def __init__( self, pnl=None, workers=4, submit_order=None, submit_orders=None ):
+        self.pnl           = pnl
+        self.submit_order  = submit_order or custom.submit_order
+        self.submit_orders = submit_orders or custom.submit_orders
+        self.bulk          = True # until submit_orders says otherwise
+        self.executor      = ThreadPoolExecutor( max_workers=workers )
+        self.batch         = []
+        self.batch_minute  = None
+        self.pending       = defaultdict( deque ) # orders not booked yet, per symbol, in submission order
+
+    def submit( self, signal ):
+        ''' size the signal, reserve its cash and queue it in the current minute's batch. Returns the Order, or None
+            if there isn't enough cash to open the position
+        '''
+        self.advance( signal.point.time_stamp )
+        if signal.is_entry:
+            qty = size_signal( signal, self.pnl )
+            if qty is None:
+                return None
+            reserved = qty * signal.point.price
+            self.pnl.reserve( reserved )
+        else:
+            # close what's held, including entries still on their way
+            pending = self.pending[ signal.symbol ]
+            qty = self.pnl.positions[ signal.symbol ].qty + sum( order.qty if order.signal.is_entry else -order.qty for order in pending )
+            reserved = 0
+
+        logging.debug( 'Queueing signal: {}'.format( signal ) )
+        order = Order( signal, qty, reserved )
+        self.batch.append( order )
+        self.batch_minute = _minute( signal.point.time_stamp )
+        self.pending[ signal.symbol ].append( order )
+        return order
+
+    def advance( self, time_stamp ):
+        ''' the clock moved to 'time_stamp': send out the batch of an earlier minute '''
+        if self.batch and _minute( time_stamp ) > self.batch_minute:
+            self.flush()
+
+    def flush( self ):
+        ''' send out the current batch now '''
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        if self.bulk:
+            future = self.executor.submit( self._send_batch, batch )
+            for index, order in enumerate( batch ):
+                order.future, order.index = future, index
+        else:
+            for order in batch:
+                order.future = self.executor.submit( self.submit_order, order.signal.symbol, order.qty, order.signal.is_entry )
+
+    def poll( self ):
+        ''' book the fills that came back. Returns their Trades '''
+        trades = []
+        for symbol, orders in self.pending.items():
+            while orders and orders[0].done():
+                trade = self._book( orders.popleft() )
+                if trade:
+                    trades.append( trade )
+        return trades
+
+    def wait( self ):
+        ''' block until every order sent out is back from the broker (doesn't book them - see poll()) '''
+        wait( [ order.future for orders in self.pending.values() for order in orders if order.future is not None ] )
+
+    def drain( self ):
+        ''' send out, wait for and book everything pending '''
+        self.flush()
+        self.wait()
+        return self.poll()
+
+    def close( self ):
+        self.drain()
+        self.executor.shutdown()
+
+    def _send_batch( self, batch ):
+        orders = [ ( order.signal.symbol, order.qty, order.signal.is_entry ) for order in batch ]
+        if self.bulk:
+            fill_prices = self.submit_orders( orders )
+            if fill_prices is not None:
+                return fill_prices
+            self.bulk = False
+        return [ self.submit_order( *order ) for order in orders ]
+
+    def _book( self, order ):
+        self.pnl.release( order.reserved )
+        try:
+            fill_price = order.fill_price()
+        except Exception:
+            logging.exception( 'Order failed: {}'.format( order ) )
+            return None
+        trade = Trade( order.signal, order.qty, fill_price or order.signal.point.price )
+        self.pnl.handle_fill( trade )
+        return trade
+
+def _minute( time_stamp ):
+    return time_stamp.replace( second=0, microsecond=0 )
@@ -8,11 +8,19 @@ Creates realistic price movements with:
 - Breakout scenarios
 """
 
+import argparse
 import csv
 import datetime
+import os
 import random
 import math
 
+import numpy as np
+
+OPEN_SECONDS = (9 * 60 + 30) * 60  # 9:30 AM
+TRADING_SECONDS = 390 * 60
+BLOCK_POINTS = 1 << 17  # price points generated at once by generate_market()
+
 
 def generate_intraday_prices(date, open_price, volatility=0.01, trend=0.0005):
     """
@@ -122,16 +130,198 @@ def save_to_csv(symbol, prices, data_dir='./data'):
     print(f'Price range: ${prices[0][1]:.2f} to ${prices[-1][1]:.2f}')
 
 
-if __name__ == '__main__':
-    # Generate test data for TEST symbol
-    random.seed(42)  # For reproducible results
+def trading_days(start_date, num_days):
+    """Weekdays among the num_days calendar days from start_date."""
+    days = [start_date + datetime.timedelta(days=i) for i in range(num_days)]
+    return [day for day in days if day.weekday() < 5]
+
+
+def generate_market(num_symbols, num_days, start_date=datetime.date(2020, 1, 1), seed=0,
+                    correlation=0.3, volatility=0.01, resolution=60, density=1.0,
+                    gaps=True, trends=True, regimes=True, block_size=None):
+    """
+    Generate correlated intraday random walks for many symbols with NumPy.
 
-    print('Generating synthetic test data...\n')
+    Log returns are a shared market shock plus an idiosyncratic one, mixed so that any two
+    symbols' returns have the given correlation. Every day and symbol can get an opening gap,
+    a trend, and a volatility regime (calm or volatile, switching from day to day).
 
-    prices = generate_multi_day_data(
-        symbol='TEST',
-        num_days=3,
-        start_price=250.0
-    )
+    Data is generated a block of symbols and a day at a time, so memory stays bounded by
+    block_size x points per day whatever the number of symbols and days. The same seed and
+    options always give the same data.
+
+    Args:
+        num_symbols: Number of symbols
+        num_days: Number of calendar days, weekends are skipped
+        start_date: First calendar day
+        seed: Random seed
+        correlation: Correlation of the symbols' returns (0 to 1)
+        volatility: Daily volatility of a calm day
+        resolution: Seconds between price points, 60 for minute bars, 1 for second-level ticks
+        density: Share of the points that are kept (1 keeps all), for irregular ticks
+        gaps, trends, regimes: Turn the daily gap, trend and volatility regime on or off
+        block_size: Symbols generated at once, by default about BLOCK_POINTS points' worth
+
+    Yields:
+        (first symbol, day, time_stamps, prices, keep) per block of symbols and trading day:
+        int64 epoch seconds of the day's points, a (symbols in block x points) float64 price
+        matrix, and a boolean matrix of the same shape, or None when density is 1
+    """
+    days = trading_days(start_date, num_days)
+    steps = TRADING_SECONDS // resolution
+    block_size = block_size or max(1, BLOCK_POINTS // steps)
+    offsets = OPEN_SECONDS + resolution * np.arange(steps, dtype=np.int64)
+    calm_to_volatile, volatile_to_calm, volatile_scale = 0.1, 0.3, 2.5
+    mix = np.sqrt(correlation), np.sqrt(1 - correlation)
+
+    for first in range(0, num_symbols, block_size):
+        count = min(block_size, num_symbols - first)
+        rng = np.random.default_rng([seed, 1, first // block_size])
+        log_prices = np.log(100.0) + rng.normal(0, 0.5, count)
+        volatile = np.zeros(count, dtype=bool)
+
+        for day_index, day in enumerate(days):
+            # the market shock of the day is the same for every block
+            market = np.random.default_rng([seed, 0, day_index]).standard_normal(steps)
+            shocks = mix[0] * market + mix[1] * rng.standard_normal((count, steps))
+
+            if regimes:
+                switch = rng.random(count)
+                volatile = np.where(volatile, switch >= volatile_to_calm, switch < calm_to_volatile)
+            sigma = volatility * np.where(volatile, volatile_scale, 1.0) / np.sqrt(steps)
+            drift = rng.normal(0, volatility / 2, count) / steps if trends else np.zeros(count)
+            if gaps:
+                log_prices = log_prices + rng.normal(0, volatility / 2, count)
+
+            paths = log_prices[:, None] + np.cumsum(drift[:, None] + sigma[:, None] * shocks, axis=1)
+            log_prices = paths[:, -1]
+            keep = rng.random((count, steps)) < density if density < 1 else None
+
+            day_start = (day - datetime.date(1970, 1, 1)).days * 86400
+            yield first, day, day_start + offsets, np.round(np.exp(paths), 2), keep
+
+
+def format_csv(time_stamps, prices, keep=None):
+    """
+    Format a block of symbols' prices as CSV rows without a Python call per row.
+
+    Args:
+        time_stamps: int64 epoch seconds of the points
+        prices: (symbols x points) price matrix
+        keep: Optional boolean matrix of the points to write
 
-    save_to_csv('TEST', prices)
+    Returns:
+        List of bytes, the 'YYYY-MM-DD HH:MM:SS,price' rows of each symbol
+    """
+    count, steps = prices.shape
+    stamps = np.datetime_as_string(time_stamps.astype('datetime64[s]')).astype('S19')
+    stamps = stamps.view(np.uint8).reshape(steps, 19).copy()
+    stamps[:, 10] = ord(' ')
+
+    cents = np.round(prices * 100).astype(np.int64)
+    whole, fraction = np.divmod(cents, 100)
+    digits = max(len(str(int(whole.max()))), 1)
+    width = 19 + 1 + digits + 1 + 2 + 1
+
+    rows = np.empty((count, steps, width), dtype=np.uint8)
+    rows[:, :, :19] = stamps
+    rows[:, :, 19] = ord(',')
+    mask = np.ones(rows.shape, dtype=bool)
+    for k in range(digits):  # right aligned integer part, the leading zeros masked out
+        power = 10 ** (digits - 1 - k)
+        rows[:, :, 20 + k] = whole // power % 10 + ord('0')
+        if k < digits - 1:
+            mask[:, :, 20 + k] = whole >= power
+    rows[:, :, 20 + digits] = ord('.')
+    rows[:, :, 21 + digits] = fraction // 10 + ord('0')
+    rows[:, :, 22 + digits] = fraction % 10 + ord('0')
+    rows[:, :, 23 + digits] = ord('\n')
+    if keep is not None:
+        mask &= keep[:, :, None]
+
+    data = rows[mask].tobytes()
+    ends = np.cumsum(mask.reshape(count, -1).sum(axis=1))
+    return [data[start:end] for start, end in zip(np.concatenate([[0], ends[:-1]]), ends)]
+
+
+def save_market(num_symbols, num_days, data_dir='./data', output='csv', names=None, **options):
+    """
+    Generate a market with generate_market() and write it out a block and a day at a time.
+
+    Args:
+        num_symbols: Number of symbols
+        num_days: Number of calendar days, weekends are skipped
+        data_dir: Output directory
+        output: 'csv' for data_dir/<symbol>.csv files the backtester replays, or 'columns' for
+            raw int64 epoch seconds and float64 price files, data_dir/<symbol>.time_stamp and
+            data_dir/<symbol>.price - the column layout of the storage.py cache
+        names: Symbol names, S0000, S0001, ... by default
+        options: Passed on to generate_market()
+
+    Returns:
+        Symbol names and the number of points written
+    """
+    if output not in ('csv', 'columns'):
+        raise ValueError("output must be 'csv' or 'columns', got {!r}".format(output))
+    names = names or ['S{:0{}d}'.format(i, len(str(num_symbols - 1))) for i in range(num_symbols)]
+    os.makedirs(data_dir, exist_ok=True)
+
+    files, first_seen, points = {}, None, 0
+    try:
+        for first, _, time_stamps, prices, keep in generate_market(num_symbols, num_days, **options):
+            if first != first_seen:  # next block: close the files of the last one
+                for f in files.values():
+                    f.close()
+                files, first_seen = {}, first
+                block = names[first:first + len(prices)]
+                suffixes = ('.csv',) if output == 'csv' else ('.time_stamp', '.price')
+                for name in block:
+                    for suffix in suffixes:
+                        files[name + suffix] = open(os.path.join(data_dir, name + suffix), 'wb')
+
+            if output == 'csv':
+                for name, rows in zip(block, format_csv(time_stamps, prices, keep)):
+                    files[name + '.csv'].write(rows)
+            else:
+                for i, name in enumerate(block):
+                    row_keep = slice(None) if keep is None else keep[i]
+                    time_stamps[row_keep].tofile(files[name + '.time_stamp'])
+                    prices[i][row_keep].tofile(files[name + '.price'])
+            points += prices.size if keep is None else int(keep.sum())
+    finally:
+        for f in files.values():
+            f.close()
+    return names, points
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic intraday price data')
+    parser.add_argument('--symbols', type=int, help='generate a correlated market of this many symbols, see save_market()')
+    parser.add_argument('--days', type=int, default=5, help='calendar days, weekends are skipped')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--correlation', type=float, default=0.3)
+    parser.add_argument('--resolution', type=int, default=60, help='seconds between points, 1 for second-level ticks')
+    parser.add_argument('--density', type=float, default=1.0, help='share of the points kept')
+    parser.add_argument('--output', choices=('csv', 'columns'), default='csv')
+    parser.add_argument('--data-dir', default='./data')
+    args = parser.parse_args()
+
+    if args.symbols:
+        started = datetime.datetime.now()
+        names, points = save_market(args.symbols, args.days, data_dir=args.data_dir, output=args.output, seed=args.seed,
+                                    correlation=args.correlation, resolution=args.resolution, density=args.density)
+        print(f'Generated {points:,} price points for {len(names)} symbols in {datetime.datetime.now() - started}')
+        print(f'Saved to: {args.data_dir}')
+    else:
+        # Generate test data for TEST symbol
+        random.seed(42)  # For reproducible results
+
+        print('Generating synthetic test data...\n')
+
+        prices = generate_multi_day_data(
+            symbol='TEST',
+            num_days=3,
+            start_price=250.0
+        )
+
+        save_to_csv('TEST', prices)
@@ -0,0 +1,184 @@
+''' Streaming indicators, and rules built on them.
+
+    Indicators are coroutines too: send them a Point (or a Bar) and they return their current value, updated in O(1)
+    from running state - no pass over the day's df. None means not enough data yet.
+
+        sma( period )           simple moving average of the last 'period' prices, from a running sum
+        ema( period )           exponential moving average, alpha = 2 / ( period + 1 ), seeded with the first price
+        rolling_max( period )   highest and lowest of the last 'period' prices, from a monotonic deque
+        rolling_min( period )
+        vwap()                  volume weighted average price of the day, from running sums. Bars are weighted by their
+                                volume at their typical price ( high + low + close ) / 3, points count once each
+        atr( period )           average true range, with Wilder's smoothing ( alpha = 1 / period ). Points have no range,
+                                so their true range is the move from the previous price
+
+    The rules take ( point, df ) like the built-in ones, and their indicators cover every point of the day - though a
+    strategy only sends its entry rules points while it's flat, and stops at the first rule that signals. The points
+    a rule wasn't sent are read back from the df and fed to its indicators before the current one, so what the rule
+    computes doesn't depend on when it was sent points; it only signals on the points it's sent. Indicators start
+    over every day, like initial_breakout. With a 'window', points that fell out of the df before the rule caught up
+    are missed.
+'''
+from   collections import deque
+
+import numpy as np
+
+from   coroutines import coroutine
+from   core import Point
+from   signals import Signal
+
+
+@coroutine
+def sma( period ):
+    ''' simple moving average of the last 'period' prices '''
+    window = deque()
+    total  = 0.0
+    value  = None
+    while True:
+        point = (yield value)
+        window.append( point.price )
+        total += point.price
+        if len( window ) > period:
+            total -= window.popleft()
+        value = total / period if len( window ) == period else None
+
+@coroutine
+def ema( period ):
+    ''' exponential moving average, seeded with the first price '''
+    alpha = 2.0 / ( period + 1 )
+    value = None
+    while True:
+        point = (yield value)
+        value = point.price if value is None else value + alpha * ( point.price - value )
+
+@coroutine
+def rolling_max( period ):
+    ''' highest of the last 'period' prices '''
+    return _rolling_extreme( period, lambda newer, older: newer >= older )
+
+@coroutine
+def rolling_min( period ):
+    ''' lowest of the last 'period' prices '''
+    return _rolling_extreme( period, lambda newer, older: newer <= older )
+
+def _rolling_extreme( period, dominates ):
+    # ( index, price ) pairs that can still become the extreme: a price is dropped as soon as a newer one dominates
+    # it, so the front of the deque is the extreme of the window and every price is pushed and popped once
+    candidates = deque()
+    count = 0
+    value = None
+    while True:
+        point = (yield value)
+        while candidates and dominates( point.price, candidates[ -1 ][ 1 ] ):
+            candidates.pop()
+        candidates.append( ( count, point.price ) )
+        if candidates[ 0 ][ 0 ] <= count - period:
+            candidates.popleft()
+        count += 1
+        value = candidates[ 0 ][ 1 ] if count >= period else None
+
+@coroutine
+def vwap():
+    ''' volume weighted average price of the day '''
+    curr_date = None
+    weighted  = 0.0
+    volume    = 0.0
+    value     = None
+    while True:
+        point = (yield value)
+        if point.time_stamp.date() != curr_date:
+            curr_date = point.time_stamp.date()
+            weighted, volume = 0.0, 0.0
+        size = getattr( point, 'volume', 1 )
+        if hasattr( point, 'high' ):
+            weighted += size * ( point.high + point.low + point.price ) / 3.0
+        else:
+            weighted += size * point.price
+        volume += size
+        value = weighted / volume if volume else None
+
+@coroutine
+def atr( period ):
+    ''' average true range, with Wilder's smoothing '''
+    previous = None
+    value    = None
+    while True:
+        point = (yield value)
+        high, low = getattr( point, 'high', point.price ), getattr( point, 'low', point.price )
+        if previous is None:
+            true_range = high - low
+        else:
+            true_range = max( high - low, abs( high - previous ), abs( low - previous ) )
+        previous = point.price
+        value = true_range if value is None else value + ( true_range - value ) / period
+
+
+@coroutine
+def breakout( period, repeat=False ):
+    ''' Raise a signal when the price breaks above the highest price of the previous 'period' points - a rolling
+        window version of initial_breakout.
+        The 'repeat' argument specifies whether the rule may signal more than once a day
+    '''
+    curr_date = None
+    signal    = None
+    while True:
+        point, df = (yield signal)
+        signal = None
+        if point.time_stamp.date() != curr_date:
+            curr_date, signaled = point.time_stamp.date(), False
+            highest, high, last = rolling_max( period ), None, None
+        for missed in _missed( df, last ):
+            high = highest.send( missed )
+        if high is not None and point.price > high and ( repeat or not signaled ):
+            signaled = True
+            signal = Signal( point=point, desc='break out above {}'.format( high ) )
+        high = highest.send( point )
+        last = _last( df )
+
+@coroutine
+def crossover( fast, slow, kind='ema', below=False ):
+    ''' Raise a signal when the 'fast' period moving average crosses above the 'slow' one - or below it, with 'below'.
+        'kind' is 'ema' or 'sma'
+    '''
+    average   = { 'ema': ema, 'sma': sma }[ kind ]
+    curr_date = None
+    signal    = None
+    while True:
+        point, df = (yield signal)
+        signal = None
+        if point.time_stamp.date() != curr_date:
+            curr_date = point.time_stamp.date()
+            fast_average, slow_average = average( fast ), average( slow )
+            above, last = None, None # was fast above slow at the last point they were both known
+        for missed in _missed( df, last ): # crosses the rule wasn't sent don't signal later
+            above = _above( fast_average.send( missed ), slow_average.send( missed ), above )
+        now_above = _above( fast_average.send( point ), slow_average.send( point ), above )
+        if above is not None and now_above != above and now_above != below:
+            signal = Signal( point=point, desc='{} {}({}) crossed {} {}({})'.format(
+                             kind, kind, fast, 'below' if below else 'above', kind, slow ) )
+        above = now_above
+        last  = _last( df )
+
+def _above( fast_value, slow_value, above ):
+    # is fast above slow - or as it was, while they're unknown or equal
+    if fast_value is None or slow_value is None or fast_value == slow_value:
+        return above
+    return fast_value > slow_value
+
+def _missed( df, last ):
+    ''' the points of the day in the df before the current one - its last - that came after the time stamp 'last',
+        or all of them when 'last' is None
+    '''
+    if df is None or len( df ) < 2:
+        return ()
+    time_stamps = df.time_stamps
+    if last is None:
+        start = 0
+    elif time_stamps[ -2 ] == last:
+        return () # wasn't left out of any
+    else:
+        start = int( np.searchsorted( time_stamps, last, side='right' ) )
+    return [ Point( time_stamp, price ) for time_stamp, price in zip( time_stamps[ start:-1 ].tolist(), df.prices[ start:-1 ].tolist() ) ]
+
+def _last( df ):
+    return df.time_stamps[ -1 ] if df is not None and len( df ) else None
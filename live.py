@@ -0,0 +1,141 @@
+''' asyncio live event loop.
+
+    Every symbol's feed runs in its own task: it fetches the symbol's next data point once, runs the rules of all the
+    strategies on the symbol and submits their orders independently of the other symbols, so a slow data feed or
+    broker call for one symbol doesn't hold up the rest.
+    The blocking data hook in custom.py runs on a thread pool executor, orders go through the session's
+    ExecutionPool (see execution.py) - one is created if the session has none.
+
+    The loop runs until all the data sources are exhausted (a get_data_point hook returning None) or until it's
+    stopped - Ctrl-C when started through run(), or setting the 'stop' event. Either way the session's report is
+    logged, the charts are produced and the report is returned.
+'''
+import asyncio
+from   concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import signal as signals
+
+from   core import Point
+import custom
+from   data_providers import BarAggregator
+from   execution import ExecutionPool
+from   positions import Pnl
+import recorder
+from   session import Session
+import utils
+
+
+def run( configs, cash=25000, commission=0, interval=1, save_charts=True, charts=True, session=None, bar_size=None, partial_bars=False, window=None ):
+    ''' run the configs live, against the hooks in custom.py, until Ctrl-C. Returns the PnlReport '''
+    return asyncio.run( _run_until_interrupted( configs, cash=cash, commission=commission, interval=interval,
+                                                save_charts=save_charts, charts=charts, session=session,
+                                                bar_size=bar_size, partial_bars=partial_bars, window=window ) )
+
+async def _run_until_interrupted( configs, **kwargs ):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler( signals.SIGINT, stop.set )
+    except ( NotImplementedError, RuntimeError, ValueError ):
+        pass # not on the main thread, or no signal support (Windows) - Ctrl-C then interrupts without a report
+    return await run_async( configs, stop=stop, **kwargs )
+
+async def run_async( configs, cash=25000, commission=0, interval=1, save_charts=True, charts=True, session=None,
+                     get_data_point=None, submit_order=None, submit_orders=None, stop=None, executor=None, bar_size=None, partial_bars=False,
+                     window=None ):
+    ''' Live event loop.
+
+        'interval' is the number of minutes each feed waits between data points.
+        'get_data_point' defaults to the hook in custom.py. It's a blocking call that runs on the 'executor'
+        (a thread pool by default), and returns ( time_stamp, price ) or ( time_stamp, price, size ), or None once 
+        there's no more data for the symbol. It's called once per symbol, however many configs trade the symbol.
+        With 'bar_size' ( '1s', '1m', '5m' ) the data points are aggregated into bars and only complete bars - or every
+        update of the bar in progress, with 'partial_bars' - reach the rules and the recording.
+        'submit_order' and 'submit_orders' are passed to the ExecutionPool created when the session has none.
+        'stop' is an asyncio.Event which shuts the loop down when set.
+        With 'window' memory use stays flat however long the loop runs: the rules see the last 'window' points of the
+        day only (see core.PriceBuffer) and the charts of the last day are drawn from the recording in data/ rather
+        than from points kept in memory.
+    '''
+    session = session if session is not None else Session( Pnl() )
+    own_execution = session.execution is None
+    if own_execution:
+        session.execution = ExecutionPool( session.pnl, workers=len( configs ), submit_order=submit_order, submit_orders=submit_orders )
+    session.open( configs, lambda symbol: iter( () ), cash, commission, live=True, keep_points=charts and not window, window=window ) # points are fetched below
+    stop = stop or asyncio.Event()
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor( max_workers=len( session.feeds ) + 1 )
+    get_data_point = get_data_point or custom.get_data_point
+
+    try:
+        bars = lambda: BarAggregator( bar_size, partial_bars ) if bar_size else None
+        await asyncio.gather( *[ _run_feed( feed, session, get_data_point, executor, interval, stop, bars() ) for feed in session.feeds.values() ] )
+        # book the orders still out
+        session.execution.flush()
+        await asyncio.get_running_loop().run_in_executor( executor, session.execution.wait )
+        session.execution.poll()
+    finally:
+        if own_executor:
+            executor.shutdown( wait=False ) # don't wait on hooks still blocked in a call
+        if own_execution:
+            session.execution.executor.shutdown( wait=False )
+            session.execution = None
+
+    recorder.flush_default() # the recorded points are on disk once the loop is over
+    logging.debug( 'All Done!' )
+    report = session.pnl.get_report()
+    logging.info( report )
+    if charts:
+        history = None
+        if window:
+            days    = { symbol: feed.curr_date for symbol, feed in session.feeds.items() }
+            history = lambda symbol: recorder.default().history( symbol, days[ symbol ] )
+        utils.plot( session.pnl, save_charts, False, os.path.join( 'charts', 'live' ), history )
+    return report
+
+async def _run_feed( feed, session, get_data_point, executor, interval, stop, bars=None ):
+    loop   = asyncio.get_running_loop()
+    symbol = feed.symbol
+    try:
+        while feed.active and not stop.is_set():
+            data = await _unless_stopped( loop.run_in_executor( executor, get_data_point, symbol ), stop )
+            if stop.is_set():
+                break
+            if data is None:
+                logging.debug( '{} finished.'.format( symbol ) )
+                if bars is not None:
+                    for bar in bars.flush():
+                        _process( feed, session, bar )
+                break
+
+            point = Point( time_stamp=data[0], price=data[1] )
+            if bars is None:
+                _process( feed, session, point )
+            else:
+                for bar in bars.add( point, *data[ 2:3 ] ):
+                    _process( feed, session, bar )
+
+            if interval:
+                await _unless_stopped( asyncio.sleep( interval * 60 ), stop )
+
+    except Exception:
+        # if any exception has occured, the feed and its strategies are inactivated
+        logging.exception( '{} setting active to False.'.format( symbol ) )
+    feed.close()
+
+def _process( feed, session, point ):
+    session.execution.poll() # book the fills that came back in the meantime
+    session.execution.advance( point.time_stamp )
+    for signal in feed.process( point ):
+        session.execute( signal )
+
+async def _unless_stopped( awaitable, stop ):
+    ''' await the awaitable, or give up on it as soon as 'stop' is set '''
+    task    = asyncio.ensure_future( awaitable )
+    stopped = asyncio.ensure_future( stop.wait() )
+    await asyncio.wait( [ task, stopped ], return_when=asyncio.FIRST_COMPLETED )
+    stopped.cancel()
+    if task.done():
+        return task.result()
+    task.cancel()
@@ -1,17 +1,102 @@
 from   collections import namedtuple
-from   datetime import datetime
+import datetime
 import logging
 
+import numpy as np
+import pandas as pd
+
 from   signals import Signal
 from   utils import Singleton
 
 PnlReport = namedtuple('PnlReport', 'starting_equity ending_equity net total_pl total_commissions')
 
+EPOCH = datetime.datetime( 1970, 1, 1 )
+MICROSECOND = datetime.timedelta( microseconds=1 )
+
+
+class TradeLog( object ):
+    ''' Struct-of-arrays log of the fills of a portfolio: one preallocated NumPy array per column, doubled when full.
+        Symbols and descriptions are stored as ids into 'symbols' and 'descs', so a fill costs a few array writes;
+        nothing is formatted until the fills are read back, see fills().
+    '''
+    COLUMNS = ( ( 'time_stamp', 'datetime64[us]' ), ( 'symbol', np.int32 ), ( 'qty', np.float64 ), ( 'price', np.float64 ),
+                ( 'side', np.int8 ), ( 'desc', np.int32 ) )
+    BUY, SELL = 1, -1
+
+    def __init__( self, capacity=64 ):
+        self.capacity = capacity
+        self.reset()
+
+    def reset( self ):
+        self.arrays  = { name: np.empty( self.capacity, dtype=dtype ) for name, dtype in self.COLUMNS }
+        self._micros = self.arrays[ 'time_stamp' ].view( np.int64 )
+        self.size    = 0
+        self.symbols = [] # symbol id -> symbol
+        self.descs   = [] # desc id -> desc
+        self._ids    = ( {}, {} ) # symbol -> id, desc -> id
+
+    def append( self, trade ):
+        if self.size == len( self.arrays[ 'qty' ] ):
+            self._grow()
+        row, arrays = self.size, self.arrays
+        self._micros[ row ]           = ( trade.time_stamp - EPOCH ) // MICROSECOND # much cheaper than a datetime64 conversion
+        arrays[ 'symbol' ][ row ]     = self._id( 0, self.symbols, trade.symbol )
+        arrays[ 'qty' ][ row ]        = trade.qty
+        arrays[ 'price' ][ row ]      = trade.price
+        arrays[ 'side' ][ row ]       = self.BUY if trade.is_entry else self.SELL
+        arrays[ 'desc' ][ row ]       = self._id( 1, self.descs, trade.desc )
+        self.size += 1
+
+    def __len__( self ):
+        return self.size
+
+    def columns( self ):
+        ''' { column: NumPy view of the fills so far } - no copies, valid until the next append '''
+        return { name: array[ :self.size ] for name, array in self.arrays.items() }
+
+    def to_frame( self ):
+        ''' the fills as a DataFrame over the columns, with the symbols and descriptions as categoricals '''
+        columns = self.columns()
+        columns[ 'symbol' ] = pd.Categorical.from_codes( columns[ 'symbol' ], categories=pd.Index( self.symbols, dtype=object ) )
+        columns[ 'desc' ]   = pd.Categorical.from_codes( columns[ 'desc' ], categories=pd.Index( self.descs, dtype=object ) )
+        return pd.DataFrame( columns, columns=[ name for name, _ in self.COLUMNS ], copy=False )
+
+    def fills( self, symbol=None, side=BUY ):
+        ''' [ ( 'YYYY-MM-DD HH:MM:SS', desc ) ] of the symbol's buys or sells, or of every symbol's '''
+        columns = self.columns()
+        rows = columns[ 'side' ] == side
+        if symbol is not None:
+            symbol_id = self._ids[ 0 ].get( symbol )
+            rows &= columns[ 'symbol' ] == ( -1 if symbol_id is None else symbol_id )
+        time_stamps = np.datetime_as_string( columns[ 'time_stamp' ][ rows ], unit='s' )
+        return [ ( time_stamp.replace( 'T', ' ' ), self.descs[ desc ] ) for time_stamp, desc in zip( time_stamps.tolist(), columns[ 'desc' ][ rows ].tolist() ) ]
+
+    def _id( self, kind, values, value ):
+        ids = self._ids[ kind ]
+        id_ = ids.get( value )
+        if id_ is None:
+            id_ = ids[ value ] = len( values )
+            values.append( value )
+        return id_
+
+    def _grow( self ):
+        for name, array in self.arrays.items():
+            grown = np.empty( 2 * len( array ), dtype=array.dtype )
+            grown[ :self.size ] = array[ :self.size ]
+            self.arrays[ name ] = grown
+        self._micros = self.arrays[ 'time_stamp' ].view( np.int64 )
+
 
 class Position( object ):
-    ''' Position per instrument '''
-    def __init__( self, commission ):
+    ''' Position per instrument. With 'keep_points' off market data isn't kept for charts.
+        Fills are logged to 'trades', the portfolio's TradeLog - or a log of the position's own
+    '''
+    __slots__ = ( 'commission', 'keep_points', 'total_commissions', 'realized_pl', 'total_qty', 'mtm_pl', 'qty', 'starting_equity',
+                  'all_points', 'trades', 'symbol' )
+
+    def __init__( self, commission, keep_points=True, trades=None, symbol=None ):
         self.commission = commission
+        self.keep_points = keep_points
         self.total_commissions = 0.0
         self.realized_pl = 0.0
         self.total_qty = 0
@@ -20,36 +105,48 @@ class Position( object ):
         self.qty = 0
         self.starting_equity = 0
         self.all_points = []
-        self.buys = []
-        self.sells = []
+        self.trades = trades if trades is not None else TradeLog()
+        self.symbol = symbol
+
+    @property
+    def buys( self ):
+        ''' [ ( 'YYYY-MM-DD HH:MM:SS', desc ) ] of the entries '''
+        return self.trades.fills( self.symbol, TradeLog.BUY )
+
+    @property
+    def sells( self ):
+        ''' [ ( 'YYYY-MM-DD HH:MM:SS', desc ) ] of the exits '''
+        return self.trades.fills( self.symbol, TradeLog.SELL )
 
     def handle_fill( self, trade ):
         self.total_commissions += trade.qty * self.commission
+        self.trades.append( trade )
         if trade.is_entry:
             self.qty = trade.qty
             self.total_qty += trade.qty
             self.starting_equity = trade.qty * trade.price
-            self.buys.append( ( datetime.strftime( trade.time_stamp, '%Y-%m-%d %H:%M:%S' ), trade.desc ) )
         else:
             self.realized_pl += trade.qty * trade.price - self.starting_equity
             self.qty = 0 # no partial trades allowed
-            self.sells.append( ( datetime.strftime( trade.time_stamp, '%Y-%m-%d %H:%M:%S' ), trade.desc ) )
 
     def market_data_update( self, point ):
         ''' keep track of mtm pl when position is open '''
-        self.all_points.append( point )
+        if self.keep_points:
+            self.all_points.append( point )
         if self.qty:
             self.mtm_pl = self.qty * point.price - self.starting_equity
         else:
             self.mtm_pl = 0.0
 
-class Pnl( Singleton ):
+class Portfolio( object ):
     ''' Keeps track of total pnl '''
-    def initialize( self, configs, cash, commission ):
+    def initialize( self, configs, cash, commission, keep_points=True ):
         self.starting_equity = cash
         self.current_equity  = cash
         self.available_cash  = cash
-        self.positions = { config.symbol: Position( commission ) for config in configs }
+        self.reserved_cash   = 0 # held for entry orders that haven't been filled yet
+        self.trades    = TradeLog() # the fills of every position
+        self.positions = { config.symbol: Position( commission, keep_points, self.trades, config.symbol ) for config in configs }
 
     def market_data_update( self, symbol, point ):
         position = self.positions[ symbol ]
@@ -64,6 +161,16 @@ class Pnl( Singleton ):
         else:
             self.available_cash += trade.qty * trade.price 
 
+    def reserve( self, cash ):
+        ''' set cash aside for a pending entry order, so it can't be spent twice '''
+        self.available_cash -= cash
+        self.reserved_cash  += cash
+
+    def release( self, cash ):
+        ''' give back cash reserved by reserve(), once the order was filled or failed '''
+        self.available_cash += cash
+        self.reserved_cash  -= cash
+
     def get_report( self ):
         pnl = self.get_pnl()
         commissions = self.get_commissions()
@@ -78,3 +185,16 @@ class Pnl( Singleton ):
 
     def get_commissions( self ):
         return int(sum( position.total_commissions for position in self.positions.values() ))
+
+class Pnl( Portfolio, Singleton ):
+    ''' The process-wide Portfolio, used wherever no Session provides one '''
+
+
+def aggregate( reports ):
+    ''' Combine per-day PnlReports, each of which starts from the same cash, into a single report '''
+    if not reports:
+        return None
+    net = sum( report.net for report in reports )
+    return PnlReport( reports[0].starting_equity, reports[0].starting_equity + net, net,
+                      sum( report.total_pl for report in reports ),
+                      sum( report.total_commissions for report in reports ) )
@@ -0,0 +1,140 @@
+''' Opt-in instrumentation of the tick path.
+
+    A Profiler attached to a Session ( Session( profiler=Profiler() ), or run( profile=True ) ) records the call
+    count and a latency histogram of every stage of every data point, and of every rule:
+
+        data     - fetching the next point from the data provider ( gen_csv_data ... )
+        process  - Feed.process, everything below included
+        buffer   - appending the point to the price buffer and taking the rules' df view
+        record   - recording the point, live
+        pnl      - Portfolio.market_data_update
+        rules    - the end-of-day exit and the entry or exit rules of a strategy, in total
+        execute  - sizing and executing a signal ( Session.execute )
+
+    Rules are listed one by one, labeled by the factory and arguments they were built with - initial_breakout(30),
+    all_conditions([...]) - see coroutines.describe. Without a profiler the tick path only pays for a few
+    'is None' checks.
+
+    Histograms have power of two buckets: bucket b counts the calls that took less than 2**b nanoseconds.
+'''
+from   __future__ import division
+import inspect
+import json
+import time
+import weakref
+
+import coroutines
+
+STAGES = ( 'data', 'process', 'buffer', 'record', 'pnl', 'rules', 'execute' )
+BUCKETS = 64
+
+now = time.perf_counter_ns
+
+
+class Stat( object ):
+    ''' call count, total and max latency, and latency histogram of a stage or a rule '''
+    __slots__ = ( 'count', 'total', 'max', 'histogram' )
+
+    def __init__( self ):
+        self.count     = 0
+        self.total     = 0
+        self.max       = 0
+        self.histogram = [ 0 ] * BUCKETS
+
+    def add( self, elapsed ):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.histogram[ elapsed.bit_length() ] += 1
+
+    def percentile( self, share ):
+        ''' upper bound, in ns, of the latency of the fastest 'share' of the calls '''
+        wanted, seen = share * self.count, 0
+        for bucket, count in enumerate( self.histogram ):
+            seen += count
+            if count and seen >= wanted:
+                return min( 1 << bucket, self.max )
+        return 0
+
+    def summary( self ):
+        return { 'count': self.count, 'total_s': self.total / 1e9, 'mean_us': self.total / self.count / 1e3 if self.count else 0.0,
+                 'p50_us': self.percentile( 0.5 ) / 1e3, 'p99_us': self.percentile( 0.99 ) / 1e3, 'max_us': self.max / 1e3,
+                 'histogram': { str( 1 << bucket ): count for bucket, count in enumerate( self.histogram ) if count } }
+
+
+class Profiler( object ):
+    ''' Stats per stage and per rule. Not thread safe: use one Profiler per Session '''
+
+    def __init__( self ):
+        self.stages = {}
+        self.rules  = {}
+        self.labels = weakref.WeakKeyDictionary() # coroutine -> label
+
+    def add( self, stage, started ):
+        ''' record the time since 'started' ( a now() reading ) for the stage, and return now() '''
+        ended = now()
+        stat = self.stages.get( stage )
+        if stat is None:
+            stat = self.stages[ stage ] = Stat()
+        stat.add( ended - started )
+        return ended
+
+    def send( self, cr, value ):
+        ''' cr.send( value ), timed under the rule's label '''
+        started = now()
+        result  = cr.send( value )
+        elapsed = now() - started
+        label = self.labels.get( cr )
+        if label is None:
+            label = self.labels[ cr ] = label_of( cr )
+        stat = self.rules.get( label )
+        if stat is None:
+            stat = self.rules[ label ] = Stat()
+        stat.add( elapsed )
+        return result
+
+    def reset( self ):
+        self.stages.clear()
+        self.rules.clear()
+
+    def summary( self ):
+        ''' { 'stages': { stage: Stat.summary() }, 'rules': { label: Stat.summary() } } '''
+        return { 'stages': { stage: self.stages[ stage ].summary() for stage in STAGES if stage in self.stages },
+                 'rules':  { label: stat.summary() for label, stat in sorted( self.rules.items(), key=lambda item: -item[1].total ) } }
+
+    def table( self ):
+        ''' the summary as a text table, slowest rules first '''
+        summary = self.summary()
+        rows = [ ( '{} {}'.format( title, name ), stat ) for title, stats in ( ( 'stage', summary[ 'stages' ] ), ( 'rule', summary[ 'rules' ] ) )
+                                                         for name, stat in stats.items() ]
+        width = max( [ len( name ) for name, _ in rows ] + [ 10 ] )
+        lines = [ '{:{}} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format( '', width, 'calls', 'total s', 'mean us', 'p50 us', 'p99 us', 'max us' ) ]
+        for name, stat in rows:
+            lines.append( '{:{}} {count:>10,} {total_s:>10.3f} {mean_us:>10.2f} {p50_us:>10.2f} {p99_us:>10.2f} {max_us:>10.2f}'.format( name, width, **stat ) )
+        return '\n'.join( lines )
+
+    def write( self, filename ):
+        ''' write the summary to a JSON file '''
+        with open( filename, 'w' ) as f:
+            json.dump( self.summary(), f, indent=2 )
+
+    def __str__( self ):
+        return self.table()
+
+
+def label_of( cr ):
+    ''' factory(arguments) the coroutine was built with, or its function name when it wasn't built by a factory '''
+    spec = coroutines.describe( cr )
+    if spec is None:
+        return '{}(?)'.format( getattr( cr, '__name__', type( cr ).__name__ ) )
+    args = [ _label_arg( arg ) for arg in spec.args ] + [ '{}={}'.format( key, _label_arg( value ) ) for key, value in sorted( spec.kwargs.items() ) ]
+    return '{}({})'.format( spec.factory.__name__, ', '.join( args ) )
+
+def _label_arg( arg ):
+    if isinstance( arg, ( list, tuple ) ):
+        labels = ', '.join( _label_arg( item ) for item in arg )
+        return '[{}]'.format( labels ) if isinstance( arg, list ) else '({})'.format( labels )
+    if inspect.isgenerator( arg ):
+        return label_of( arg )
+    return repr( arg )
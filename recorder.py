@@ -0,0 +1,178 @@
+''' Buffered recording of live data points to data/<symbol>.csv.
+
+    record() only queues the point. A background thread writes the queue out in batches - once 'batch_size'
+    points are waiting or 'flush_interval' seconds after the first of them arrived, and at close() - and fsyncs
+    every file it wrote to before taking the next batch. The queue holds at most 'max_queue' points, one batch by
+    default, and record() blocks when it's full: a crash loses at most the batch in flight and the queue behind it.
+    Memory use is fixed by the same bound, and at most 'max_open_files' files are kept open, least recently written
+    closed first.
+'''
+import atexit
+from   collections import OrderedDict
+import csv
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import storage
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S' # the format storage.parse_row reads back
+_CLOSE   = object() # queue markers
+_TIMEOUT = object()
+
+
+class Recorder( object ):
+    ''' Background writer of ( symbol, point ) rows.
+
+        With 'rotate_daily' every day goes to its own data/<symbol>_<YYYY-MM-DD>.csv file instead of data/<symbol>.csv.
+        Replays read data/<symbol>.csv only.
+    '''
+    def __init__( self, data_folder='data', batch_size=1000, flush_interval=5.0, max_queue=None, max_open_files=512, rotate_daily=False ):
+        self.data_folder    = data_folder
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.max_open_files = max_open_files
+        self.rotate_daily   = rotate_daily
+        self.files          = OrderedDict() # path -> open file, least recently written first
+        self.files_opened   = 0
+        self.queue          = queue.Queue( maxsize=max_queue or batch_size )
+        self.closed         = False
+        self.thread         = threading.Thread( target=self._run, name='recorder', daemon=True )
+        self.thread.start()
+
+    def record( self, symbol, point ):
+        if self.closed:
+            raise ValueError( 'Recorder is closed' )
+        self.queue.put( ( symbol, point ) )
+
+    def flush( self ):
+        ''' block until everything recorded so far is on disk '''
+        if self.closed:
+            return # close() wrote it all, and the writer is gone
+        done = threading.Event()
+        self.queue.put( done )
+        done.wait()
+
+    def close( self ):
+        ''' write out what's left, close the files and stop the writer '''
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put( _CLOSE )
+        self.thread.join()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc_info ):
+        self.close()
+
+    def path( self, symbol, point ):
+        return os.path.join( self.data_folder, self._name( symbol, point.time_stamp.date() ) + '.csv' )
+
+    def history( self, symbol, day ):
+        ''' ( datetime64 time stamps, prices ) arrays of the symbol's points of the day, read back from the recording
+            through the memory-mapped cache of the csv (see storage.py)
+        '''
+        self.flush()
+        name = self._name( symbol, day )
+        if not os.path.exists( os.path.join( self.data_folder, name + '.csv' ) ):
+            return np.empty( 0, dtype='datetime64[s]' ), np.empty( 0 )
+        store = storage.load( name, self.data_folder )
+        rows  = store.day_rows( day ) or [ ( 0, 0 ) ]
+        return ( np.concatenate( [ store.time_stamps[ first:last ] for first, last in rows ] ).astype( 'datetime64[s]' ),
+                 np.concatenate( [ store.prices[ first:last ] for first, last in rows ] ) )
+
+    def _name( self, symbol, day ):
+        return '{}_{}'.format( symbol, day ) if self.rotate_daily else symbol
+
+    def _run( self ):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max( 0, deadline - time.monotonic() )
+            try:
+                item = self.queue.get( timeout=timeout )
+            except queue.Empty:
+                item = _TIMEOUT # flush_interval is up
+
+            if item is _CLOSE or item is _TIMEOUT or isinstance( item, threading.Event ):
+                self._write( batch )
+                batch, deadline = [], None
+                if item is _CLOSE:
+                    break
+                if item is not _TIMEOUT:
+                    item.set() # flush() is waiting on it
+                continue
+
+            batch.append( item )
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len( batch ) >= self.batch_size:
+                self._write( batch )
+                batch, deadline = [], None
+
+        while self.files:
+            self._close( self.files.popitem()[ 1 ] )
+        while not self.queue.empty(): # flush() calls racing close(): everything is written
+            item = self.queue.get()
+            if isinstance( item, threading.Event ):
+                item.set()
+
+    def _write( self, batch ):
+        if not batch:
+            return
+        rows = OrderedDict()
+        for symbol, point in batch:
+            rows.setdefault( os.path.abspath( self.path( symbol, point ) ), [] ).append( ( point.time_stamp.strftime( TIME_FORMAT ), point.price ) )
+
+        try:
+            for path, path_rows in rows.items():
+                csv.writer( self._open( path ) ).writerows( path_rows )
+            for path in rows:
+                f = self.files.get( path ) # files evicted meanwhile were synced on close
+                if f is not None:
+                    f.flush()
+                    os.fsync( f.fileno() )
+        except Exception:
+            logging.exception( 'Failed to record {} points'.format( len( batch ) ) )
+
+    def _open( self, path ):
+        f = self.files.pop( path, None )
+        if f is None:
+            while len( self.files ) >= self.max_open_files:
+                self._close( self.files.popitem( last=False )[ 1 ] )
+            folder = os.path.dirname( path )
+            if folder:
+                os.makedirs( folder, exist_ok=True )
+            f = open( path, 'a', newline='' )
+            self.files_opened += 1
+        self.files[ path ] = f
+        return f
+
+    def _close( self, f ):
+        f.flush()
+        os.fsync( f.fileno() )
+        f.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+def default():
+    ''' the process-wide Recorder behind utils.save_point, started on first use and closed at exit '''
+    global _default
+    with _default_lock:
+        if _default is None or _default.closed:
+            _default = Recorder()
+            atexit.register( _default.close )
+        return _default
+
+def flush_default():
+    ''' write out what the process-wide Recorder holds, if it was ever started '''
+    if _default is not None and not _default.closed:
+        _default.flush()
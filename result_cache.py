@@ -0,0 +1,155 @@
+''' Content-addressed on-disk cache of per-day backtest results.
+
+    run_dates( ..., cache=True ) looks every day up here before running it. A day's key is a hash of everything its
+    result depends on: the configs - symbol, equity_pct and the definitions of their rules, the source of the rule
+    factories included - the cash and commission, the replay options and the content of the day's data for every
+    symbol. So editing one config, one rule or one day of a csv only recomputes what it changed.
+
+    An entry is a JSON file holding the day's PnlReport and its ( symbol, buys, sells ) trades. Entries are evicted
+    least recently used first once the folder outgrows 'max_bytes'; invalidate() drops entries explicitly.
+'''
+import datetime
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import os
+
+from   coroutines import RuleSpec, describe, spec_tree
+from   positions import PnlReport
+import storage
+
+VERSION = 1 # bump when the engine changes results, so older entries stop matching
+
+
+class ResultCache( object ):
+
+    def __init__( self, folder=os.path.join( 'data', 'cache', 'results' ), max_bytes=256 * 1024 * 1024 ):
+        self.folder    = folder
+        self.max_bytes = max_bytes
+        self.bytes     = None # size of the entries: measured by the first put() and kept up to date after it
+
+    def keys( self, configs, days, **options ):
+        ''' { day: hash of the day's result inputs }, or None when a rule wasn't built by a @coroutine factory and
+            can't be told apart from another one. 'options' are the settings that change results - cash, commission...
+        '''
+        if not all( describe( cr ) for config in configs for cr in config.entry_rules + config.exit_rules ):
+            return None
+        inputs = hashlib.sha256()
+        inputs.update( json.dumps( [ VERSION, [ _config_key( config ) for config in configs ], sorted( options.items() ) ], default=repr ).encode() )
+        symbols = sorted( set( config.symbol for config in configs ) )
+        keys = {}
+        for day in days:
+            digest = inputs.copy()
+            for symbol in symbols:
+                _hash_day( digest, symbol, day )
+            keys[ day ] = digest.hexdigest()
+        return keys
+
+    def get( self, key, day ):
+        ''' ( PnlReport, [ ( date, symbol, buys, sells ) ] ) stored under the key, or None '''
+        path = self._path( key, day )
+        try:
+            with open( path ) as f:
+                entry = json.load( f )
+            os.utime( path ) # recently used
+        except ( OSError, ValueError ):
+            return None
+        trades = [ ( _day( day ), symbol, [ tuple( buy ) for buy in buys ], [ tuple( sell ) for sell in sells ] ) for symbol, buys, sells in entry[ 'trades' ] ]
+        return PnlReport( *entry[ 'report' ] ), trades
+
+    def put( self, key, day, report, trades ):
+        ''' store the day's report and its ( date, symbol, buys, sells ) trades, evicting down to 'max_bytes' if the
+            cache outgrew it
+        '''
+        os.makedirs( self.folder, exist_ok=True )
+        if self.bytes is None:
+            self.bytes = sum( size for _, size, _ in self._stats() )
+        path = self._path( key, day )
+        entry = { 'report': list( report ), 'trades': [ ( symbol, buys, sells ) for _, symbol, buys, sells in trades ] }
+        with open( path + '.tmp', 'w' ) as f:
+            json.dump( entry, f )
+        replaced = os.path.getsize( path ) if os.path.exists( path ) else 0
+        os.replace( path + '.tmp', path ) # readers never see half an entry
+        self.bytes += os.path.getsize( path ) - replaced
+        if self.bytes > self.max_bytes:
+            self.evict()
+
+    def evict( self, max_bytes=None ):
+        ''' delete the least recently used entries until the cache takes 'max_bytes' at most '''
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self._stats()
+        total = sum( size for _, size, _ in entries )
+        for _, size, path in sorted( entries ):
+            if total <= max_bytes:
+                break
+            _remove( path )
+            total -= size
+        self.bytes = total
+
+    def invalidate( self, day=None ):
+        ''' drop the entries of the day, or all of them. Returns the number of entries dropped '''
+        paths = self._entries( day )
+        for path in paths:
+            _remove( path )
+        self.bytes = None # measured again by the next put()
+        logging.debug( 'Dropped {} cached results'.format( len( paths ) ) )
+        return len( paths )
+
+    def _path( self, key, day ):
+        return os.path.join( self.folder, '{}-{}.json'.format( _day( day ).isoformat(), key ) )
+
+    def _stats( self ):
+        # ( mtime, size, path ) of every entry
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat( path )
+            except OSError:
+                continue
+            entries.append( ( stat.st_mtime, stat.st_size, path ) )
+        return entries
+
+    def _entries( self, day=None ):
+        pattern = '{}-*.json'.format( _day( day ).isoformat() ) if day else '*.json'
+        return glob.glob( os.path.join( self.folder, pattern ) )
+
+
+def _day( day ):
+    return day.date() if isinstance( day, datetime.datetime ) else day
+
+def _config_key( config ):
+    return [ config.symbol, config.equity_pct, [ _spec_key( spec_tree( cr ) ) for cr in config.entry_rules ],
+             [ _spec_key( spec_tree( cr ) ) for cr in config.exit_rules ] ]
+
+def _spec_key( value ):
+    # rule definition, down to the source of its factory: editing a rule changes its key
+    if isinstance( value, RuleSpec ):
+        factory = inspect.unwrap( value.factory )
+        return [ factory.__module__, factory.__qualname__, _source( factory ), _spec_key( value.args ),
+                 sorted( ( name, _spec_key( arg ) ) for name, arg in value.kwargs.items() ) ]
+    if isinstance( value, ( list, tuple ) ):
+        return [ _spec_key( item ) for item in value ]
+    return repr( value )
+
+@functools.lru_cache( maxsize=None )
+def _source( factory ):
+    try:
+        return inspect.getsource( factory )
+    except ( OSError, TypeError ):
+        return None
+
+def _hash_day( digest, symbol, day ):
+    store = storage.load( symbol )
+    digest.update( symbol.encode() )
+    for first, last in store.day_rows( day ):
+        digest.update( store.time_stamps[ first:last ].tobytes() )
+        digest.update( store.prices[ first:last ].tobytes() )
+
+def _remove( path ):
+    try:
+        os.remove( path )
+    except OSError:
+        pass # already gone, another run evicted it
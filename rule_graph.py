@@ -0,0 +1,182 @@
+''' Rule sharing: identical rules on one feed are evaluated once per point.
+
+    A RuleGraph belongs to a Feed. Rules are add()ed to it, then share() turns each one defined more than once - the
+    same factory and arguments, see coroutines.spec_tree - into a proxy onto a single coroutine. So the configs that
+    use initial_breakout(45) or time_based(14, 15) on the symbol all hold proxies onto one coroutine: the first proxy
+    to send a point runs it, the others get its result. all_conditions elements are shared the same way, one by one.
+    Rules defined once are left as they are.
+
+    A rule's state depends on which points it was sent though, and strategies send different points: exit rules only
+    while in position, and only until an earlier rule signals. A proxy that didn't send the points its node went on
+    with - or sent points the node didn't - can't use the node anymore. It forks: it gets a copy of the rule built
+    from its definition and brought to the proxy's state by replaying the points the proxy did send, which the node
+    keeps while it has more than one proxy. Proxies that left the node at the same point share the fork. So results
+    are the same as with one coroutine per config; only the work is shared, for as long as the configs agree.
+
+    Shared rules start from the state they were built in, like Config.reset() rules. Rules that weren't built by a
+    @coroutine factory, or whose arguments aren't hashable, are never shared.
+'''
+import collections
+import copy
+
+from   coroutines import RuleSpec, build, describe, register, spec_tree
+
+
+class RuleGraph( object ):
+    ''' the shared rules of one feed. The feed moves 'tick' on to every point before the strategies run their rules '''
+
+    def __init__( self ):
+        self.clear()
+
+    def clear( self ):
+        ''' forget the rules: rules added from now on start over '''
+        self.counts = collections.Counter() # key() of a rule definition -> number of rules added with it
+        self.nodes  = {} # key() of a rule definition -> Node
+        self.tick   = 0
+
+    def add( self, cr ):
+        ''' count the rule's definition, and those of its elements '''
+        tree = _tree( cr )
+        if tree is not None:
+            self._count( tree )
+
+    def share( self, cr ):
+        ''' The rule to use instead of an add()ed one: a proxy onto the shared coroutine if the rule was added more
+            than once, the rule rebuilt with shared elements if some of its elements were, the rule itself otherwise
+        '''
+        tree = _tree( cr )
+        if tree is None or not self._shared( tree ):
+            return cr
+        rule = self._proxy( tree ) if self.counts[ key( tree ) ] > 1 else self._build( tree )
+        register( rule, describe( cr ) ) # described, rebuilt and pickled like the rule
+        return rule
+
+    def _count( self, tree ):
+        try:
+            self.counts[ key( tree ) ] += 1
+        except TypeError:
+            return # unhashable arguments
+        for arg in _elements( tree ):
+            self._count( arg )
+
+    def _shared( self, tree ):
+        try:
+            return self.counts[ key( tree ) ] > 1 or any( self._shared( arg ) for arg in _elements( tree ) )
+        except TypeError:
+            return False
+
+    def _proxy( self, tree ):
+        rule = key( tree )
+        node = self.nodes.get( rule )
+        if node is None:
+            node = self.nodes[ rule ] = Node( self, tree, self._build( tree ) )
+        return node.join( Proxy() )
+
+    def _build( self, tree ):
+        # the rule, with its elements shared if they were added more than once
+        args   = tuple( self._share_arg( arg ) for arg in tree.args )
+        kwargs = { name: self._share_arg( arg ) for name, arg in tree.kwargs.items() }
+        return tree.factory( *args, **kwargs )
+
+    def _share_arg( self, arg ):
+        if isinstance( arg, RuleSpec ):
+            if self.counts[ key( arg ) ] > 1:
+                return self._proxy( arg )
+            return self._build( arg ) if self._shared( arg ) else build( arg )
+        if isinstance( arg, ( list, tuple ) ):
+            return type( arg )( self._share_arg( item ) for item in arg )
+        return arg
+
+
+class Node( object ):
+    ''' one coroutine, run for all the proxies that sent it the same points '''
+    __slots__ = ( 'graph', 'tree', 'cr', 'count', 'tick', 'result', 'members', 'history', 'forks' )
+
+    def __init__( self, graph, tree, cr, history=None ):
+        self.graph   = graph
+        self.tree    = tree # spec_tree() of the rule, to build forks from
+        self.cr      = cr
+        self.count   = len( history ) if history else 0 # points sent so far
+        self.tick    = graph.tick # tick of the last point: while it's the current one its result is reused
+        self.result  = None
+        self.members = 0
+        self.history = history or [] # the points sent so far, while proxies may still fork off
+        self.forks   = {} # count -> fork of the node after 'count' points
+
+    def join( self, proxy ):
+        self.members += 1
+        proxy.node = self
+        return proxy
+
+    def leave( self ):
+        self.members -= 1
+        if self.members == 1:
+            self.history = None # the proxy left is the one in step, it never forks
+
+    def fork( self, count ):
+        ''' the node the proxies that left after 'count' points go on with '''
+        fork = self.forks.get( count )
+        if fork is None or not ( fork.count == count or ( fork.count == count + 1 and fork.tick == self.graph.tick ) ):
+            cr = build( self.tree ) # a private copy: its elements aren't shared, they'd go out of step
+            history = self.history[ :count ]
+            for value in history:
+                cr.send( value )
+            fork = self.forks[ count ] = Node( self.graph, self.tree, cr, history )
+        return fork
+
+
+class Proxy( object ):
+    ''' a config's view of a shared rule: send() it points like the rule itself '''
+    __slots__ = ( 'node', 'count', '__weakref__' )
+
+    def __init__( self ):
+        self.node  = None
+        self.count = 0 # points this proxy sent
+
+    def send( self, value ):
+        node  = self.node
+        count = self.count
+        if node.count == count: # in step: run the point
+            history = node.history
+            if history is not None:
+                if node.members > 1 or node.tick == node.graph.tick:
+                    history.append( value )
+                else:
+                    node.history = None # a single proxy, past the tick it could be joined on: it never forks
+            node.result = result = node.cr.send( value )
+            node.count  = self.count = count + 1
+            node.tick   = node.graph.tick
+            return result
+        if node.count == count + 1 and node.tick == node.graph.tick: # in step, and the point already ran
+            self.count = count + 1
+            return copy.copy( node.result ) if node.result else node.result # configs fill in their own signals
+        # out of step
+        fork = node.fork( count )
+        node.leave()
+        fork.join( self )
+        return self.send( value )
+
+
+def key( value ):
+    ''' hashable key of a spec_tree(): equal for the rules built by the same factory with the same arguments.
+        Raises TypeError for unhashable arguments
+    '''
+    if isinstance( value, RuleSpec ):
+        return ( value.factory, key( value.args ), tuple( sorted( ( name, key( arg ) ) for name, arg in value.kwargs.items() ) ) )
+    if isinstance( value, ( list, tuple ) ):
+        return ( type( value ), tuple( key( item ) for item in value ) )
+    hash( value )
+    return ( type( value ), value )
+
+def _tree( cr ):
+    return spec_tree( cr ) if describe( cr ) is not None else None
+
+def _elements( tree ):
+    # the RuleSpecs among the arguments
+    stack = list( tree.args ) + list( tree.kwargs.values() )
+    while stack:
+        arg = stack.pop()
+        if isinstance( arg, RuleSpec ):
+            yield arg
+        elif isinstance( arg, ( list, tuple ) ):
+            stack.extend( arg )
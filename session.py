@@ -0,0 +1,139 @@
+import heapq
+import logging
+import time
+
+from   core import Feed, Strategy, execute_signal
+from   positions import Portfolio
+import profiling
+
+
+class Session( object ):
+    ''' Context of one backtest or live book: owns its Portfolio, its strategies and the execution path.
+
+        Sessions share no state with each other, so several of them can run at the same time in threads
+        or in an event loop. Passing the Pnl singleton as 'pnl' gives the behavior of the code written
+        against the singleton.
+
+        With an ExecutionPool as 'execution', signals are queued to it instead of being submitted inline,
+        and fills are booked as they come back.
+        With a profiling.Profiler as 'profiler', the time spent in each stage and rule is recorded to it.
+
+        'feeds' is the registry of the session's data: one Feed per symbol, which all the strategies on the symbol
+        subscribe to, so several configs on one symbol read and process its data once.
+    '''
+    def __init__( self, pnl=None, execution=None, profiler=None ):
+        self.pnl        = pnl if pnl is not None else Portfolio()
+        self.execution  = execution
+        self.profiler   = profiler
+        self.strategies = []
+        self.feeds      = {} # symbol -> Feed, in the order the symbols first appear in the configs
+        if execution is not None:
+            execution.pnl = self.pnl
+
+    def open( self, configs, dataProvider, cash=25000, commission=0, live=False, keep_points=True, window=None, share_rules=False ):
+        ''' start over: fresh book and one strategy per config, fed by one dataProvider( symbol ) feed per symbol.
+            With 'keep_points' off the positions don't keep the market data for charts.
+            With 'window' the rules see the last 'window' points of the day only, see PriceBuffer
+            With 'share_rules' identical rules of the configs on a symbol run once per point, see rule_graph. The
+            configs' rules are replaced by proxies onto the shared ones. Not with 'window': forks replay the df
+        '''
+        if share_rules and window:
+            raise ValueError( 'share_rules needs the whole day as df, it can\'t be combined with window' )
+        self.pnl.initialize( configs, cash, commission, keep_points )
+        self.feeds      = {}
+        self.strategies = []
+        for config in configs:
+            feed = self.feeds.get( config.symbol )
+            if feed is None:
+                feed = self.feeds[ config.symbol ] = Feed( config.symbol, dataProvider( config.symbol ), self.pnl, live=live, window=window, profiler=self.profiler,
+                                                         share_rules=share_rules )
+            self.strategies.append( Strategy( config, feed, session=self, rank=len( self.strategies ) ) )
+        for feed in self.feeds.values():
+            feed.share_rules()
+        return self
+
+    def execute( self, signal ):
+        ''' submit the signal for execution and book the fill. Returns the Trade, or the queued Order '''
+        if self.profiler is not None:
+            started = profiling.now()
+            result = self._execute( signal )
+            self.profiler.add( 'execute', started )
+            return result
+        return self._execute( signal )
+
+    def _execute( self, signal ):
+        if self.execution is not None:
+            return self.execution.submit( signal )
+        trade = execute_signal( signal, self.pnl )
+        if trade:
+            self.pnl.handle_fill( trade )
+        return trade
+
+    def step( self ):
+        ''' one round-robin pass, one data point per active feed. Returns False once all of them ran out of data.
+            The rules of every feed run first, then the signals of the pass are executed in the order of the configs
+        '''
+        active_feeds = [ feed for feed in self.feeds.values() if feed.active ]
+        if not active_feeds:
+            return False
+
+        if len( active_feeds ) == 1:
+            for signal in active_feeds[0].tick():
+                self.execute( signal )
+        else:
+            pending = []
+            for feed in active_feeds:
+                signals = feed.tick()
+                if signals:
+                    pending.extend( zip( feed.signaled, signals ) )
+            pending.sort( key=lambda item: item[0].rank )
+            for _, signal in pending:
+                self.execute( signal )
+
+        if self.execution is not None:
+            self.execution.flush() # a pass is one point per symbol - the same minute
+            self.execution.poll()
+        return True
+
+    def process( self, interval=0 ):
+        ''' step through the feeds until all of them run out of data, sleeping 'interval' minutes between passes '''
+        while self.step():
+            if interval:
+                time.sleep( interval * 60 )
+        if self.execution is not None:
+            self.execution.drain()
+
+    def replay( self ):
+        ''' Replay the feeds in time_stamp order instead of round-robin: a heap-based k-way merge of the feeds, at
+            O(log k) per point for k symbols. Each point goes to every strategy on its symbol, in config order.
+            Points with the same time_stamp are processed in the order their symbols first appear in the configs.
+        '''
+        feeds = list( self.feeds.values() )
+        for time_stamp, rank, point in heapq.merge( *[ _ranked( rank, feed.time_series ) for rank, feed in enumerate( feeds ) ] ):
+            if self.execution is not None:
+                self.execution.advance( time_stamp )
+                self.execution.poll()
+            feed = feeds[ rank ]
+            if feed.active:
+                for signal in self._process( feed, point ):
+                    self.execute( signal )
+
+        for feed in feeds:
+            feed.close()
+        if self.execution is not None:
+            self.execution.drain()
+
+    def _process( self, feed, point ):
+        try:
+            return feed.process( point )
+        except Exception:
+            # if any exception has occured, the feed and its strategies are inactivated
+            feed.close()
+            logging.error( '{} setting active to False.'.format( feed.symbol ) )
+            return ()
+
+
+def _ranked( rank, time_series ):
+    # the rank breaks time_stamp ties, and keeps heapq from ever comparing points
+    for point in time_series:
+        yield point.time_stamp, rank, point
@@ -1,6 +1,7 @@
 
 class Signal( object ):
-    
+    __slots__ = ( 'symbol', 'point', 'desc', 'is_entry', 'equity_pct' )
+
     def __init__( self, point, desc, is_entry=True, equity_pct=0, symbol=None ):
         self.symbol     = symbol
         self.point      = point
@@ -11,5 +12,5 @@ class Signal( object ):
     def __repr__(self):
         return "<{klass} {attrs}>".format(
             klass=self.__class__.__name__,
-            attrs=" ".join("{}={!r}".format(k, v) for k, v in self.__dict__.items()),
+            attrs=" ".join("{}={!r}".format(k, getattr(self, k)) for k in self.__slots__),
             )
\ No newline at end of file
@@ -0,0 +1,277 @@
+import datetime
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+EPOCH = datetime.datetime( 1970, 1, 1 )
+SECONDS_PER_DAY = 86400
+CHUNK_BYTES = 16 * 1024 * 1024 # csv bytes parsed at a time
+TIME_STAMP_WIDTH = len( 'YYYY-MM-DD HH:MM:SS' )
+
+# memory-mapped stores opened so far, keyed by source csv path
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def to_epoch( time_stamp ):
+    ''' naive datetime -> int seconds since epoch (timestamps are treated as wall clock, no time zones) '''
+    return int( ( time_stamp - EPOCH ).total_seconds() )
+
+def to_datetimes( epochs ):
+    ''' array of epoch seconds -> list of naive datetimes '''
+    return np.asarray( epochs ).astype( 'datetime64[s]' ).astype( object ).tolist()
+
+def parse_row( line ):
+    ''' b'YYYY-MM-DD HH:MM:SS,price' -> ( epoch seconds, price ) '''
+    time_stamp, price = line.decode().split( ',' )[ :2 ]
+    return to_epoch( datetime.datetime.strptime( time_stamp, '%Y-%m-%d %H:%M:%S' ) ), float( price )
+
+def parse_lines( lines ):
+    ''' [ b'YYYY-MM-DD HH:MM:SS,price' ] -> ( int64 epoch seconds, float64 prices ) arrays.
+
+        Rows are laid out in a fixed-width NumPy byte matrix; the time stamp columns are parsed by NumPy's
+        datetime64 parser and the price columns by its float parser, with no Python call per row. Batches that
+        don't follow the layout (extra columns, other time formats) go through parse_row() one row at a time.
+    '''
+    if not lines:
+        return np.empty( 0, dtype=np.int64 ), np.empty( 0, dtype=np.float64 )
+    rows = np.array( lines )
+    width = rows.dtype.itemsize
+    if width > TIME_STAMP_WIDTH + 1:
+        matrix = rows.view( np.uint8 ).reshape( len( rows ), width )
+        if ( matrix[ :, TIME_STAMP_WIDTH ] == ord( ',' ) ).all() and not ( matrix[ :, TIME_STAMP_WIDTH + 1: ] == ord( ',' ) ).any():
+            try:
+                time_stamps = _column( matrix[ :, :TIME_STAMP_WIDTH ] ).astype( 'datetime64[s]' ).astype( np.int64 )
+                prices      = _column( matrix[ :, TIME_STAMP_WIDTH + 1: ] ).astype( np.float64 )
+                return time_stamps, prices
+            except ValueError:
+                pass
+
+    parsed = [ parse_row( line ) for line in lines ]
+    return np.array( [ t for t, _ in parsed ], dtype=np.int64 ), np.array( [ p for _, p in parsed ], dtype=np.float64 )
+
+def _column( matrix ):
+    ''' byte matrix -> 1-d array of fixed-width byte strings, one per row '''
+    return np.ascontiguousarray( matrix ).view( 'S{}'.format( matrix.shape[1] ) ).ravel()
+
+
+class ColumnStore( object ):
+    ''' Binary columnar copy of data/<symbol>.csv, opened with numpy.memmap.
+
+        Each column lives in its own raw file under data/cache: <symbol>.time_stamp holds int64 epoch seconds,
+        <symbol>.price holds float64 prices. <symbol>.index maps every trading day to its rows, one
+        ( epoch day, first row, end row, byte offset of the first row in the csv ) int64 record per day.
+        <symbol>.json remembers the size and mtime of the source csv the cache was built from.
+
+        When the csv only grew (live recording appends to it), just the new rows are parsed and appended to
+        the columns and the index; any other change rebuilds the cache from scratch.
+    '''
+    COLUMNS = ( ( 'time_stamp', np.int64 ), ( 'price', np.float64 ) )
+    INDEX_FIELDS = 4
+    VERSION = 2
+
+    def __init__( self, symbol, data_folder='data' ):
+        self.symbol       = symbol
+        self.source       = os.path.join( data_folder, symbol + '.csv' )
+        self.cache_folder = os.path.join( data_folder, 'cache' )
+        self.time_stamps  = None
+        self.prices       = None
+        self.index        = None
+        self.stamp        = None
+
+    def path( self, suffix ):
+        return os.path.join( self.cache_folder, '{}.{}'.format( self.symbol, suffix ) )
+
+    def source_stamp( self ):
+        stat = os.stat( self.source )
+        return { 'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns, 'version': self.VERSION }
+
+    def is_stale( self ):
+        return self.stamp is None or self.stamp != self.source_stamp()
+
+    def open( self ):
+        ''' bring the cache up to date with the source csv, then map it '''
+        stamp = self.source_stamp()
+        meta  = self._read_meta()
+        if meta is None or meta.get( 'version' ) != self.VERSION:
+            meta = self.build( stamp )
+        elif { k: meta.get( k ) for k in stamp } != stamp:
+            if self._appended_to( meta, stamp ):
+                meta = self.update( meta, stamp )
+            else:
+                meta = self.build( stamp )
+
+        self.time_stamps = self._map( 'time_stamp', np.int64, meta[ 'rows' ] )
+        self.prices      = self._map( 'price', np.float64, meta[ 'rows' ] )
+        self.index       = np.fromfile( self.path( 'index' ), dtype=np.int64 ).reshape( -1, self.INDEX_FIELDS )
+        self.stamp       = stamp
+        return self
+
+    def build( self, stamp ):
+        ''' parse the whole csv once and write the cache out '''
+        logging.debug( 'Building column cache for {}'.format( self.symbol ) )
+        if not os.path.exists( self.cache_folder ):
+            os.makedirs( self.cache_folder )
+
+        time_stamps, prices, offsets = self._parse( 0 )
+        for ( column, _ ), values in zip( self.COLUMNS, ( time_stamps, prices ) ):
+            self._replace( column, values.tobytes() )
+
+        index = self._index_rows( time_stamps, offsets, 0 )
+        self._replace( 'index', index.tobytes() )
+
+        meta = dict( stamp, rows=len( prices ), last_row=self._last_row( offsets ) )
+        self._write_meta( meta )
+        return meta
+
+    def update( self, meta, stamp ):
+        ''' parse only the rows appended since the cache was built, and extend the columns and the index '''
+        logging.debug( 'Appending to column cache for {}'.format( self.symbol ) )
+        rows = meta[ 'rows' ]
+        time_stamps, prices, offsets = self._parse( meta[ 'source_size' ] )
+
+        for ( column, dtype ), values in zip( self.COLUMNS, ( time_stamps, prices ) ):
+            with open( self.path( column ), 'r+b' ) as f:
+                f.truncate( rows * np.dtype( dtype ).itemsize ) # drop leftovers of an interrupted update
+                f.seek( 0, os.SEEK_END )
+                values.tofile( f )
+
+        index = np.fromfile( self.path( 'index' ), dtype=np.int64 ).reshape( -1, self.INDEX_FIELDS )
+        added = self._index_rows( time_stamps, offsets, rows )
+        if len( index ) and len( added ) and index[ -1, 0 ] == added[ 0, 0 ]:
+            # the appended rows continue the last indexed day
+            index[ -1, 2 ] = added[ 0, 2 ]
+            added = added[ 1: ]
+        self._replace( 'index', np.concatenate( [ index, added ] ).tobytes() )
+
+        meta = dict( stamp, rows=rows + len( prices ), last_row=self._last_row( offsets ) or meta[ 'last_row' ] )
+        self._write_meta( meta )
+        return meta
+
+    def dates( self ):
+        ''' distinct trading dates, in file order '''
+        seen = set()
+        days = [ day for day in self.index[ :, 0 ].tolist() if not ( day in seen or seen.add( day ) ) ]
+        return [ ( EPOCH + datetime.timedelta( days=day ) ).date() for day in days ]
+
+    def day_rows( self, day ):
+        ''' [ ( first row, end row ) ] for the trading date, normally a single range '''
+        if isinstance( day, datetime.datetime ):
+            day = day.date()
+        epoch_day = ( day - EPOCH.date() ).days
+        return [ ( start, end ) for _, start, end, _ in self.index[ self.index[ :, 0 ] == epoch_day ].tolist() ]
+
+    def day_offset( self, day ):
+        ''' byte offset of the day's first row in the source csv, or None if the day isn't there '''
+        epoch_day = ( day - EPOCH.date() ).days
+        offsets = self.index[ self.index[ :, 0 ] == epoch_day, 3 ]
+        return int( offsets[0] ) if len( offsets ) else None
+
+    def __len__( self ):
+        return len( self.prices )
+
+    def _parse( self, offset ):
+        ''' parse csv rows starting at the byte offset, a chunk of whole lines at a time: 
+            ( epoch seconds, prices, row byte offsets ) arrays 
+        '''
+        parsed = []
+        with open( self.source, 'rb' ) as f:
+            f.seek( offset )
+            pending = b''
+            while True:
+                data = f.read( CHUNK_BYTES )
+                if not data:
+                    break
+                data = pending + data
+                end  = data.rfind( b'\n' ) + 1
+                pending = data[ end: ]
+                if end:
+                    parsed.append( self._parse_chunk( data[ :end - 1 ], offset ) )
+                    offset += end
+            if pending:
+                parsed.append( self._parse_chunk( pending, offset ) )
+
+        if not parsed:
+            return np.empty( 0, dtype=np.int64 ), np.empty( 0, dtype=np.float64 ), np.empty( 0, dtype=np.int64 )
+        return tuple( np.concatenate( column ) for column in zip( *parsed ) )
+
+    def _parse_chunk( self, data, offset ):
+        ''' whole lines, without the last line end, starting at the byte offset '''
+        lines   = data.split( b'\n' )
+        lengths = np.fromiter( map( len, lines ), dtype=np.int64, count=len( lines ) )
+        offsets = offset + np.concatenate( [ [0], np.cumsum( lengths + 1 )[ :-1 ] ] )
+
+        # skip blank lines; a data row is longer than its time stamp
+        short = [ i for i in np.flatnonzero( lengths <= TIME_STAMP_WIDTH ).tolist() if not lines[ i ].strip() ]
+        if short:
+            keep    = np.setdiff1d( np.arange( len( lines ) ), short )
+            lines   = [ lines[ i ] for i in keep.tolist() ]
+            offsets = offsets[ keep ]
+
+        time_stamps, prices = parse_lines( lines )
+        return time_stamps, prices, offsets.astype( np.int64 )
+
+    def _index_rows( self, time_stamps, offsets, first_row ):
+        ''' one index record per run of rows from the same day '''
+        if not len( time_stamps ):
+            return np.empty( ( 0, self.INDEX_FIELDS ), dtype=np.int64 )
+        days   = time_stamps // SECONDS_PER_DAY
+        starts = np.concatenate( [ [0], np.flatnonzero( np.diff( days ) ) + 1 ] )
+        ends   = np.append( starts[1:], len( days ) )
+        return np.column_stack( [ days[ starts ], starts + first_row, ends + first_row, offsets[ starts ] ] ).astype( np.int64 )
+
+    def _last_row( self, offsets ):
+        if not len( offsets ):
+            return None
+        offset = int( offsets[ -1 ] )
+        with open( self.source, 'rb' ) as f:
+            f.seek( offset )
+            return [ offset, f.readline().decode() ]
+
+    def _appended_to( self, meta, stamp ):
+        ''' did the csv only grow since the cache was built? checked by re-reading the last row we parsed '''
+        if stamp[ 'source_size' ] <= meta[ 'source_size' ]:
+            return False
+        if not meta.get( 'last_row' ):
+            return meta[ 'source_size' ] == 0
+        offset, line = meta[ 'last_row' ]
+        with open( self.source, 'rb' ) as f:
+            f.seek( offset )
+            return f.readline().decode() == line and f.tell() <= meta[ 'source_size' ]
+
+    def _map( self, column, dtype, rows ):
+        if rows == 0:
+            return np.empty( 0, dtype=dtype ) # an empty file can't be memory-mapped
+        return np.memmap( self.path( column ), dtype=dtype, mode='r', shape=( rows, ) )
+
+    def _replace( self, suffix, data ):
+        # write next to the target and swap it in, so readers never see a half-written file
+        tmp = self.path( suffix + '.tmp' )
+        with open( tmp, 'wb' ) as f:
+            f.write( data )
+        os.replace( tmp, self.path( suffix ) )
+
+    def _read_meta( self ):
+        try:
+            with open( self.path( 'json' ), 'r' ) as f:
+                return json.load( f )
+        except ( IOError, ValueError ):
+            return None
+
+    def _write_meta( self, meta ):
+        self._replace( 'json', json.dumps( meta ).encode() )
+
+
+def load( symbol, data_folder='data' ):
+    ''' Return an open ColumnStore for the symbol. Stores are kept open and shared between callers
+        for as long as their source csv doesn't change.
+    '''
+    key = os.path.abspath( os.path.join( data_folder, symbol + '.csv' ) )
+    with _stores_lock: # a single builder per cache, even with sessions running in threads
+        store = _stores.get( key )
+        if store is None or store.is_stale():
+            store = _stores[ key ] = ColumnStore( symbol, data_folder ).open()
+    return store
@@ -0,0 +1,93 @@
+''' Parallel parameter sweeps.
+
+    Every combination of a parameter grid is backtested day by day over a symbol's date range, the way
+    app.run_dates does it, on a ProcessPoolExecutor. Each worker opens the symbol's column cache once and keeps
+    it mapped for all the combinations it runs. Results come back as a pandas DataFrame ranked by net pnl.
+
+    Example:
+
+        results = sweep( 'IVV', { 'period_length': [15, 30, 45, 60],
+                                  'stop_loss':     [0.01, 0.02],
+                                  'stop_profit':   [0.01, 0.02, 0.03],
+                                  'equity_pct':    [0.5, 1.0] } )
+'''
+from   concurrent.futures import ProcessPoolExecutor
+import datetime
+import itertools
+import logging
+import os
+
+import pandas as pd
+
+import app
+from   core import Config
+import coroutines
+from   positions import PnlReport, aggregate
+from   session import Session
+import storage
+
+
+def breakout_config( symbol, period_length=45, stop_loss=0.02, stop_profit=0.02, equity_pct=0.50, exit_hour=14, exit_minute=15 ):
+    ''' the example strategy from app.py, with its parameters exposed '''
+    return Config( symbol=symbol, equity_pct=equity_pct,
+                   entry_rules=[ coroutines.initial_breakout( period_length ) ],
+                   exit_rules =[ coroutines.time_based( exit_hour, exit_minute ),
+                                 coroutines.stop_loss( stop_loss ),
+                                 coroutines.stop_profit( stop_profit ) ] )
+
+def combinations( grid ):
+    ''' { name: [values] } -> [ { name: value } ], one dict per combination '''
+    names = sorted( grid )
+    return [ dict( zip( names, values ) ) for values in itertools.product( *[ grid[ name ] for name in names ] ) ]
+
+def backtest( symbol, params, dates, cash=25000, commission=0, factory=breakout_config, vectorized=True ):
+    ''' run one combination over the dates, one day at a time like app.run_dates, without charts '''
+    configs = [ factory( symbol, **params ) ]
+    session = Session()
+    reports = []
+    for day in dates:
+        for config in configs:
+            config.reset() # every day starts from fresh rules, as in run_dates
+        reports.append( app.run( configs, specific_day=day, cash=cash, commission=commission, vectorized=vectorized, charts=False, session=session ) )
+    return aggregate( reports ), len( reports )
+
+def _open( symbol ):
+    ''' worker initializer: map the symbol's data once per process '''
+    logging.disable( logging.INFO )
+    storage.load( symbol )
+
+def _run_batch( symbol, batch, dates, cash, commission, factory, vectorized ):
+    rows = []
+    for params in batch:
+        report, days = backtest( symbol, params, dates, cash, commission, factory, vectorized )
+        row = dict( params )
+        row.update( report._asdict() if report else dict.fromkeys( PnlReport._fields ) )
+        row[ 'days' ] = days
+        rows.append( row )
+    return rows
+
+def sweep( symbol, grid, start=None, end=None, cash=25000, commission=0, workers=None, factory=breakout_config, vectorized=True, batch_size=None ):
+    ''' Backtest every combination of the grid on the symbol's dates between start and end (inclusive, all by default).
+
+        'factory' builds the Config of a combination: factory( symbol, **params ). It has to be a module-level
+        function so it can be sent to the worker processes.
+
+        Returns a DataFrame with one row per combination - its parameters and aggregate PnlReport fields -
+        sorted by net pnl, best first.
+    '''
+    dates = [ datetime.datetime.combine( day, datetime.datetime.min.time() ) for day in storage.load( symbol ).dates()
+              if ( start is None or day >= start ) and ( end is None or day <= end ) ]
+    params = combinations( grid )
+
+    workers = workers or os.cpu_count() or 1
+    # a few batches per worker keeps the pool busy without paying one round-trip per combination
+    batch_size = batch_size or max( 1, len( params ) // ( 4 * workers ) )
+    with ProcessPoolExecutor( max_workers=workers, initializer=_open, initargs=( symbol, ) ) as executor:
+        batches = [ params[ i:i + batch_size ] for i in range( 0, len( params ), batch_size ) ]
+        futures = [ executor.submit( _run_batch, symbol, batch, dates, cash, commission, factory, vectorized ) for batch in batches ]
+        rows = [ row for future in futures for row in future.result() ]
+
+    results = pd.DataFrame( rows, columns=sorted( grid ) + list( PnlReport._fields ) + [ 'days' ] )
+    results = results.sort_values( 'net', ascending=False, kind='stable' ).reset_index( drop=True )
+    results.index += 1 # rank
+    return results
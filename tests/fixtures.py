@@ -0,0 +1,48 @@
+''' Shared fixture of the tests that run on synthetic data written to a temporary working directory '''
+import logging
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from   core import Config
+from   coroutines import initial_breakout, time_based, stop_loss, stop_profit
+from   generate_test_data import generate_multi_day_data, save_to_csv
+
+def breakout_configs( symbols=( 'TEST', ), equity_pct=0.50, period=30, repeat=False, stop=0.005, profit=0.005 ):
+    ''' one breakout config per symbol, exiting at 14:15 or on its stops '''
+    return [ Config( symbol=symbol, equity_pct=equity_pct,
+                     entry_rules=[initial_breakout(period, repeat=repeat)],
+                     exit_rules =[time_based(14,15), stop_loss(stop), stop_profit(profit)] ) for symbol in symbols ]
+
+def enter_data_folder( seed, symbols=( 'TEST', ), num_days=3 ):
+    ''' quiet the logs, move to a new temporary folder and write the symbols' data there. Returns ( cwd, folder ) '''
+    logging.disable( logging.CRITICAL )
+    cwd = os.getcwd()
+    folder = tempfile.mkdtemp()
+    os.chdir( folder )
+
+    random.seed( seed )
+    for symbol in symbols:
+        save_to_csv( symbol, generate_multi_day_data( symbol, num_days=num_days ) )
+    return cwd, folder
+
+def leave_data_folder( cwd, folder ):
+    os.chdir( cwd )
+    shutil.rmtree( folder )
+    logging.disable( logging.NOTSET )
+
+class DataTestCase(unittest.TestCase):
+    ''' writes the data of 'symbols' once for the whole class; subclasses set seed, symbols and num_days '''
+    seed     = 11
+    symbols  = ( 'TEST', )
+    num_days = 3
+
+    @classmethod
+    def setUpClass( cls ):
+        cls.cwd, cls.folder = enter_data_folder( cls.seed, cls.symbols, cls.num_days )
+
+    @classmethod
+    def tearDownClass( cls ):
+        leave_data_folder( cls.cwd, cls.folder )
@@ -0,0 +1,76 @@
+import logging
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+
+from app import run_dates
+from core import Config
+from coroutines import describe, initial_breakout, time_based, stop_loss, stop_profit
+from generate_test_data import generate_multi_day_data, save_to_csv
+
+def make_configs():
+    return [ Config( symbol='TEST', equity_pct=0.50,
+                     entry_rules=[initial_breakout(30)],
+                     exit_rules =[time_based(14,15), stop_loss(0.005), stop_profit(0.01)] ),
+             Config( symbol='TEST2', equity_pct=0.40,
+                     entry_rules=[initial_breakout(45)],
+                     exit_rules =[stop_loss(0.01), stop_profit(0.005)] ) ]
+
+class TestApp(unittest.TestCase):
+    ''' runs against synthetic data written to a temporary working directory '''
+
+    @classmethod
+    def setUpClass( cls ):
+        logging.disable( logging.CRITICAL )
+        cls.cwd = os.getcwd()
+        cls.folder = tempfile.mkdtemp()
+        os.chdir( cls.folder )
+
+        random.seed( 7 )
+        for symbol in ( 'TEST', 'TEST2' ):
+            save_to_csv( symbol, generate_multi_day_data( symbol, num_days=6 ) )
+
+    @classmethod
+    def tearDownClass( cls ):
+        os.chdir( cls.cwd )
+        shutil.rmtree( cls.folder )
+        logging.disable( logging.NOTSET )
+
+    def test_single_pass_matches_daily_runs( self ):
+        daily, daily_total = run_dates( make_configs(), save_charts=True )
+        single, single_total = run_dates( make_configs(), save_charts=True, single_pass=True )
+
+        self.assertEqual( 4, len( daily ) )
+        self.assertEqual( daily, single )
+        self.assertEqual( daily_total, single_total )
+        self.assertEqual( sum( report.net for _, report in daily ), daily_total.net )
+
+    def test_workers_match_serial_run( self ):
+        serial_trades, sharded_trades = [], []
+        serial, serial_total = run_dates( make_configs(), save_charts=True, trades=serial_trades )
+        shutil.rmtree( os.path.join( 'charts', 'testing' ) )
+        sharded, sharded_total = run_dates( make_configs(), save_charts=True, workers=3, trades=sharded_trades )
+
+        self.assertEqual( serial, sharded )
+        self.assertEqual( serial_total, sharded_total )
+        self.assertEqual( serial_trades, sharded_trades )
+        self.assertEqual( 8, len( sharded_trades ) )
+        self.assertTrue( any( buys for _, _, buys, _ in sharded_trades ) )
+
+        # charts are saved by the workers and combined afterwards
+        for day, _ in sharded:
+            for symbol in ( 'TEST', 'TEST2' ):
+                self.assertTrue( os.path.exists( os.path.join( 'charts', 'testing', '{}_{}.html'.format( day, symbol ) ) ) )
+
+    def test_configs_pickle_as_rule_specs( self ):
+        config = make_configs()[0]
+        copy = pickle.loads( pickle.dumps( config ) )
+        self.assertEqual( [ 'initial_breakout' ], [ describe( cr ).factory.__name__ for cr in copy.entry_rules ] )
+        self.assertEqual( ( 14, 15 ), describe( copy.exit_rules[0] ).args )
+        self.assertIsNot( config.exit_rules[0], copy.exit_rules[0] )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from benchmarks import bench_suite
+
+def results( **values ):
+    return { 'results': { name: { 'value': value, 'unit': bench_suite.METRICS[ name ][0], 'higher_is_better': bench_suite.METRICS[ name ][1] }
+                          for name, value in values.items() } }
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_measure( self ):
+        measured = bench_suite.measure( symbols=1, days=2, repeat=1 )
+        self.assertEqual( set( bench_suite.METRICS ), set( measured[ 'results' ] ) )
+        self.assertEqual( measured[ 'meta' ][ 'points' ], measured[ 'meta' ][ 'ticks' ] )
+        self.assertTrue( all( result[ 'value' ] > 0 for result in measured[ 'results' ].values() ) )
+
+    def test_compare( self ):
+        baseline = results( tick_rate=1000.0, run=2.0, peak_memory=10.0 )
+        rows = bench_suite.compare( results( tick_rate=850.0, run=1.0, peak_memory=10.5, chart_render=1.0 ), baseline, tolerance=0.1 )
+
+        self.assertEqual( [ 'peak_memory', 'run', 'tick_rate' ], [ row[0] for row in rows ] )
+        changes = { name: ( round( change, 3 ), regressed ) for name, _, _, change, regressed in rows }
+        self.assertEqual( { 'peak_memory': ( -0.05, False ), 'run': ( 0.5, False ), 'tick_rate': ( -0.15, True ) }, changes )
+
+if __name__ == '__main__':
+    unittest.main()
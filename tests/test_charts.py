@@ -0,0 +1,130 @@
+import datetime
+import glob
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+import app
+import charts
+from positions import Pnl
+from tests.fixtures import DataTestCase, breakout_configs
+
+def make_configs():
+    return breakout_configs( ( 'TEST', 'OTHER' ), equity_pct=0.40 )
+
+class TestCharts(DataTestCase):
+
+    seed     = 9
+    symbols  = ( 'TEST', 'OTHER' )
+    num_days = 4
+
+    @classmethod
+    def setUpClass( cls ):
+        super().setUpClass()
+        cls.charts_folder = os.path.join( 'charts', 'testing' )
+
+    def setUp( self ):
+        shutil.rmtree( 'charts', ignore_errors=True )
+
+    def test_shared_plotlyjs_and_combined_report( self ):
+        reports, _ = app.run_dates( make_configs(), save_charts=True )
+
+        day_charts = [ f for f in glob.glob( os.path.join( self.charts_folder, '*.html' ) ) if not f.endswith( '_combined.html' ) ]
+        self.assertEqual( 2 * len( reports ), len( day_charts ) )
+        self.assertTrue( os.path.exists( os.path.join( self.charts_folder, charts.PLOTLY_JS ) ) )
+        for filename in day_charts:
+            self.assertLess( os.path.getsize( filename ), 200000 ) # no plotly.js bundle inside
+
+        with open( os.path.join( self.charts_folder, 'TEST_combined.html' ) ) as f:
+            combined = f.read()
+        self.assertEqual( 1, combined.count( '<html>' ) )
+        self.assertEqual( 1, combined.count( 'src="{}"'.format( charts.PLOTLY_JS ) ) )
+        self.assertEqual( len( reports ), combined.count( charts.FIGURE_START ) )
+        self.assertEqual( len( reports ), combined.count( 'class="plotly-graph-div"' ) )
+
+        with open( os.path.join( self.charts_folder, '{}_combined.html'.format( reports[0][0] ) ) ) as f:
+            self.assertEqual( 2, f.read().count( charts.FIGURE_START ) )
+
+    def test_same_charts_in_process( self ):
+        day = datetime.datetime( 2020, 4, 2 )
+        app.run( make_configs(), specific_day=day )
+        filename = os.path.join( self.charts_folder, '2020-04-02_TEST.html' )
+        with open( filename ) as f:
+            pooled = f.read()
+
+        workers = charts.workers
+        charts.workers = 0
+        try:
+            app.run( make_configs(), specific_day=day )
+        finally:
+            charts.workers = workers
+        with open( filename ) as f:
+            self.assertEqual( len( pooled ), len( f.read() ) ) # same figure, only the div ids differ
+
+    def test_pool_shut_down( self ):
+        day = datetime.datetime( 2020, 4, 2 )
+        pool = charts.ProcessPoolExecutor
+        def no_pool( **kwargs ):
+            raise AssertionError( 'a single chart renders in process' )
+        charts.ProcessPoolExecutor = no_pool
+        try:
+            app.run( make_configs()[ :1 ], specific_day=day )
+        finally:
+            charts.ProcessPoolExecutor = pool
+        self.assertTrue( os.path.exists( os.path.join( self.charts_folder, '2020-04-02_TEST.html' ) ) )
+
+        app.run( make_configs(), specific_day=day )
+        self.assertTrue( os.path.exists( os.path.join( self.charts_folder, '2020-04-02_OTHER.html' ) ) )
+        self.assertIsNone( charts._executor ) # shut down once the charts are written
+
+    def test_markers( self ):
+        time_stamps = np.array( [ '2020-04-01T09:30', '2020-04-01T09:31', '2020-04-01T09:32' ], dtype='datetime64[us]' )
+        prices = np.array( [ 1.0, 2.0, 3.0 ] )
+        fig = charts.figure( 'TEST', datetime.date( 2020, 4, 1 ), time_stamps, prices,
+                             [ ( '2020-04-01 09:31:00', 'break out' ) ], [ ( '2020-04-01 09:32:00', 'profit' ), ( '2020-04-01 10:00:00', 'missing' ) ], 10, 100 )
+        buys, sells, line = fig.data
+        self.assertEqual( [ 2.0 ], list( buys.y ) )
+        self.assertEqual( ( 'break out', ), tuple( buys.text ) )
+        self.assertEqual( [ 3.0 ], list( sells.y ) )
+        self.assertEqual( 3, len( line.x ) )
+
+    def test_downsample( self ):
+        prices = np.cumsum( np.random.RandomState( 3 ).normal( size=100003 ) )
+        kept = charts.downsample( prices, 1000, keep=[ 5, 77777 ] )
+        self.assertLessEqual( len( kept ), 1004 )
+        self.assertTrue( np.all( np.diff( kept ) > 0 ) )
+        for index in ( 0, len( prices ) - 1, prices.argmin(), prices.argmax(), 5, 77777 ):
+            self.assertIn( index, kept )
+        self.assertEqual( list( range( 10 ) ), list( charts.downsample( prices[ :10 ], 1000 ) ) )
+        self.assertEqual( 10, len( charts.downsample( prices[ :10 ], None ) ) )
+
+    def test_long_series_keeps_trades( self ):
+        time_stamps = np.datetime64( '2020-04-01T04:00' ) + np.arange( 16 * 3600 ).astype( 'timedelta64[s]' )
+        prices = 100 + np.cumsum( np.random.RandomState( 4 ).normal( 0, 0.01, size=len( time_stamps ) ) )
+        buys  = [ ( '2020-04-01 09:30:01', 'break out' ) ]
+        sells = [ ( '2020-04-01 15:59:59', 'end of day' ) ]
+        buys_trace, sells_trace, line = charts.figure( 'TEST', datetime.date( 2020, 4, 1 ), time_stamps, prices, buys, sells, 0, 0, points=500 ).data
+
+        self.assertLessEqual( len( line.x ), 504 )
+        self.assertEqual( [ prices[ 5 * 3600 + 30 * 60 + 1 ] ], list( buys_trace.y ) )
+        self.assertEqual( [ prices[ 12 * 3600 - 1 ] ], list( sells_trace.y ) )
+        line_points = dict( zip( line.x.astype( 'datetime64[s]' ).tolist(), line.y ) )
+        for trace in ( buys_trace, sells_trace ): # markers sit on the line
+            self.assertEqual( trace.y[0], line_points[ trace.x.astype( 'datetime64[s]' )[0].item() ] )
+
+    def test_no_charts_keeps_no_points( self ):
+        app.run( make_configs(), specific_day=datetime.datetime( 2020, 4, 2 ), charts=False )
+        self.assertEqual( [ [], [] ], [ position.all_points for position in Pnl().positions.values() ] )
+        self.assertFalse( os.path.exists( 'charts' ) )
+
+        app.run( make_configs(), specific_day=datetime.datetime( 2020, 4, 2 ), charts=False, vectorized=True )
+        self.assertEqual( [ [], [] ], [ position.all_points for position in Pnl().positions.values() ] )
+
+    def test_run_dates_without_charts( self ):
+        app.run_dates( make_configs(), save_charts=True, charts=False )
+        self.assertFalse( os.path.exists( 'charts' ) ) # nothing saved or combined
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import datetime
+import unittest
+
+import numpy as np
+
+from core import Point, PriceBuffer
+
+class TestPriceBuffer(unittest.TestCase):
+
+    def setUp( self ):
+        self.dt = datetime.datetime( 2020, 4, 6, 9, 30 )
+
+    def _points( self, count ):
+        return [ Point( self.dt + datetime.timedelta( minutes=i ), 100.0 + i ) for i in range( count ) ]
+
+    def test_append_and_grow( self ):
+        buf = PriceBuffer( capacity=4 )
+        for point in self._points( 10 ):
+            buf.append( point )
+
+        self.assertEqual( 10, len( buf ) )
+        view = buf.view()
+        self.assertEqual( 10, len( view ) )
+        self.assertEqual( 109.0, view.prices[-1] )
+        self.assertEqual( np.datetime64( self.dt ), view.time_stamps[0] )
+
+    def test_view_is_a_snapshot( self ):
+        buf = PriceBuffer( capacity=4 )
+        points = self._points( 6 )
+        for point in points[:3]:
+            buf.append( point )
+        view = buf.view()
+
+        for point in points[3:]:
+            buf.append( point )
+        self.assertEqual( 3, len( view ) )
+        self.assertEqual( [100.0, 101.0, 102.0], view.prices.tolist() )
+
+        # a new day gets new storage, the old view is left alone
+        buf.reset()
+        buf.append( Point( self.dt, 1.0 ) )
+        self.assertEqual( 1, len( buf ) )
+        self.assertEqual( 100.0, view.prices[0] )
+
+    def test_window( self ):
+        buf = PriceBuffer( window=4 )
+        points = self._points( 11 )
+        for count, point in enumerate( points, 1 ):
+            buf.append( point )
+            view = buf.view()
+            self.assertEqual( min( count, 4 ), len( buf ) )
+            self.assertEqual( [ p.price for p in points[ max( count - 4, 0 ):count ] ], view.prices.tolist() )
+            self.assertEqual( np.datetime64( point.time_stamp ), view.time_stamps[-1] )
+        self.assertEqual( 8, len( buf.prices ) ) # never grows
+
+        buf.reset()
+        buf.append( points[0] )
+        self.assertEqual( [ 100.0 ], buf.view().prices.tolist() )
+
+    def test_view_behaves_like_dataframe( self ):
+        buf = PriceBuffer()
+        for point in self._points( 5 ):
+            buf.append( point )
+        df = buf.view()
+
+        self.assertEqual( list( Point._fields ), list( df.columns ) )
+        self.assertEqual( 104.0, df['price'].iloc[-1] )
+        self.assertEqual( 103.5, df.price.tail( 2 ).mean() )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import datetime
+import os
+import random
+import unittest
+
+import app
+from core import Bar, Point
+from data_providers import BarAggregator, aggregate, bar_seconds, gen_csv_data
+from positions import Pnl
+from tests.fixtures import DataTestCase, breakout_configs
+
+def ticks( day, seconds, every=10, gaps=0.3 ):
+    ''' second level prices, every few seconds with random gaps '''
+    start = datetime.datetime.combine( day, datetime.time( 9, 25 ) )
+    price = 100.0
+    points = []
+    for second in range( 0, seconds, every ):
+        price = round( price * ( 1 + random.gauss( 0, 0.0005 ) ), 2 )
+        if random.random() > gaps:
+            points.append( Point( start + datetime.timedelta( seconds=second ), price ) )
+    return points
+
+def write_csv( symbol, points ):
+    if not os.path.exists( 'data' ):
+        os.makedirs( 'data' )
+    with open( os.path.join( 'data', symbol + '.csv' ), 'w' ) as f:
+        for point in points:
+            f.write( '{:%Y-%m-%d %H:%M:%S},{}\n'.format( point.time_stamp, point.price ) )
+
+def make_configs( symbol ):
+    return breakout_configs( ( symbol, ), period=15, repeat=True, stop=0.002, profit=0.002 )
+
+class TestBars(unittest.TestCase):
+
+    def test_bar_sizes( self ):
+        self.assertEqual( [ 1, 60, 300 ], [ bar_seconds( size ) for size in ( '1s', '1m', '5m' ) ] )
+        with self.assertRaises( ValueError ):
+            bar_seconds( '5x' )
+
+    def test_aggregator( self ):
+        t = datetime.datetime( 2020, 4, 1, 9, 30 )
+        prices = [ ( 0, 10.0 ), ( 20, 12.0 ), ( 40, 9.0 ), ( 59, 11.0 ), ( 61, 11.5 ), ( 200, 11.0 ) ]
+        points = [ Point( t + datetime.timedelta( seconds=s ), p ) for s, p in prices ]
+
+        bars = list( aggregate( points, '1m' ) )
+        self.assertEqual( [ Bar( t, 11.0, 10.0, 12.0, 9.0, 4 ),
+                            Bar( t + datetime.timedelta( minutes=1 ), 11.5, 11.5, 11.5, 11.5, 1 ),
+                            Bar( t + datetime.timedelta( minutes=3 ), 11.0, 11.0, 11.0, 11.0, 1 ) ], bars )
+        self.assertEqual( 11.0, bars[0].close )
+
+        aggregator = BarAggregator( '1m' )
+        self.assertEqual( [], aggregator.add( points[0], 100 ) )
+        self.assertEqual( [], aggregator.add( points[1], 50 ) )
+        self.assertEqual( [ Bar( t, 12.0, 10.0, 12.0, 10.0, 150 ) ], aggregator.add( points[4] ) )
+
+        # partial bars: every update of the bar in progress
+        partial = list( aggregate( points[:5], '1m', partial=True ) )
+        self.assertEqual( 5, len( partial ) )
+        self.assertEqual( Bar( t, 12.0, 10.0, 12.0, 10.0, 2 ), partial[1] )
+        self.assertEqual( bars[0], partial[3] )
+
+class TestBarReplay(DataTestCase):
+
+    seed    = 5
+    symbols = ()
+
+    @classmethod
+    def setUpClass( cls ):
+        super().setUpClass()
+        cls.ticks = ticks( datetime.date( 2020, 4, 1 ), 7 * 3600 ) + ticks( datetime.date( 2020, 4, 2 ), 7 * 3600 )
+        write_csv( 'TICK', cls.ticks )
+        # the same data as minute bars
+        write_csv( 'MIN', [ Point( bar.time_stamp, bar.close ) for bar in aggregate( cls.ticks, '1m' ) ] )
+
+    def test_cached_bars_match_aggregator( self ):
+        expected = list( aggregate( self.ticks, '5m' ) )
+        self.assertEqual( expected, list( gen_csv_data( 'TICK', bar_size='5m' ) ) )
+
+        day = datetime.datetime( 2020, 4, 2 )
+        self.assertEqual( [ bar for bar in expected if bar.time_stamp.date() == day.date() ], list( gen_csv_data( 'TICK', day, bar_size='5m' ) ) )
+        self.assertEqual( list( aggregate( self.ticks, '1m', partial=True ) ), list( gen_csv_data( 'TICK', bar_size='1m', partial=True ) ) )
+        self.assertEqual( list( aggregate( self.ticks, '7m' ) ), list( gen_csv_data( 'TICK', bar_size='7m' ) ) ) # doesn't divide a day
+
+    def test_run_on_bars( self ):
+        for specific_day in ( None, datetime.datetime( 2020, 4, 1 ) ):
+            expected = app.run( make_configs( 'MIN' ), specific_day=specific_day, charts=False )
+            expected_trades = ( Pnl().positions[ 'MIN' ].buys, Pnl().positions[ 'MIN' ].sells )
+            self.assertTrue( expected_trades[0] )
+
+            for vectorized in ( False, True ):
+                report = app.run( make_configs( 'TICK' ), specific_day=specific_day, charts=False, bar_size='1m', vectorized=vectorized )
+                self.assertEqual( expected, report )
+                self.assertEqual( expected_trades, ( Pnl().positions[ 'TICK' ].buys, Pnl().positions[ 'TICK' ].sells ) )
+
+if __name__ == '__main__':
+    unittest.main()
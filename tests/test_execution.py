@@ -0,0 +1,140 @@
+import datetime
+import threading
+import time
+import unittest
+
+import app
+from core import Point
+from execution import ExecutionPool
+from positions import Portfolio
+from session import Session
+from signals import Signal
+from tests.fixtures import DataTestCase, breakout_configs
+
+
+class FakeBroker( object ):
+    ''' fills every order at a fixed price after 'latency' seconds, and logs the calls it got '''
+    def __init__( self, latency=0.0, price=None, bulk=True ):
+        self.latency = latency
+        self.price   = price
+        self.bulk    = bulk
+        self.calls   = []
+        self.lock    = threading.Lock()
+
+    def submit_order( self, symbol, qty, is_entry ):
+        time.sleep( self.latency )
+        with self.lock:
+            self.calls.append( [ ( symbol, qty, is_entry ) ] )
+        return self.price
+
+    def submit_orders( self, orders ):
+        if not self.bulk:
+            return None
+        time.sleep( self.latency )
+        with self.lock:
+            self.calls.append( list( orders ) )
+        return [ self.price ] * len( orders )
+
+def make_configs( symbols=( 'TEST', 'TEST2' ) ):
+    return breakout_configs( symbols, period=20 )
+
+def signal( symbol, minute, price, is_entry=True ):
+    point = Point( datetime.datetime( 2020, 4, 1, 10, minute ), price )
+    return Signal( point, desc='test', equity_pct=0.6, is_entry=is_entry, symbol=symbol )
+
+class TestExecutionPool(unittest.TestCase):
+
+    def make_pool( self, broker ):
+        pnl = Portfolio()
+        pnl.initialize( make_configs(), 10000, 0 )
+        return ExecutionPool( pnl, submit_order=broker.submit_order, submit_orders=broker.submit_orders )
+
+    def test_submit_does_not_wait_for_broker( self ):
+        pool = self.make_pool( FakeBroker( latency=0.3 ) )
+        started = time.time()
+        pool.submit( signal( 'TEST', 0, 10.0 ) )
+        pool.flush()
+        self.assertLess( time.time() - started, 0.1 )
+        self.assertEqual( [], pool.poll() )
+
+        self.assertEqual( 1, len( pool.drain() ) )
+        self.assertEqual( 600, pool.pnl.positions[ 'TEST' ].qty )
+        pool.close()
+
+    def test_reserved_cash_is_not_spent_twice( self ):
+        pool = self.make_pool( FakeBroker( latency=0.1 ) )
+        first  = pool.submit( signal( 'TEST', 0, 10.0 ) )
+        second = pool.submit( signal( 'TEST2', 0, 10.0 ) )
+
+        self.assertEqual( 600, first.qty )
+        self.assertEqual( 400, second.qty ) # sized against what the first one left
+        self.assertEqual( 0, pool.pnl.available_cash )
+        self.assertEqual( 10000, pool.pnl.reserved_cash )
+
+        pool.drain()
+        self.assertEqual( 0, pool.pnl.reserved_cash )
+        self.assertEqual( 0, pool.pnl.available_cash )
+        pool.close()
+
+    def test_exit_closes_pending_entry( self ):
+        pool = self.make_pool( FakeBroker( latency=0.1, price=11.0 ) )
+        pool.submit( signal( 'TEST', 0, 10.0 ) )
+        exit = pool.submit( signal( 'TEST', 1, 11.0, is_entry=False ) )
+        self.assertEqual( 600, exit.qty )
+
+        pool.drain()
+        position = pool.pnl.positions[ 'TEST' ]
+        self.assertEqual( 0, position.qty )
+        self.assertEqual( 0, position.realized_pl ) # both filled at 11.0
+        self.assertEqual( 10000, pool.pnl.available_cash )
+        pool.close()
+
+    def test_orders_batched_per_minute( self ):
+        broker = FakeBroker()
+        pool = self.make_pool( broker )
+        pool.submit( signal( 'TEST', 0, 10.0 ) )
+        pool.submit( signal( 'TEST2', 0, 20.0 ) )
+        pool.submit( signal( 'TEST', 1, 10.0, is_entry=False ) )
+        pool.drain()
+
+        self.assertEqual( [ [ ( 'TEST', 600, True ), ( 'TEST2', 200, True ) ], [ ( 'TEST', 600, False ) ] ], broker.calls )
+        pool.close()
+
+    def test_falls_back_to_single_orders( self ):
+        broker = FakeBroker( bulk=False )
+        pool = self.make_pool( broker )
+        pool.submit( signal( 'TEST', 0, 10.0 ) )
+        pool.submit( signal( 'TEST2', 0, 20.0 ) )
+        pool.submit( signal( 'TEST', 1, 10.0, is_entry=False ) )
+        pool.drain()
+
+        self.assertFalse( pool.bulk )
+        self.assertEqual( 3, len( broker.calls ) )
+        self.assertEqual( 0, pool.pnl.positions[ 'TEST' ].qty )
+        self.assertEqual( 200, pool.pnl.positions[ 'TEST2' ].qty )
+        pool.close()
+
+class TestSessionExecution(DataTestCase):
+
+    symbols = ( 'TEST', 'TEST2' )
+
+    def test_matches_inline_execution( self ):
+        day = datetime.datetime( 2020, 4, 1 )
+        inline = Session()
+        expected = app.run( make_configs(), specific_day=day, charts=False, session=inline )
+
+        broker = FakeBroker( latency=0.001 )
+        pool = ExecutionPool( submit_order=broker.submit_order, submit_orders=broker.submit_orders )
+        pooled = Session( execution=pool )
+        report = app.run( make_configs(), specific_day=day, charts=False, session=pooled )
+        pool.close()
+
+        self.assertTrue( broker.calls )
+        self.assertEqual( expected.net, report.net )
+        for symbol in ( 'TEST', 'TEST2' ):
+            self.assertEqual( inline.pnl.positions[ symbol ].buys, pooled.pnl.positions[ symbol ].buys )
+            self.assertEqual( inline.pnl.positions[ symbol ].sells, pooled.pnl.positions[ symbol ].sells )
+            self.assertEqual( inline.pnl.positions[ symbol ].realized_pl, pooled.pnl.positions[ symbol ].realized_pl )
+
+if __name__ == '__main__':
+    unittest.main()
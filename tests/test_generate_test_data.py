@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from generate_test_data import format_csv, generate_market, save_market
+import storage
+
+class TestGenerateMarket(unittest.TestCase):
+
+    def setUp( self ):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown( self ):
+        shutil.rmtree( self.folder )
+
+    def test_csv_and_columns_round_trip( self ):
+        options = dict( seed=3, density=0.5, block_size=4 )
+        names, points = save_market( 10, 8, data_dir=os.path.join( self.folder, 'csv' ), **options )
+        save_market( 10, 8, data_dir=os.path.join( self.folder, 'columns' ), output='columns', **options )
+
+        self.assertEqual( 'S0', names[0] )
+        total = 0
+        for name in names:
+            store = storage.load( name, os.path.join( self.folder, 'csv' ) )
+            time_stamps = np.fromfile( os.path.join( self.folder, 'columns', name + '.time_stamp' ), dtype=np.int64 )
+            prices = np.fromfile( os.path.join( self.folder, 'columns', name + '.price' ) )
+            self.assertTrue( np.array_equal( time_stamps, store.time_stamps ) )
+            self.assertTrue( np.allclose( prices, store.prices ) )
+            self.assertTrue( np.all( np.diff( time_stamps ) > 0 ) )
+            self.assertEqual( 6, len( store.dates() ) ) # weekdays only
+            total += len( prices )
+        self.assertEqual( points, total )
+        self.assertAlmostEqual( 0.5, total / ( 10 * 6 * 390 ), delta=0.05 )
+
+    def test_format_csv( self ):
+        time_stamps = np.array( [ 1585733400, 1585733401 ] ) # 2020-04-01 09:30:00
+        prices = np.array( [ [ 0.5, 1234.56 ], [ 10.0, 7.05 ] ] )
+        rows = format_csv( time_stamps, prices, keep=np.array( [ [ True, True ], [ False, True ] ] ) )
+        self.assertEqual( [ b'2020-04-01 09:30:00,0.50\n2020-04-01 09:30:01,1234.56\n', b'2020-04-01 09:30:01,7.05\n' ], rows )
+
+    def test_reproducible( self ):
+        def prices( seed ):
+            return np.concatenate( [ chunk[3] for chunk in generate_market( 5, 5, seed=seed, block_size=2 ) ], axis=None )
+        self.assertTrue( np.array_equal( prices( 1 ), prices( 1 ) ) )
+        self.assertFalse( np.array_equal( prices( 1 ), prices( 2 ) ) )
+
+    def test_correlation( self ):
+        first, _, _, prices, _ = next( generate_market( 40, 1, correlation=0.6, regimes=False, gaps=False, trends=False, resolution=10 ) )
+        correlations = np.corrcoef( np.diff( np.log( prices ), axis=1 ) )
+        self.assertAlmostEqual( 0.6, correlations[ np.triu_indices( 40, 1 ) ].mean(), delta=0.05 )
+
+    def test_bounded_memory( self ):
+        def peak( symbols ):
+            tracemalloc.start()
+            try:
+                save_market( symbols, 3, data_dir=self.folder, block_size=20 )
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        peak( 40 ) # warm up
+        self.assertLess( peak( 1000 ), 1.2 * peak( 100 ) )
+
+if __name__ == '__main__':
+    unittest.main()
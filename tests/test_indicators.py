@@ -0,0 +1,103 @@
+import datetime
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from core import Bar, Config, Point
+from coroutines import coroutine
+import indicators
+from session import Session
+from signals import Signal
+
+@coroutine
+def every( count ):
+    ''' exit rule: signals on every 'count'th point it's sent '''
+    sent   = 0
+    signal = None
+    while True:
+        point, _ = (yield signal)
+        sent  += 1
+        signal = Signal( point=point, desc='exit' ) if sent % count == 0 else None
+
+class TestIndicators(unittest.TestCase):
+
+    def setUp( self ):
+        state = np.random.RandomState( 21 )
+        self.prices = list( 100 + np.cumsum( state.normal( 0, 0.1, size=500 ) ) )
+        start = datetime.datetime( 2020, 4, 6, 9, 30 )
+        self.points = [ Point( start + datetime.timedelta( minutes=i ), price ) for i, price in enumerate( self.prices ) ]
+
+    def _values( self, cr, points=None ):
+        return [ cr.send( point ) for point in points or self.points ]
+
+    def assertMatches( self, values, expected ):
+        expected = [ None if pd.isna( value ) else value for value in expected ]
+        self.assertEqual( [ value is None for value in expected ], [ value is None for value in values ] )
+        np.testing.assert_allclose( [ v for v in values if v is not None ], [ v for v in expected if v is not None ] )
+
+    def test_against_pandas( self ):
+        series = pd.Series( self.prices )
+        self.assertMatches( self._values( indicators.sma( 20 ) ), series.rolling( 20 ).mean() )
+        self.assertMatches( self._values( indicators.ema( 20 ) ), series.ewm( span=20, adjust=False ).mean() )
+        self.assertMatches( self._values( indicators.rolling_max( 15 ) ), series.rolling( 15 ).max() )
+        self.assertMatches( self._values( indicators.rolling_min( 15 ) ), series.rolling( 15 ).min() )
+        self.assertMatches( self._values( indicators.rolling_max( 1 ) ), series )
+
+        true_range = series.diff().abs().fillna( 0 )
+        self.assertMatches( self._values( indicators.atr( 14 ) ), true_range.ewm( alpha=1 / 14, adjust=False ).mean() )
+
+    def test_vwap( self ):
+        self.assertMatches( self._values( indicators.vwap() ), pd.Series( self.prices ).expanding().mean() )
+
+        bars = [ Bar( point.time_stamp, point.price, point.price, point.price + 0.2, point.price - 0.1, volume )
+                 for point, volume in zip( self.points, range( 1, 501 ) ) ]
+        bars[ 250: ] = [ bar._replace( time_stamp=bar.time_stamp + datetime.timedelta( days=1 ) ) for bar in bars[ 250: ] ]
+        frame = pd.DataFrame( bars, columns=Bar._fields )
+        typical = ( frame.high + frame.low + frame.price ) / 3 * frame.volume
+        day = frame.time_stamp.dt.date
+        expected = typical.groupby( day ).cumsum() / frame.volume.groupby( day ).cumsum()
+        self.assertMatches( self._values( indicators.vwap(), bars ), expected )
+
+    def test_breakout( self ):
+        for repeat in ( False, True ):
+            cr = indicators.breakout( 10, repeat=repeat )
+            signals = [ i for i, point in enumerate( self.points ) if cr.send( ( point, None ) ) ]
+            expected = [ i for i in range( 10, len( self.prices ) ) if self.prices[ i ] > max( self.prices[ i - 10:i ] ) ]
+            self.assertEqual( expected if repeat else expected[ :1 ], signals )
+
+    def test_crossover( self ):
+        fast = pd.Series( self.prices ).rolling( 5 ).mean()
+        slow = pd.Series( self.prices ).rolling( 20 ).mean()
+        above = ( fast > slow )[ 19: ]
+        crossed = [ i for i in range( 20, len( self.prices ) ) if above[ i ] != above[ i - 1 ] ]
+        for below in ( False, True ):
+            cr = indicators.crossover( 5, 20, kind='sma', below=below )
+            signals = [ i for i, point in enumerate( self.points ) if cr.send( ( point, None ) ) ]
+            self.assertEqual( [ i for i in crossed if above[ i ] != below ], signals )
+        self.assertTrue( crossed )
+
+    def test_in_strategy( self ):
+        # the strategy only sends the entry rule points while flat: the rule still sees the whole day
+        points = self.points[ :360 ] # 9:30 to 15:29
+        for rule in ( lambda: indicators.breakout( 10, repeat=True ), lambda: indicators.crossover( 3, 8, kind='sma' ) ):
+            reference = rule()
+            fired = [ bool( reference.send( ( point, None ) ) ) for point in points ]
+
+            expected, flat, held = [], True, 0
+            for i, point in enumerate( points ):
+                if flat and fired[ i ]:
+                    expected.append( point.time_stamp.strftime( '%Y-%m-%d %H:%M:%S' ) )
+                    flat, held = False, 0
+                elif not flat:
+                    held += 1
+                    flat = held == 3
+
+            session = Session().open( [ Config( 'T', 0.1, [ rule() ], [ every( 3 ) ] ) ], lambda symbol: iter( points ) )
+            session.process()
+            buys = [ time_stamp for time_stamp, _ in session.pnl.positions[ 'T' ].buys ]
+            self.assertGreater( len( buys ), 10 )
+            self.assertEqual( expected, buys )
+
+if __name__ == '__main__':
+    unittest.main()
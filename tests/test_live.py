@@ -0,0 +1,208 @@
+import asyncio
+import datetime
+import gc
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+
+from core import Config, Point
+from coroutines import initial_breakout, time_based, stop_loss, stop_profit
+from data_providers import aggregate
+from live import run_async
+import recorder
+from session import Session
+
+
+class FakeFeed( object ):
+    ''' local stand-in for custom.get_data_point / submit_order, with an adjustable delay per symbol '''
+    def __init__( self, points, delays=None ):
+        self.points   = { symbol: iter( series ) for symbol, series in points.items() }
+        self.delays   = delays or {}
+        self.finished = {} # symbol -> { symbol: points served } when it ran out
+        self.served   = dict.fromkeys( points, 0 )
+        self.orders   = []
+        self.lock     = threading.Lock()
+
+    def get_data_point( self, symbol ):
+        time.sleep( self.delays.get( symbol, 0 ) )
+        point = next( self.points[ symbol ], None )
+        with self.lock:
+            if point is None:
+                self.finished[ symbol ] = dict( self.served )
+                return None
+            self.served[ symbol ] += 1
+        return point.time_stamp, point.price
+
+    def submit_order( self, symbol, qty, is_entry ):
+        with self.lock:
+            self.orders.append( ( symbol, qty, is_entry ) )
+        return None # fill at the signal price
+
+class EndlessFeed( object ):
+    ''' 'count' trading minutes per symbol, day after day, generated on the fly.
+        Traced memory is sampled - with the recording written out - once the first symbol reaches each checkpoint.
+    '''
+    def __init__( self, count, checkpoints ):
+        self.count       = count
+        self.checkpoints = set( checkpoints )
+        self.served      = {}
+        self.memory      = []
+        self.lock        = threading.Lock()
+
+    def get_data_point( self, symbol ):
+        with self.lock:
+            served = self.served[ symbol ] = self.served.get( symbol, 0 ) + 1
+            if served in self.checkpoints:
+                self.checkpoints.discard( served )
+                recorder.default().flush()
+                gc.collect()
+                self.memory.append( tracemalloc.get_traced_memory()[0] )
+        if served > self.count:
+            return None
+        day, minute = divmod( served - 1, 390 )
+        time_stamp = datetime.datetime( 2020, 1, 1, 9, 30 ) + datetime.timedelta( days=day, minutes=minute )
+        return time_stamp, 50.0 + 5 * ( minute % 60 ) / 60.0 + ( day % 7 ) # a saw tooth, breaking out every day
+
+    def submit_order( self, symbol, qty, is_entry ):
+        return None
+
+def day_points( base, moves ):
+    start = datetime.datetime( 2020, 4, 1, 9, 30 )
+    price = base
+    points = []
+    for minute, move in enumerate( moves ):
+        price += move
+        points.append( Point( start + datetime.timedelta( minutes=minute ), price ) )
+    return points
+
+def make_configs():
+    return [ Config( symbol=symbol, equity_pct=0.40,
+                     entry_rules=[initial_breakout(3)],
+                     exit_rules =[time_based(14,15), stop_loss(0.02), stop_profit(0.01)] ) for symbol in ( 'FAST', 'SLOW' ) ]
+
+class TestLive(unittest.TestCase):
+
+    def setUp( self ):
+        logging.disable( logging.CRITICAL )
+        self.cwd = os.getcwd()
+        self.folder = tempfile.mkdtemp()
+        os.chdir( self.folder )
+        os.makedirs( 'data' ) # live points are recorded to data/<symbol>.csv
+
+        moves = [ 0.1, -0.2, 0.1, 0.3, 0.2, 0.4, 0.3, -0.1, 0.2, 0.1 ] * 2
+        self.points = { 'FAST': day_points( 50.0, moves ), 'SLOW': day_points( 20.0, moves ) }
+
+    def tearDown( self ):
+        os.chdir( self.cwd )
+        shutil.rmtree( self.folder )
+        logging.disable( logging.NOTSET )
+
+    def run_live( self, feed, **kwargs ):
+        session = Session()
+        report = asyncio.run( run_async( make_configs(), interval=0, charts=False, session=session,
+                                         get_data_point=feed.get_data_point, submit_order=feed.submit_order, **kwargs ) )
+        return report, session
+
+    def test_matches_replay( self ):
+        report, session = self.run_live( FakeFeed( self.points ) )
+
+        replay = Session().open( make_configs(), lambda symbol: iter( self.points[ symbol ] ) )
+        replay.process()
+
+        self.assertEqual( replay.pnl.get_report(), report )
+        for symbol in ( 'FAST', 'SLOW' ):
+            self.assertEqual( replay.pnl.positions[ symbol ].buys, session.pnl.positions[ symbol ].buys )
+            self.assertEqual( replay.pnl.positions[ symbol ].sells, session.pnl.positions[ symbol ].sells )
+        self.assertTrue( session.pnl.positions[ 'FAST' ].buys )
+
+    def test_bars( self ):
+        # six ticks per minute, aggregated into minute bars before the rules see them
+        ticks = { symbol: [ Point( point.time_stamp + datetime.timedelta( seconds=10 * i ), point.price + 0.01 * i )
+                            for point in points for i in range( 6 ) ] for symbol, points in self.points.items() }
+        report, session = self.run_live( FakeFeed( ticks ), bar_size='1m' )
+
+        bars = { symbol: list( aggregate( series, '1m' ) ) for symbol, series in ticks.items() }
+        replay = Session().open( make_configs(), lambda symbol: iter( bars[ symbol ] ) )
+        replay.process()
+        self.assertEqual( replay.pnl.get_report(), report )
+        self.assertEqual( replay.pnl.positions[ 'FAST' ].buys, session.pnl.positions[ 'FAST' ].buys )
+
+        # one row recorded per bar
+        with open( os.path.join( 'data', 'FAST.csv' ) ) as f:
+            self.assertEqual( len( bars[ 'FAST' ] ), len( f.readlines() ) )
+
+    def test_one_feed_per_symbol( self ):
+        feed = FakeFeed( self.points )
+        configs = make_configs() + [ Config( symbol='FAST', equity_pct=0.10, entry_rules=[initial_breakout(5)], exit_rules=[stop_profit(0.01)] ) ]
+        asyncio.run( run_async( configs, interval=0, charts=False, session=Session(),
+                                get_data_point=feed.get_data_point, submit_order=feed.submit_order ) )
+
+        # every point reached both FAST strategies, and was recorded once
+        with open( os.path.join( 'data', 'FAST.csv' ) ) as f:
+            self.assertEqual( len( self.points[ 'FAST' ] ), len( f.readlines() ) )
+        self.assertEqual( 2, len( [ order for order in feed.orders if order[0] == 'FAST' and order[2] ] ) )
+
+    def test_slow_feed_does_not_block_others( self ):
+        feed = FakeFeed( self.points, delays={ 'SLOW': 0.02 } )
+        self.run_live( feed )
+
+        # the fast symbol is done while the slow one has served only a few of its points, whatever the machine's speed
+        self.assertEqual( len( self.points[ 'SLOW' ] ), feed.finished[ 'SLOW' ][ 'SLOW' ] )
+        self.assertLess( feed.finished[ 'FAST' ][ 'SLOW' ], len( self.points[ 'SLOW' ] ) // 2 )
+
+    def test_stop_still_reports( self ):
+        feed = FakeFeed( { symbol: points * 100 for symbol, points in self.points.items() }, delays={ 'FAST': 0.01, 'SLOW': 0.01 } )
+
+        async def stop_soon( stop ):
+            await asyncio.sleep( 0.1 )
+            stop.set()
+
+        async def main():
+            stop = asyncio.Event()
+            session = Session()
+            report, _ = await asyncio.gather( run_async( make_configs(), interval=0, charts=False, session=session, stop=stop,
+                                                         get_data_point=feed.get_data_point, submit_order=feed.submit_order ),
+                                              stop_soon( stop ) )
+            return report, session
+
+        report, session = asyncio.run( main() )
+        self.assertEqual( 25000, report.starting_equity )
+        self.assertNotIn( 'FAST', feed.finished ) # stopped before running out of data
+        self.assertFalse( any( strategy.active for strategy in session.strategies ) )
+
+    def test_bounded_memory( self ):
+        count = 8000 # ~20 trading days per symbol
+        feed  = EndlessFeed( count, checkpoints=( 2000, count ) )
+        session = Session()
+        tracemalloc.start()
+        try:
+            asyncio.run( run_async( make_configs(), interval=0, session=session, window=30,
+                                    get_data_point=feed.get_data_point, submit_order=feed.submit_order ) )
+        finally:
+            tracemalloc.stop()
+
+        start, end = feed.memory
+        self.assertLess( end - start, 300000 ) # keeping the points would take over 1MB
+        self.assertEqual( [], session.pnl.positions[ 'FAST' ].all_points )
+        self.assertGreater( len( session.pnl.positions[ 'FAST' ].buys ), 10 )
+
+    def test_bounded_memory_charts_from_recording( self ):
+        feed = EndlessFeed( 1000, checkpoints=() )
+        session = Session()
+        asyncio.run( run_async( make_configs(), interval=0, session=session, window=30,
+                                get_data_point=feed.get_data_point, submit_order=feed.submit_order ) )
+
+        last_day = datetime.date( 2020, 1, 3 ) # minutes 780 to 999
+        for symbol in ( 'FAST', 'SLOW' ):
+            with open( os.path.join( 'charts', 'live', '{}_{}.html'.format( last_day, symbol ) ) ) as f:
+                chart = f.read()
+            self.assertIn( '"2020-01-03T13:09:00"]', chart ) # the day's last point ends the line
+            self.assertNotIn( '2020-01-02T', chart )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
 import unittest
 
 import datetime
+import numpy as np
 from   core import Config, Point, Trade
-from   positions import Pnl, Position
+from   positions import Pnl, Position, TradeLog
 from   signals import Signal
 
 class TestPositions(unittest.TestCase):
@@ -237,5 +238,42 @@ class TestPositions(unittest.TestCase):
         self.assertEqual( -4, report.total_commissions )
         self.assertEqual( -100, report.total_pl )
 
+    def test_trade_log( self ):
+        config1 = Config( symbol='T1', equity_pct=0.50, entry_rules=[], exit_rules=[] )
+        config2 = Config( symbol='T2', equity_pct=0.50, entry_rules=[], exit_rules=[] )
+        pnl = Pnl()
+        pnl.initialize( [config1, config2], 10**6, 0 )
+        pnl.trades.capacity = 4
+        pnl.trades.reset() # the positions log into it: start it over small
+
+        start = datetime.datetime( 2020, 4, 1, 9, 30, 15, 500 )
+        for i in range( 10 ): # grows past the capacity
+            signal = Signal( Point( start + datetime.timedelta( minutes=i ), 100.0 + i ), desc='exit' if i % 2 else 'entry', is_entry=i % 2 == 0,
+                             symbol='T1' if i < 6 else 'T2' )
+            pnl.handle_fill( Trade( signal, 10 + i, 100.0 + i ) )
+
+        self.assertEqual( 10, len( pnl.trades ) )
+        self.assertEqual( 16, len( pnl.trades.arrays[ 'qty' ] ) ) # grew twice
+        self.assertEqual( [ ( '2020-04-01 09:30:15', 'entry' ), ( '2020-04-01 09:32:15', 'entry' ), ( '2020-04-01 09:34:15', 'entry' ) ], pnl.positions[ 'T1' ].buys )
+        self.assertEqual( [ ( '2020-04-01 09:37:15', 'exit' ), ( '2020-04-01 09:39:15', 'exit' ) ], pnl.positions[ 'T2' ].sells )
+        self.assertEqual( 250.0, pnl.positions[ 'T2' ].realized_pl ) # 17 @ 107 - 16 @ 106 + 19 @ 109 - 18 @ 108
+
+        columns = pnl.trades.columns()
+        frame = pnl.trades.to_frame()
+        self.assertEqual( list( range( 10, 20 ) ), frame[ 'qty' ].tolist() )
+        self.assertEqual( [ 'T1' ] * 6 + [ 'T2' ] * 4, frame[ 'symbol' ].tolist() )
+        self.assertEqual( [ TradeLog.BUY, TradeLog.SELL ] * 5, frame[ 'side' ].tolist() )
+        self.assertEqual( np.datetime64( start ), frame[ 'time_stamp' ].values[ 0 ] )
+        for name in ( 'time_stamp', 'qty', 'price', 'side' ):
+            self.assertTrue( np.shares_memory( columns[ name ], frame[ name ].values ) ) # no copies
+
+    def test_slots( self ):
+        point = Point( datetime.datetime( 2020, 4, 1, 9, 30 ), 100.0 )
+        signal = Signal( point, desc='Test Signal', symbol='T1' )
+        for item in ( signal, Trade( signal, 10, 100.0 ), Position( 0 ) ):
+            self.assertFalse( hasattr( item, '__dict__' ) )
+        self.assertIn( "desc='Test Signal'", repr( signal ) )
+        self.assertIn( "qty=10", repr( Trade( signal, 10, 100.0 ) ) )
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,76 @@
+import datetime
+import json
+import os
+import unittest
+
+import app
+from coroutines import all_conditions, initial_breakout, time_based
+from positions import Pnl
+from profiling import Profiler, Stat, label_of
+from session import Session
+from tests.fixtures import DataTestCase, breakout_configs
+
+def make_configs():
+    return breakout_configs( period=30, repeat=True, stop=0.003, profit=0.003 )
+
+class TestProfiling(DataTestCase):
+
+    def test_labels( self ):
+        self.assertEqual( 'initial_breakout(30, repeat=True)', label_of( initial_breakout( 30, repeat=True ) ) )
+        self.assertEqual( 'all_conditions([initial_breakout(15), time_based(10, 0)])',
+                          label_of( all_conditions( [ initial_breakout( 15 ), time_based( 10, 0 ) ] ) ) )
+
+        def custom():
+            while True:
+                yield
+        self.assertEqual( 'custom(?)', label_of( custom() ) )
+
+    def test_histogram( self ):
+        stat = Stat()
+        for elapsed in [ 100 ] * 98 + [ 5000, 70000 ]:
+            stat.add( elapsed )
+        self.assertEqual( 98, stat.histogram[ 7 ] ) # 64 <= 100 < 128
+        self.assertEqual( 128, stat.percentile( 0.5 ) )
+        self.assertEqual( 8192, stat.percentile( 0.99 ) )
+        self.assertEqual( 70000, stat.percentile( 1 ) )
+        self.assertEqual( 70.0, stat.summary()[ 'max_us' ] )
+
+    def test_profiled_run( self ):
+        expected = app.run( make_configs(), charts=False )
+        expected_trades = Pnl().positions[ 'TEST' ].buys + Pnl().positions[ 'TEST' ].sells
+        points = sum( 1 for line in open( os.path.join( 'data', 'TEST.csv' ) ) )
+
+        self.assertEqual( expected, app.run( make_configs(), charts=False, vectorized=True, profile='profile.json' ) )
+        self.assertEqual( expected_trades, Pnl().positions[ 'TEST' ].buys + Pnl().positions[ 'TEST' ].sells )
+
+        with open( 'profile.json' ) as f:
+            summary = json.load( f )
+        stages = summary[ 'stages' ]
+        self.assertEqual( [ 'data', 'process', 'buffer', 'pnl', 'rules', 'execute' ], list( stages ) )
+        self.assertEqual( points, stages[ 'process' ][ 'count' ] )
+        self.assertEqual( points, stages[ 'data' ][ 'count' ] ) # plus the end of the data, which isn't timed
+        self.assertGreaterEqual( stages[ 'execute' ][ 'count' ], len( expected_trades ) ) # signals, some are sized to nothing
+        self.assertEqual( sum( stages[ 'rules' ][ 'histogram' ].values() ), stages[ 'rules' ][ 'count' ] )
+
+        rules = summary[ 'rules' ]
+        self.assertEqual( { 'time_based(15, 59)', 'initial_breakout(30, repeat=True)', 'time_based(14, 15)', 'stop_loss(0.003)', 'stop_profit(0.003)' }, set( rules ) )
+        self.assertEqual( stages[ 'buffer' ][ 'count' ], rules[ 'time_based(15, 59)' ][ 'count' ] ) # the end of day exit sees every point
+
+    def test_session_profiler( self ):
+        profiler = Profiler()
+        session = Session( profiler=profiler )
+        app.run( make_configs(), specific_day=datetime.datetime( 2020, 4, 2 ), charts=False, session=session )
+        app.run( make_configs(), specific_day=datetime.datetime( 2020, 4, 3 ), charts=False, session=session )
+
+        self.assertEqual( 780, profiler.stages[ 'process' ].count ) # two days of minutes
+        lines = profiler.table().splitlines()
+        self.assertEqual( 'stage data', lines[1].split( '  ' )[0] )
+        self.assertTrue( any( line.startswith( 'rule stop_loss(0.003) ' ) for line in lines ) )
+
+    def test_off_by_default( self ):
+        session = Session().open( make_configs(), lambda symbol: iter( () ) )
+        self.assertIsNone( session.profiler )
+        self.assertIsNone( session.strategies[0].profiler )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from core import Point
+from recorder import Recorder
+from storage import parse_row
+
+def points( count, day=1 ):
+    start = datetime.datetime( 2020, 4, day, 9, 30, 0, 123456 ) # microseconds are dropped when recording
+    return [ Point( start + datetime.timedelta( minutes=i ), 50.0 + i ) for i in range( count ) ]
+
+class TestRecorder(unittest.TestCase):
+
+    def setUp( self ):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown( self ):
+        shutil.rmtree( self.folder )
+
+    def read( self, name ):
+        with open( os.path.join( self.folder, name ), 'rb' ) as f:
+            return [ parse_row( line ) for line in f ]
+
+    def test_records_all_symbols( self ):
+        symbols = [ 'S{}'.format( i ) for i in range( 50 ) ]
+        with Recorder( self.folder, batch_size=64 ) as recorder:
+            for point in points( 30 ):
+                for symbol in symbols:
+                    recorder.record( symbol, point )
+
+        expected = [ parse_row( '{:%Y-%m-%d %H:%M:%S},{}'.format( p.time_stamp, p.price ).encode() ) for p in points( 30 ) ]
+        for symbol in symbols:
+            self.assertEqual( expected, self.read( symbol + '.csv' ) )
+        # each file is opened once, not once per batch
+        self.assertEqual( 50, recorder.files_opened )
+
+    def test_flushes_on_size( self ):
+        recorder = Recorder( self.folder, batch_size=10, flush_interval=60 )
+        for point in points( 25 ):
+            recorder.record( 'TEST', point )
+        time.sleep( 0.2 )
+        self.assertEqual( 20, len( self.read( 'TEST.csv' ) ) ) # the last 5 are still buffered
+        recorder.close()
+        self.assertEqual( 25, len( self.read( 'TEST.csv' ) ) )
+
+    def test_flushes_on_time( self ):
+        recorder = Recorder( self.folder, batch_size=1000, flush_interval=0.05 )
+        for point in points( 5 ):
+            recorder.record( 'TEST', point )
+        time.sleep( 0.3 )
+        self.assertEqual( 5, len( self.read( 'TEST.csv' ) ) )
+        recorder.close()
+
+    def test_bounded_open_files( self ):
+        with Recorder( self.folder, batch_size=7, max_open_files=4 ) as recorder:
+            for point in points( 10 ):
+                for symbol in ( 'A', 'B', 'C', 'D', 'E', 'F' ):
+                    recorder.record( symbol, point )
+            recorder.flush()
+            self.assertLessEqual( len( recorder.files ), 4 )
+
+        for symbol in ( 'A', 'B', 'C', 'D', 'E', 'F' ):
+            self.assertEqual( 10, len( self.read( symbol + '.csv' ) ) )
+
+    def test_daily_rotation( self ):
+        with Recorder( self.folder, rotate_daily=True ) as recorder:
+            for point in points( 3, day=1 ) + points( 4, day=2 ):
+                recorder.record( 'TEST', point )
+
+        self.assertEqual( 3, len( self.read( 'TEST_2020-04-01.csv' ) ) )
+        self.assertEqual( 4, len( self.read( 'TEST_2020-04-02.csv' ) ) )
+        self.assertFalse( os.path.exists( os.path.join( self.folder, 'TEST.csv' ) ) )
+
+    def test_history( self ):
+        for rotate_daily in ( False, True ):
+            with Recorder( os.path.join( self.folder, str( rotate_daily ) ), rotate_daily=rotate_daily ) as recorder:
+                for point in points( 5, day=1 ) + points( 3, day=2 ):
+                    recorder.record( 'TEST', point )
+                time_stamps, prices = recorder.history( 'TEST', datetime.date( 2020, 4, 2 ) )
+                self.assertEqual( [ 50.0, 51.0, 52.0 ], prices.tolist() )
+                self.assertEqual( [ p.time_stamp.replace( microsecond=0 ) for p in points( 3, day=2 ) ], time_stamps.tolist() )
+
+                self.assertEqual( 0, len( recorder.history( 'TEST', datetime.date( 2020, 4, 3 ) )[1] ) )
+                self.assertEqual( 0, len( recorder.history( 'OTHER', datetime.date( 2020, 4, 2 ) )[1] ) )
+
+    def test_closed( self ):
+        recorder = Recorder( self.folder, batch_size=4 )
+        for point in points( 10 ):
+            recorder.record( 'TEST', point )
+        recorder.close()
+        recorder.flush() # returns: nothing left to write
+        self.assertEqual( 10, len( recorder.history( 'TEST', datetime.date( 2020, 4, 1 ) )[1] ) )
+        self.assertRaises( ValueError, recorder.record, 'TEST', points( 1 )[0] )
+
+if __name__ == '__main__':
+    unittest.main()
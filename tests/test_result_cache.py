@@ -0,0 +1,117 @@
+import collections
+import os
+import unittest
+
+from app import run_dates
+from core import Config
+from coroutines import coroutine, initial_breakout, stop_loss, stop_profit, time_based
+from result_cache import ResultCache
+from tests.fixtures import enter_data_folder, leave_data_folder
+
+calls = collections.Counter()
+
+@coroutine
+def counted():
+    ''' never signals, counts the points it's sent '''
+    while True:
+        point, _ = (yield)
+        calls[ point.time_stamp.date() ] += 1
+
+def make_configs( equity_pct=0.5 ):
+    return [ Config( 'TEST', equity_pct, [ initial_breakout( 30 ) ], [ time_based( 14, 15 ), stop_loss( 0.005 ), stop_profit( 0.005 ) ] ),
+             Config( 'TEST', 0.1, [ counted() ], [] ) ]
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp( self ):
+        # every test gets fresh data: they edit the csv and fill the cache
+        self.cwd, self.folder = enter_data_folder( 11, num_days=4 )
+        calls.clear()
+
+    def tearDown( self ):
+        leave_data_folder( self.cwd, self.folder )
+
+    def _run( self, configs, **kwargs ):
+        trades = []
+        reports, total = run_dates( configs, save_charts=False, charts=False, trades=trades, **kwargs )
+        return reports, total, trades
+
+    def test_loads_unchanged_days( self ):
+        expected = self._run( make_configs() )
+        self.assertNotEqual( [], [ buys for _, _, buys, _ in expected[ 2 ] if buys ] )
+
+        calls.clear()
+        self.assertEqual( expected, self._run( make_configs(), cache=True ) )
+        self.assertEqual( 3, len( calls ) )
+
+        calls.clear()
+        self.assertEqual( expected, self._run( make_configs(), cache=True ) )
+        self.assertEqual( {}, calls ) # nothing ran
+
+        self._run( make_configs( equity_pct=0.25 ), cache=True )
+        self.assertEqual( 3, len( calls ) ) # another config, new keys
+        calls.clear()
+        self._run( make_configs(), cache=True, commission=1 )
+        self.assertEqual( 3, len( calls ) )
+
+    def test_data_change( self ):
+        self._run( make_configs(), cache=True )
+        with open( os.path.join( 'data', 'TEST.csv' ) ) as f:
+            lines = f.readlines()
+        day = lines[ -1 ][ :10 ]
+        time_stamp, price = lines[ -2 ].strip().split( ',' )[ :2 ]
+        lines[ -2 ] = '{},{}\n'.format( time_stamp, float( price ) + 1 )
+        with open( os.path.join( 'data', 'TEST.csv' ), 'w' ) as f:
+            f.writelines( lines )
+
+        calls.clear()
+        reports, _, _ = self._run( make_configs(), cache=True )
+        self.assertEqual( [ day ], [ str( date ) for date in calls ] ) # only the day that changed ran again
+        self.assertEqual( 3, len( reports ) )
+
+    def test_invalidate_and_evict( self ):
+        cache = ResultCache( os.path.join( 'data', 'cache', 'results' ) )
+        reports, _, _ = self._run( make_configs(), cache=cache )
+        self.assertEqual( 1, cache.invalidate( reports[ 0 ][ 0 ] ) )
+        calls.clear()
+        self._run( make_configs(), cache=cache )
+        self.assertEqual( [ reports[ 0 ][ 0 ] ], list( calls ) )
+
+        paths = sorted( cache._entries() )
+        for age, path in enumerate( reversed( paths ) ):
+            os.utime( path, ( 1000 - age, 1000 - age ) ) # the first day is the least recently used
+        cache.evict( sum( os.path.getsize( path ) for path in paths[ 1: ] ) )
+        self.assertEqual( paths[ 1: ], sorted( cache._entries() ) )
+        self.assertEqual( 2, cache.invalidate() )
+        self.assertEqual( [], cache._entries() )
+
+    def test_evicts_only_when_full( self ):
+        cache = ResultCache( os.path.join( 'data', 'cache', 'results' ) )
+        evictions = []
+        evict = cache.evict
+        cache.evict = lambda *args: evictions.append( args ) or evict( *args )
+        self._run( make_configs(), cache=cache )
+        self.assertEqual( [], evictions ) # under max_bytes: the folder isn't scanned for every day stored
+        size = sum( os.path.getsize( path ) for path in cache._entries() )
+        self.assertEqual( size, cache.bytes )
+
+        small = ResultCache( os.path.join( 'data', 'cache', 'small' ), max_bytes=size - 1 )
+        small.evict = lambda *args: evictions.append( args ) or ResultCache.evict( small, *args )
+        self._run( make_configs(), cache=small )
+        self.assertEqual( 1, len( evictions ) ) # the third day went over
+        self.assertEqual( 2, len( small._entries() ) )
+        self.assertEqual( sum( os.path.getsize( path ) for path in small._entries() ), small.bytes )
+
+    def test_custom_rules_without_factory( self ):
+        def plain():
+            while True:
+                yield
+        cr = plain()
+        next( cr )
+        configs = [ Config( 'TEST', 0.5, [ cr ], [] ) ]
+        self.assertIsNone( ResultCache().keys( configs, [ day for day, _ in self._run( make_configs() )[ 0 ] ] ) )
+        self._run( configs, cache=True ) # runs uncached
+        self.assertEqual( [], ResultCache()._entries() )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import collections
+import datetime
+import pickle
+import unittest
+
+import app
+from core import Config, Point
+from coroutines import all_conditions, coroutine, describe, initial_breakout, spec_tree, stop_loss, stop_profit, time_based
+from positions import Pnl
+from rule_graph import Proxy, RuleGraph
+from session import Session
+from signals import Signal
+from tests.fixtures import DataTestCase
+
+calls = collections.Counter()
+
+@coroutine
+def counted( name, every ):
+    ''' signals every 'every'th point it's sent, and counts them '''
+    signal = None
+    count  = 0
+    while True:
+        point, _ = (yield signal)
+        calls[ name ] += 1
+        count += 1
+        signal = Signal( point=point, desc=name ) if count % every == 0 else None
+
+def make_configs():
+    return [ Config( 'TEST', 0.05, [ initial_breakout( 15, repeat=True ) ], [ time_based( 14, 15 ), stop_loss( stop ), stop_profit( 0.005 ) ] )
+             for stop in ( 0.001, 0.002, 0.005 ) ]
+
+class TestRuleGraph(DataTestCase):
+
+    seed     = 5
+    num_days = 4
+
+    def setUp( self ):
+        calls.clear()
+
+    def _trades( self, session ):
+        position = session.pnl.positions[ 'TEST' ]
+        return list( position.buys ), list( position.sells )
+
+    def test_same_results( self ):
+        for merge in ( False, True ):
+            separate = Session( Pnl() )
+            expected = app.run( make_configs(), charts=False, cash=10**7, session=separate, merge=merge )
+            shared = Session( Pnl() )
+            report = app.run( make_configs(), charts=False, cash=10**7, session=shared, merge=merge, share_rules=True )
+
+            self.assertEqual( expected, report )
+            self.assertNotEqual( [], self._trades( separate )[ 1 ] )
+            self.assertEqual( self._trades( separate ), self._trades( shared ) )
+            self.assertIsInstance( shared.strategies[ 0 ].config.entry_rules[ 0 ], Proxy )
+
+        expected = app.run_dates( make_configs(), save_charts=False, charts=False, single_pass=True, cash=10**7 )
+        self.assertEqual( expected, app.run_dates( make_configs(), save_charts=False, charts=False, single_pass=True, cash=10**7, share_rules=True ) )
+
+    def test_runs_once_per_point( self ):
+        def configs():
+            return [ Config( 'TEST', 0.1, [ counted( 'entry', 10**6 ) ], [ counted( 'exit', 10**6 ) ] ) for _ in range( 5 ) ]
+        day = datetime.datetime( 2020, 4, 2 )
+        app.run( configs(), specific_day=day, charts=False )
+        self.assertEqual( 5 * 390, calls[ 'entry' ] )
+
+        calls.clear()
+        app.run( configs(), specific_day=day, charts=False, share_rules=True )
+        self.assertEqual( 390, calls[ 'entry' ] )
+        self.assertEqual( 0, calls[ 'exit' ] ) # never in position
+
+    def test_elements( self ):
+        graph = RuleGraph()
+        rules = [ all_conditions( [ counted( 'shared', 3 ), counted( 'own', every ) ] ) for every in ( 10**6, 10**7 ) ]
+        for cr in rules:
+            graph.add( cr )
+        shared = [ graph.share( cr ) for cr in rules ]
+
+        self.assertNotIsInstance( shared[ 0 ], Proxy ) # rebuilt around a shared element
+        self.assertEqual( spec_tree( rules[ 0 ] ), spec_tree( shared[ 0 ] ) )
+        self.assertEqual( describe( rules[ 1 ] ), describe( shared[ 1 ] ) )
+
+        start = datetime.datetime( 2020, 4, 6, 9, 30 )
+        points = [ Point( start + datetime.timedelta( minutes=i ), 10.0 ) for i in range( 24 ) ]
+        separate = [ [ bool( cr.send( ( point, None ) ) ) for cr in rules ] for point in points ]
+        calls.clear()
+        results = []
+        for point in points:
+            graph.tick += 1
+            results.append( [ bool( cr.send( ( point, None ) ) ) for cr in shared ] )
+        self.assertEqual( separate, results )
+        self.assertEqual( 24, calls[ 'shared' ] )
+        self.assertEqual( 48, calls[ 'own' ] )
+
+    def test_out_of_step( self ):
+        # the second proxy skips points: it forks off with the state the rule would have had
+        graph = RuleGraph()
+        rules = [ counted( 'rule', 2 ), counted( 'rule', 2 ) ]
+        for cr in rules:
+            graph.add( cr )
+        first, second = [ graph.share( cr ) for cr in rules ]
+        reference = counted( 'reference', 2 )
+
+        start = datetime.datetime( 2020, 4, 6, 9, 30 )
+        for i in range( 12 ):
+            graph.tick += 1
+            point = ( Point( start + datetime.timedelta( minutes=i ), 10.0 ), None )
+            first.send( point )
+            if i % 3:
+                self.assertEqual( bool( reference.send( point ) ), bool( second.send( point ) ) )
+        self.assertIsNot( first.node, second.node )
+
+    def test_reset_and_pickle( self ):
+        session = Session().open( make_configs(), lambda symbol: iter( () ), share_rules=True )
+        config = session.strategies[ 0 ].config
+        expected = spec_tree( make_configs()[ 0 ].entry_rules[ 0 ] )
+
+        self.assertEqual( expected, spec_tree( config.entry_rules[ 0 ] ) )
+        self.assertEqual( expected, spec_tree( pickle.loads( pickle.dumps( config ) ).entry_rules[ 0 ] ) )
+        config.reset()
+        self.assertNotIsInstance( config.entry_rules[ 0 ], Proxy )
+
+    def test_window( self ):
+        with self.assertRaises( ValueError ):
+            Session().open( make_configs(), lambda symbol: iter( () ), window=30, share_rules=True )
+
+if __name__ == '__main__':
+    unittest.main()
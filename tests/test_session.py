@@ -0,0 +1,127 @@
+import datetime
+import threading
+import unittest
+
+import app
+from core import Config, Point, execute_signal
+from coroutines import coroutine, time_based
+from data_providers import gen_csv_data
+from positions import Pnl, Portfolio
+from session import Session
+from signals import Signal
+from tests.fixtures import DataTestCase, breakout_configs
+
+def make_configs( period ):
+    return breakout_configs( period=period )
+
+class TestSession(DataTestCase):
+
+    seed = 3
+
+    def test_execute_signal_with_portfolio( self ):
+        portfolio = Portfolio()
+        portfolio.initialize( make_configs( 5 ), 1000, 0 )
+        Pnl().initialize( make_configs( 5 ), 50, 0 )
+
+        signal = Signal( Point( datetime.datetime.now(), 10.0 ), desc='Test Signal', equity_pct=0.5, symbol='TEST' )
+        trade = execute_signal( signal, portfolio )
+        self.assertEqual( 50, trade.qty )
+
+        # without a portfolio the signal is sized against the singleton, which can't afford it
+        self.assertIsNone( execute_signal( signal ) )
+        self.assertIsNot( portfolio, Pnl() )
+
+    def test_run_books_into_session( self ):
+        session = Session()
+        report = app.run( make_configs( 5 ), specific_day=datetime.datetime( 2020, 4, 2 ), charts=False, session=session )
+        self.assertEqual( report.ending_equity, int( session.pnl.current_equity ) )
+        self.assertNotEqual( [], [ p.buys for p in session.pnl.positions.values() if p.buys ] )
+
+    def test_replay_in_time_order( self ):
+        seen = []
+        @coroutine
+        def record( symbol ):
+            while True:
+                point, _ = (yield)
+                seen.append( ( point.time_stamp, symbol ) )
+
+        start = datetime.datetime( 2020, 4, 1, 9, 30 )
+        series = { 'A': [ 0, 1, 5, 6, 9 ], 'B': [ 0, 2, 3, 4, 5, 7, 8, 9 ], 'C': [ 9 ] }
+        configs = [ Config( symbol, 0.5, [ record( symbol ) ], [] ) for symbol in ( 'B', 'A', 'C' ) ]
+        session = Session().open( configs, lambda symbol: iter( [ Point( start + datetime.timedelta( minutes=m ), 10.0 ) for m in series[ symbol ] ] ) )
+        session.replay()
+
+        # time order; ties go by the order of the configs
+        self.assertEqual( sorted( ( start + datetime.timedelta( minutes=m ), symbol ) for symbol, minutes in series.items() for m in minutes ), sorted( seen ) )
+        self.assertEqual( sorted( seen, key=lambda item: ( item[0], 'BAC'.index( item[1] ) ) ), seen )
+        self.assertFalse( any( strategy.active for strategy in session.strategies ) )
+
+    def test_replay_spends_cash_in_time_order( self ):
+        start = datetime.datetime( 2020, 4, 1, 9, 30 )
+        series = { 'A': [ 15, 30 ], 'B': list( range( 30 ) ) } # A's 10:00 bar comes long after B's 9:59 bar
+        def configs():
+            return [ Config( 'A', 1.0, [ time_based( 10, 0 ) ], [] ), Config( 'B', 1.0, [ time_based( 9, 59 ) ], [] ) ]
+        def data( symbol ):
+            return iter( [ Point( start + datetime.timedelta( minutes=m ), 10.0 ) for m in series[ symbol ] ] )
+
+        round_robin = Session().open( configs(), data, cash=1000 )
+        round_robin.process()
+        self.assertEqual( ( 100, 0 ), ( round_robin.pnl.positions[ 'A' ].qty, round_robin.pnl.positions[ 'B' ].qty ) )
+
+        merged = Session().open( configs(), data, cash=1000 )
+        merged.replay()
+        self.assertEqual( ( 0, 100 ), ( merged.pnl.positions[ 'A' ].qty, merged.pnl.positions[ 'B' ].qty ) )
+
+    def test_step_executes_in_config_order( self ):
+        start = datetime.datetime( 2020, 4, 1, 9, 30 )
+        def data( symbol ):
+            return iter( [ Point( start + datetime.timedelta( minutes=m ), 10.0 ) for m in range( 3 ) ] )
+
+        # A and C share a feed, B comes between them: B gets the cash A left
+        configs = [ Config( 'X', 0.1, [ time_based( 9, 31 ) ], [] ), Config( 'Y', 1.0, [ time_based( 9, 31 ) ], [] ), Config( 'X', 1.0, [ time_based( 9, 31 ) ], [] ) ]
+        session = Session().open( configs, data, cash=1000 )
+        session.process()
+        self.assertEqual( ( 10, 90 ), ( session.pnl.positions[ 'X' ].total_qty, session.pnl.positions[ 'Y' ].qty ) )
+
+    def test_shared_feed( self ):
+        seen = { 'first': [], 'second': [] }
+        @coroutine
+        def record( name ):
+            while True:
+                point, df = (yield)
+                seen[ name ].append( ( point, len( df ), df.prices[ -1 ] ) )
+
+        opened = []
+        def data( symbol ):
+            opened.append( symbol )
+            return gen_csv_data( symbol, specific_day=datetime.datetime( 2020, 4, 2 ) )
+
+        configs = [ Config( 'TEST', 0.5, [ record( 'first' ) ], [] ), Config( 'TEST', 0.5, [ record( 'second' ) ], [] ) ]
+        session = Session().open( configs, data )
+        session.process()
+
+        self.assertEqual( [ 'TEST' ], opened )
+        self.assertEqual( [ 'TEST' ], list( session.feeds ) )
+        self.assertEqual( 390, len( seen[ 'first' ] ) )
+        self.assertEqual( seen[ 'first' ], seen[ 'second' ] )
+        self.assertEqual( [ point for point, _, _ in seen[ 'first' ] ], session.pnl.positions[ 'TEST' ].all_points ) # updated once per point
+
+    def test_concurrent_sessions( self ):
+        periods = [ 3, 5, 10, 20, 30, 45 ]
+        day = datetime.datetime( 2020, 4, 1 )
+        expected = [ app.run( make_configs( period ), specific_day=day, charts=False ) for period in periods ]
+
+        results = {}
+        def backtest( period ):
+            results[ period ] = app.run( make_configs( period ), specific_day=day, charts=False, session=Session() )
+
+        threads = [ threading.Thread( target=backtest, args=( period, ) ) for period in periods ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual( expected, [ results[ period ] for period in periods ] )
+
+if __name__ == '__main__':
+    unittest.main()
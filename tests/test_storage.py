@@ -0,0 +1,116 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import storage
+
+class TestColumnStore(unittest.TestCase):
+
+    def setUp( self ):
+        self.folder = tempfile.mkdtemp()
+        self.dt = datetime.datetime( 2020, 4, 1, 9, 30 )
+
+    def tearDown( self ):
+        shutil.rmtree( self.folder )
+
+    def _write_csv( self, symbol, rows, mode='w' ):
+        with open( os.path.join( self.folder, symbol + '.csv' ), mode ) as f:
+            for time_stamp, price in rows:
+                f.write( '{},{}\n'.format( time_stamp.strftime( '%Y-%m-%d %H:%M:%S' ), price ) )
+
+    def _rows( self, count, start=None, price=100.0 ):
+        start = start or self.dt
+        return [ ( start + datetime.timedelta( minutes=i ), price + i ) for i in range( count ) ]
+
+    def test_parse_lines_matches_parse_row( self ):
+        lines = [ b'2020-04-01 09:30:00,100.5', b'2020-04-01 09:31:00,99', b'2021-12-31 15:59:59,1e2\r' ]
+        time_stamps, prices = storage.parse_lines( lines )
+        self.assertEqual( [ storage.parse_row( line ) for line in lines ], list( zip( time_stamps.tolist(), prices.tolist() ) ) )
+
+        # extra columns don't fit the fixed layout and are parsed row by row
+        time_stamps, prices = storage.parse_lines( [ b'2020-04-01 09:30:00,100.5,7' ] )
+        self.assertEqual( [ storage.parse_row( b'2020-04-01 09:30:00,100.5,7' ) ], list( zip( time_stamps.tolist(), prices.tolist() ) ) )
+
+        with self.assertRaises( ValueError ):
+            storage.parse_lines( [ b'2020-02-30 09:30:00,100.5' ] )
+
+    def test_parse_across_chunks( self ):
+        self._write_csv( 'T1', self._rows( 50 ) )
+        with open( os.path.join( self.folder, 'T1.csv' ), 'ab' ) as f:
+            f.write( b'\r\n\n2020-04-01 10:20:00,1.5\r\n2020-04-01 10:21:00,2.5' ) # blank lines, crlf, no final line end
+
+        chunk_bytes = storage.CHUNK_BYTES
+        storage.CHUNK_BYTES = 100 # a few rows per chunk, cut mid-line
+        try:
+            store = storage.ColumnStore( 'T1', self.folder ).open()
+        finally:
+            storage.CHUNK_BYTES = chunk_bytes
+
+        self.assertEqual( [ 100.0 + i for i in range( 50 ) ] + [ 1.5, 2.5 ], store.prices.tolist() )
+        with open( os.path.join( self.folder, 'T1.csv' ), 'rb' ) as f:
+            expected = [ storage.parse_row( line )[0] for line in f if line.strip() ]
+        self.assertEqual( expected, store.time_stamps.tolist() )
+
+    def test_build_and_map( self ):
+        self._write_csv( 'T1', self._rows( 5 ) )
+        store = storage.ColumnStore( 'T1', self.folder ).open()
+
+        self.assertEqual( 5, len( store ) )
+        self.assertEqual( [100.0, 101.0, 102.0, 103.0, 104.0], store.prices.tolist() )
+        self.assertEqual( self.dt, storage.to_datetimes( store.time_stamps[:1] )[0] )
+        self.assertTrue( os.path.exists( os.path.join( self.folder, 'cache', 'T1.price' ) ) )
+
+    def test_rebuild_when_source_changes( self ):
+        self._write_csv( 'T1', self._rows( 3 ) )
+        store = storage.load( 'T1', self.folder )
+        self.assertEqual( 3, len( store ) )
+        self.assertIs( store, storage.load( 'T1', self.folder ) )
+
+        time.sleep( 0.01 )
+        self._write_csv( 'T1', self._rows( 2, price=50.0 ) )
+        store = storage.load( 'T1', self.folder )
+        self.assertEqual( [50.0, 51.0], store.prices.tolist() )
+
+    def test_date_index( self ):
+        day2 = datetime.datetime( 2020, 4, 2, 9, 30 )
+        self._write_csv( 'T1', self._rows( 3 ) + self._rows( 4, start=day2, price=200.0 ) )
+        store = storage.load( 'T1', self.folder )
+
+        self.assertEqual( [self.dt.date(), day2.date()], store.dates() )
+        self.assertEqual( [(3, 7)], store.day_rows( day2 ) )
+        self.assertEqual( [], store.day_rows( datetime.date( 2020, 4, 3 ) ) )
+
+        # byte offset points at the first row of the day in the csv
+        with open( os.path.join( self.folder, 'T1.csv' ), 'rb' ) as f:
+            f.seek( store.day_offset( day2.date() ) )
+            self.assertTrue( f.readline().startswith( b'2020-04-02 09:30:00,200.0' ) )
+
+    def test_append_updates_index( self ):
+        day2 = datetime.datetime( 2020, 4, 2, 9, 30 )
+        self._write_csv( 'T1', self._rows( 3 ) )
+        storage.load( 'T1', self.folder )
+
+        # rows for the same day, then a new day, are appended to the csv
+        time.sleep( 0.01 )
+        self._write_csv( 'T1', self._rows( 2, start=self.dt + datetime.timedelta( minutes=3 ), price=103.0 ), mode='a' )
+        self._write_csv( 'T1', self._rows( 2, start=day2, price=200.0 ), mode='a' )
+
+        store = storage.ColumnStore( 'T1', self.folder )
+        store.build = None # must not fall back to a full rebuild
+        store.open()
+
+        self.assertEqual( 7, len( store ) )
+        self.assertEqual( [(0, 5)], store.day_rows( self.dt ) )
+        self.assertEqual( [(5, 7)], store.day_rows( day2 ) )
+        self.assertEqual( [100.0, 101.0, 102.0, 103.0, 104.0, 200.0, 201.0], store.prices.tolist() )
+
+    def test_empty_file( self ):
+        self._write_csv( 'T1', [] )
+        store = storage.load( 'T1', self.folder )
+        self.assertEqual( 0, len( store ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import datetime
+import unittest
+
+import app
+import storage
+import sweep
+from tests.fixtures import DataTestCase
+
+class TestSweep(DataTestCase):
+
+    seed     = 5
+    num_days = 8
+
+    def test_combinations( self ):
+        combos = sweep.combinations( { 'stop_loss': [0.01, 0.02], 'period_length': [30, 45, 60] } )
+        self.assertEqual( 6, len( combos ) )
+        self.assertEqual( { 'period_length': 30, 'stop_loss': 0.01 }, combos[0] )
+
+    def test_sweep_matches_run_dates( self ):
+        grid = { 'period_length': [5, 30], 'stop_loss': [0.002, 0.01], 'stop_profit': [0.005], 'equity_pct': [0.5, 1.0] }
+        results = sweep.sweep( 'TEST', grid, workers=2, commission=0.01 )
+        days = len( storage.load( 'TEST' ).dates() )
+
+        self.assertEqual( 8, len( results ) )
+        self.assertEqual( list( range( 1, 9 ) ), list( results.index ) )
+        self.assertTrue( ( results['net'].diff().dropna() <= 0 ).all() ) # ranked
+        self.assertTrue( ( results['days'] == days ).all() )
+
+        # every row is what run_dates gives for the combination, with the tick loop
+        for _, row in results.iterrows():
+            params = { name: row[ name ] for name in grid }
+            params['period_length'] = int( params['period_length'] )
+            _, total = app.run_dates( [ sweep.breakout_config( 'TEST', **params ) ], save_charts=False, charts=False, commission=0.01 )
+            self.assertEqual( total.net, row['net'] )
+            self.assertEqual( total.total_commissions, row['total_commissions'] )
+
+    def test_date_range( self ):
+        start, end = datetime.date( 2020, 4, 2 ), datetime.date( 2020, 4, 7 )
+        results = sweep.sweep( 'TEST', { 'period_length': [30] }, start=start, end=end, workers=1 )
+        self.assertEqual( [ 4 ], list( results['days'] ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import datetime
+import random
+import unittest
+
+import app
+from core import Config
+from coroutines import coroutine, initial_breakout, time_based, stop_loss, stop_profit, all_conditions
+from generate_test_data import generate_multi_day_data, save_to_csv
+from positions import Pnl
+from tests.fixtures import DataTestCase
+import vectorized
+
+@coroutine
+def price_above( threshold ):
+    while True:
+        point, _ = (yield)
+
+def make_configs():
+    return [ Config( symbol='TEST', equity_pct=0.50,
+                     entry_rules=[initial_breakout(30)],
+                     exit_rules =[time_based(14,15), stop_loss(0.005), stop_profit(0.01)] ),
+             Config( symbol='TEST2', equity_pct=0.40,
+                     entry_rules=[all_conditions([initial_breakout(10, repeat=True), initial_breakout(20, repeat=True)]), time_based(13, 0)],
+                     exit_rules =[stop_profit(0.002), stop_loss(0.002)] ),
+             Config( symbol='TEST', equity_pct=0.30,
+                     entry_rules=[initial_breakout(3, repeat=True)],
+                     exit_rules =[stop_loss(0.001), time_based(10, 0)] ) ]
+
+def trades():
+    return { symbol: ( position.buys, position.sells, position.qty, position.realized_pl, position.mtm_pl, position.all_points )
+             for symbol, position in Pnl().positions.items() }
+
+class TestVectorized(DataTestCase):
+    ''' the vectorized engine has to produce exactly the trades of the tick loop '''
+
+    symbols  = ( 'TEST', 'TEST2' )
+    num_days = 8
+
+    @classmethod
+    def setUpClass( cls ):
+        super().setUpClass()
+        # a symbol with gaps, out of step with the others
+        save_to_csv( 'GAP', [ row for row in generate_multi_day_data( 'GAP', num_days=8 ) if random.random() < 0.7 ] )
+
+    def test_supports( self ):
+        self.assertTrue( vectorized.supports( make_configs() ) )
+
+        custom = Config( symbol='TEST', equity_pct=0.5, entry_rules=[price_above(10)], exit_rules=[stop_loss(0.01)] )
+        self.assertFalse( vectorized.supports( make_configs() + [custom] ) )
+
+        rule = stop_loss(0.01) # one rule object shared by two configs
+        shared = [ Config( symbol, 0.5, [initial_breakout(5)], [rule] ) for symbol in ( 'TEST', 'TEST2' ) ]
+        self.assertFalse( vectorized.supports( shared ) )
+
+    def test_same_trades_as_run( self ):
+        for specific_day in ( None, datetime.datetime( 2020, 4, 2 ) ):
+            expected = app.run( make_configs(), specific_day=specific_day, commission=0.01 )
+            expected_trades = trades()
+            report = app.run( make_configs(), specific_day=specific_day, commission=0.01, vectorized=True )
+
+            self.assertEqual( expected, report )
+            self.assertEqual( expected_trades, trades() )
+            self.assertTrue( any( buys for buys, _, _, _, _, _ in expected_trades.values() ) )
+
+    def test_same_reports_as_run_dates( self ):
+        expected = app.run_dates( make_configs(), save_charts=True )
+        self.assertEqual( expected, app.run_dates( make_configs(), save_charts=True, vectorized=True ) )
+
+    def test_same_trades_as_merged_run( self ):
+        def gapped():
+            configs = make_configs()
+            configs[1].symbol = 'GAP'
+            return configs
+
+        for specific_day in ( None, datetime.datetime( 2020, 4, 2 ) ):
+            expected = app.run( gapped(), specific_day=specific_day, commission=0.01, merge=True, charts=False )
+            expected_trades = trades()
+            report = app.run( gapped(), specific_day=specific_day, commission=0.01, vectorized=True, merge=True, charts=False )
+
+            self.assertEqual( expected, report )
+            self.assertEqual( expected_trades, trades() )
+
+    def test_falls_back_to_tick_loop( self ):
+        configs = make_configs()
+        configs[0].entry_rules.append( price_above(10) )
+        expected = app.run( make_configs(), specific_day=datetime.datetime( 2020, 4, 3 ) )
+        self.assertEqual( expected, app.run( configs, specific_day=datetime.datetime( 2020, 4, 3 ), vectorized=True ) )
+
+if __name__ == '__main__':
+    unittest.main()
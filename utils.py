@@ -1,12 +1,10 @@
-import collections
-import csv
+import collections.abc
 from   datetime import datetime
 import functools
-import pandas as pd
-import plotly.graph_objects as go
 import os
-import shutil
-import glob
+
+import charts
+import recorder
 
 class memoized(object):
    '''Decorator. Caches a function's return value each time it is called.
@@ -17,7 +15,7 @@ class memoized(object):
       self.func = func
       self.cache = {}
    def __call__(self, *args):
-      if not isinstance(args, collections.Hashable):
+      if not isinstance(args, collections.abc.Hashable):
          # uncacheable. a list, for instance.
          # better to not cache than blow up.
          return self.func(*args)
@@ -45,21 +43,17 @@ class Singleton( object ):
     def init(self, *args, **kwds):
         pass
 
-@memoized
 def save_point( symbol, point ):
-    with open( os.path.join('data', symbol + '.csv'), 'a', newline='') as f:
-        writer = csv.writer( f )
-        writer.writerow( point )
+    ''' record the point to data/<symbol>.csv, in the background - see recorder.py '''
+    recorder.default().record( symbol, point )
 
-def plot( pnl, save, is_multiday, charts_folder ):
+def plot( pnl, save, is_multiday, charts_folder, history=None ):
     ''' Plot buys and sells for each each position, if running for a single day.
         If running in daily_charts mode, saves the images, otherwise just generates and shows them.
         If testing using multiple days, displays equity curve (TODO)
+        Rendering is done by charts.py
     '''
-    if not is_multiday:
-        for symbol, position in pnl.positions.items():
-            df = pd.DataFrame.from_records( position.all_points, index='time_stamp', columns=['time_stamp', 'price'] )                
-            plot_day( symbol, str(df.index[-1]), df, position.buys, position.sells, position.realized_pl + position.mtm_pl, position.total_qty, save, charts_folder )
+    charts.plot( pnl, save, is_multiday, charts_folder, history )
 
 def plot_day( symbol, date, df, buys, sells, pnl, qty, save, charts_folder ):
     ''' Creates a plot of day's prices with both buy and sell markers.
@@ -73,54 +67,12 @@ def plot_day( symbol, date, df, buys, sells, pnl, qty, save, charts_folder ):
             save  - boolean which specifies whether to save the image to a file (default), or show it on the screen
     '''
     date = datetime.strptime( date, '%Y-%m-%d %H:%M:%S' ).date() # convert from string to datetime
-
-    df_buys  = df[df.index.isin([time_stamp for time_stamp, _ in buys])].copy()
-    df_sells = df[df.index.isin([time_stamp for time_stamp, _ in sells])].copy()
-
-    df_buys['desc']  = [desc for _, desc in buys]
-    df_sells['desc'] = [desc for _, desc in sells]
-
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_buys.index, y=df_buys['price'],
-                        mode='markers+text',
-                        marker_size=15,
-                        name='Buy',
-                        text=df_buys['desc'],
-                        textposition="bottom center",
-                        marker=dict(color='green', symbol='triangle-up')))
-    fig.add_trace(go.Scatter(x=df_sells.index, y=df_sells['price'],
-                        mode='markers+text',
-                        name='Sell',
-                        text=df_sells['desc'],
-                        textposition="top center",
-                        marker_size=15,
-                        marker=dict(color='red', symbol='triangle-down')))
-    fig.add_trace(go.Scatter(x=df.index, y=df['price'],
-                        mode='lines',
-                        name='Prices',
-                        line=dict(color='rgb(107,105,172)')))
-
-    fig.update_layout(
-        title="{}    Date: {}, PnL: ${}, Size: {}".format( symbol, date, int(pnl), int(qty) ),
-        xaxis_title="Time",
-        yaxis_title="Price",
-        showlegend=False
-    )
-    
+    fig = charts.figure( symbol, date, df.index.values.astype( 'datetime64[us]' ), df['price'].values, buys, sells, pnl, qty )
     if (save):
-        if not os.path.exists(charts_folder):
-            os.makedirs(charts_folder)
-        filename = os.path.join(charts_folder, '{}_{}.html'.format(date, symbol))
-        fig.write_html(filename)
+        charts.write( fig, os.path.join(charts_folder, '{}_{}.html'.format(date, symbol)) )
     else:
         fig.show()
 
 def combine_charts( directory, combine_pattern):
-    ''' Combine charts in a given directory based on a filename pattern '''
-    outfilename = os.path.join(directory, '{}_combined.html'.format(combine_pattern))
-    with open(outfilename, 'wb') as outfile:
-        for filename in glob.glob(os.path.join(directory, '*{}*.html'.format(combine_pattern))):
-            if filename == outfilename:
-                continue
-            with open(filename, 'rb') as readfile:
-                shutil.copyfileobj(readfile, outfile)
\ No newline at end of file
+    ''' Combine charts in a given directory based on a filename pattern, see charts.combine '''
+    return charts.combine( directory, combine_pattern )
@@ -0,0 +1,444 @@
+''' Vectorized whole-day backtest engine for the built-in rules.
+
+    The built-in rules only look at the price and the timestamp of each point, so instead of one generator send()
+    per bar, every rule is modelled by a kernel that finds the bars it fires on with NumPy array operations over
+    a whole day (or a whole file). The strategy loop then jumps from signal to signal rather than from bar to bar.
+
+    Kernels reproduce the coroutines exactly, including their quirks: a rule that fires swallows the next point
+    it is sent, exit rules only see points while in position, a rule later in the list doesn't see the point an
+    earlier one fired on, and rule state carries over from one run to the next as long as the same rule objects
+    are reused. The engine keeps that state itself, so rule objects used here shouldn't also be driven by the
+    tick loop. Configs using any other coroutine are run by the tick loop instead (see supports()).
+'''
+import datetime
+import logging
+import os
+import weakref
+
+import numpy as np
+
+from   core import Point, execute_signal
+from   data_providers import bar_seconds, bars_from_arrays
+from   coroutines import all_conditions, describe, initial_breakout, stop_loss, stop_profit, time_based
+from   positions import Pnl
+from   signals import Signal
+import storage
+import utils
+
+SECONDS_PER_DAY = storage.SECONDS_PER_DAY
+
+# trading window, same as Strategy: [9:30, 16:00)
+START_TIME = 9*60 + 30
+END_TIME   = 16*60
+
+# initial look-ahead, in points, when searching for the next signal
+WINDOW = 64
+
+# kernel state of every rule object run through the engine
+_states = weakref.WeakKeyDictionary()
+
+
+class Feed( object ):
+    ''' The in-window points of one strategy's time-series, as arrays '''
+    def __init__( self, time_stamps, prices ):
+        minutes = ( time_stamps % SECONDS_PER_DAY ) // 60
+        self.rows   = np.flatnonzero( ( minutes >= START_TIME ) & ( minutes < END_TIME ) ) # position in the time-series
+        self.length = len( time_stamps )
+
+        self.time_stamps = np.asarray( time_stamps[ self.rows ] )
+        self.prices      = np.asarray( prices[ self.rows ], dtype=np.float64 )
+        self.days        = self.time_stamps // SECONDS_PER_DAY
+        self.seconds     = self.time_stamps % SECONDS_PER_DAY
+
+        # end of the run of same-day points each point belongs to
+        breaks = np.append( np.flatnonzero( np.diff( self.days ) ) + 1, len( self.days ) )
+        self.day_ends = np.repeat( breaks, np.diff( np.concatenate( [ [0], breaks ] ) ) )
+
+        self._times = {}
+
+    def __len__( self ):
+        return len( self.prices )
+
+    def at_time( self, hour, minute ):
+        key = ( hour, minute )
+        if key not in self._times:
+            self._times[ key ] = ( self.seconds // 3600 == hour ) & ( self.seconds // 60 % 60 == minute )
+        return self._times[ key ]
+
+    def point( self, i ):
+        return Point( time_stamp=storage.to_datetimes( self.time_stamps[ i:i+1 ] )[0], price=float( self.prices[ i ] ) )
+
+    def points( self ):
+        return [ Point( time_stamp=t, price=p ) for t, p in zip( storage.to_datetimes( self.time_stamps ), self.prices.tolist() ) ]
+
+
+def _alternate( fires ):
+    ''' indices of points that really fire, given a mask of points that would: a rule that fires swallows
+        the next point, so within a run of consecutive candidates only every other one fires
+    '''
+    idx = np.flatnonzero( fires )
+    if len( idx ) < 2:
+        return idx
+    position = np.arange( len( idx ) )
+    run_start = np.maximum.accumulate( np.where( np.diff( idx, prepend=-2 ) != 1, position, 0 ) )
+    return idx[ ( position - run_start ) % 2 == 0 ]
+
+
+class Kernel( object ):
+    ''' Vectorized model of one coroutine. State is an immutable value, so scans can be tried and thrown away '''
+
+    def initial( self ):
+        raise NotImplementedError
+
+    def scan( self, feed, lo, hi, state ):
+        ''' feed points [lo, hi) to the rule: returns [ ( index, desc ) ] of the points it fires on, and its new state '''
+        raise NotImplementedError
+
+    def first( self, feed, lo, hi, state ):
+        ''' ( index, desc ) of the first point in [lo, hi) the rule fires on, or None '''
+        fires, _ = self.scan( feed, lo, hi, state )
+        return fires[0] if fires else None
+
+
+class TimeBased( Kernel ):
+    ''' time_based(hour, minute); state: skip next point '''
+    def __init__( self, hour, minute ):
+        self.hour   = hour
+        self.minute = minute
+        self.desc   = 'hour: {}, minute: {}'.format( hour, minute )
+
+    def initial( self ):
+        return False
+
+    def scan( self, feed, lo, hi, skip ):
+        if skip and lo < hi:
+            lo, skip = lo + 1, False
+        if lo >= hi:
+            return [], skip
+        fires = ( lo + _alternate( feed.at_time( self.hour, self.minute )[ lo:hi ] ) ).tolist()
+        return [ ( i, self.desc ) for i in fires ], bool( fires ) and fires[-1] == hi - 1
+
+
+class Stop( Kernel ):
+    ''' stop_loss(percent) / stop_profit(percent); state: ( initial price, trigger level, skip next point ) '''
+    def __init__( self, percent, loss ):
+        self.percent = percent
+        self.loss    = loss
+
+    def initial( self ):
+        return ( 0, 0, False )
+
+    def scan( self, feed, lo, hi, state, first_only=False ):
+        initial_price, trigger_level, skip = state
+        fires = []
+        i = lo
+        while i < hi:
+            if skip:
+                skip, i = False, i + 1
+                continue
+            if initial_price == 0:
+                # the first point with a price sets the trigger level
+                priced = np.flatnonzero( feed.prices[ i:hi ] != 0 )
+                if not len( priced ):
+                    initial_price, trigger_level, i = 0.0, 0.0, hi
+                    break
+                i += int( priced[0] )
+                initial_price = float( feed.prices[ i ] )
+                if self.loss:
+                    trigger_level = initial_price - initial_price * self.percent
+                else:
+                    trigger_level = initial_price + initial_price * self.percent
+                i += 1
+                continue
+
+            segment = feed.prices[ i:hi ]
+            hits = np.flatnonzero( segment < trigger_level if self.loss else segment > trigger_level )
+            if not len( hits ):
+                break
+            i += int( hits[0] )
+            if self.loss:
+                fires.append( ( i, 'loss exit: broke below {}'.format( trigger_level ) ) )
+            else:
+                fires.append( ( i, 'profit exit: broke above {}'.format( trigger_level ) ) )
+            if first_only:
+                break
+            initial_price, trigger_level, skip = 0, 0, True
+            i += 1
+        return fires, ( initial_price, trigger_level, skip )
+
+    def first( self, feed, lo, hi, state ):
+        fires, _ = self.scan( feed, lo, hi, state, first_only=True )
+        return fires[0] if fires else None
+
+
+class InitialBreakout( Kernel ):
+    ''' initial_breakout(period_length, repeat); state: ( counter, max price, current epoch day, skip next point ) '''
+    START = datetime.datetime( 2020, 4, 5, 9, 30 ) # date doesn't matter, same as the coroutine
+
+    def __init__( self, period_length, repeat=False ):
+        self.period_length = period_length
+        self.repeat        = repeat
+        end = ( self.START + datetime.timedelta( minutes=period_length ) ).time()
+        self.period_end    = end.hour*3600 + end.minute*60 + end.second
+
+    def initial( self ):
+        return ( 0, 0, ( datetime.date( 1900, 1, 1 ) - storage.EPOCH.date() ).days, False )
+
+    def scan( self, feed, lo, hi, state, first_only=False ):
+        counter, max_price, curr_day, skip = state
+        fires = []
+        i = lo
+        while i < hi:
+            if skip:
+                skip, i = False, i + 1
+                continue
+
+            day = int( feed.days[ i ] )
+            if day > curr_day:
+                curr_day, counter, max_price = day, 0, 0
+            end = min( int( feed.day_ends[ i ] ), hi ) # no resets before this point
+
+            if counter < self.period_length:
+                # collect the max of the first period_length points of the opening period
+                in_period = np.flatnonzero( feed.seconds[ i:end ] <= self.period_end )
+                needed = self.period_length - counter
+                taken = in_period[ :needed ]
+                if len( taken ):
+                    max_price = max( max_price, float( np.fmax.reduce( feed.prices[ i + taken ] ) ) )
+                counter += len( taken )
+                i = i + int( taken[-1] ) + 1 if len( in_period ) >= needed else end
+                continue
+
+            breakouts = feed.prices[ i:end ] > max_price
+            if self.repeat:
+                hits = ( i + _alternate( breakouts ) ).tolist()
+                fires.extend( ( hit, 'break out' ) for hit in hits )
+                skip = bool( hits ) and hits[-1] == end - 1
+                i = end
+            else:
+                hits = np.flatnonzero( breakouts )
+                if not len( hits ):
+                    i = end
+                    continue
+                i += int( hits[0] )
+                fires.append( ( i, 'break out' ) )
+                counter, max_price, skip = 0, 0, True
+                i += 1
+            if first_only and fires:
+                break
+        return fires, ( counter, max_price, curr_day, skip )
+
+    def first( self, feed, lo, hi, state ):
+        fires, _ = self.scan( feed, lo, hi, state, first_only=True )
+        return fires[0] if fires else None
+
+
+class AllConditions( Kernel ):
+    ''' all_conditions(elements); state: ( skip next point, children states ) '''
+    def __init__( self, elements ):
+        self.elements = elements
+
+    def initial( self ):
+        return ( False, tuple( element.initial() for element in self.elements ) )
+
+    def scan( self, feed, lo, hi, state, first_only=False ):
+        skip, states = state
+        fires = []
+        i = lo
+        size = WINDOW
+        while i < hi:
+            if skip:
+                skip, i = False, i + 1 # swallowed, children don't see it either
+                continue
+
+            # children's fires are only valid up to our next fire, so look ahead in growing windows
+            end = min( hi, i + size )
+            scans = [ element.scan( feed, i, end, s ) for element, s in zip( self.elements, states ) ]
+            descs = [ dict( element_fires ) for element_fires, _ in scans ]
+            common = set.intersection( *[ set( d ) for d in descs ] ) if descs else set()
+            if not common:
+                states = tuple( s for _, s in scans )
+                i, size = end, size * 2
+                continue
+
+            f = min( common )
+            fires.append( ( f, ' AND '.join( d[ f ] for d in descs ) ) )
+            states = tuple( element.scan( feed, i, f + 1, s )[1] for element, s in zip( self.elements, states ) )
+            skip, i, size = True, f + 1, WINDOW
+            if first_only:
+                break
+        return fires, ( skip, states )
+
+    def first( self, feed, lo, hi, state ):
+        fires, _ = self.scan( feed, lo, hi, state, first_only=True )
+        return fires[0] if fires else None
+
+
+def kernel( cr ):
+    ''' Kernel modelling the coroutine, or None if it isn't a built-in rule '''
+    spec = describe( cr )
+    if spec is None:
+        return None
+    if spec.factory is all_conditions:
+        elements = [ kernel( e ) for e in ( spec.kwargs.get( 'elements' ) or spec.args[0] ) ]
+        return None if None in elements else AllConditions( elements )
+    if spec.factory is time_based:
+        return TimeBased( *spec.args, **spec.kwargs )
+    if spec.factory is initial_breakout:
+        return InitialBreakout( *spec.args, **spec.kwargs )
+    if spec.factory is stop_loss:
+        return Stop( *spec.args, loss=True, **spec.kwargs )
+    if spec.factory is stop_profit:
+        return Stop( *spec.args, loss=False, **spec.kwargs )
+    return None
+
+def _rules( config ):
+    return list( config.entry_rules ) + list( config.exit_rules )
+
+def supports( configs ):
+    ''' can the engine run these configs? every rule has to be a built-in one, used by a single config only '''
+    rules = [ cr for config in configs for cr in _rules( config ) ]
+    return len( set( map( id, rules ) ) ) == len( rules ) and all( kernel( cr ) is not None for cr in rules )
+
+
+class Rules( object ):
+    ''' An ordered rule list of a config, with each rule's kernel and state '''
+    def __init__( self, coroutines ):
+        self.coroutines = coroutines
+        self.kernels    = [ kernel( cr ) for cr in coroutines ]
+        self.states     = [ _states.get( cr ) for cr in coroutines ]
+        self.states     = [ k.initial() if s is None else s for k, s in zip( self.kernels, self.states ) ]
+
+    def first( self, feed, lo, hi ):
+        ''' ( index, position in the list, desc ) of the first signal the list produces in [lo, hi), or None.
+            Searched in growing windows, so finding a signal costs about the distance to it, not to hi
+        '''
+        size = WINDOW
+        while True:
+            end = min( hi, lo + size )
+            best = None
+            for position, ( k, state ) in enumerate( zip( self.kernels, self.states ) ):
+                hit = k.first( feed, lo, best[0] + 1 if best else end, state )
+                if hit and ( best is None or hit[0] < best[0] ):
+                    best = ( hit[0], position, hit[1] )
+            if best or end == hi:
+                return best
+            size *= 4
+
+    def consume( self, feed, lo, index=None, winner=None ):
+        ''' advance states: every rule up to the winner saw [lo, index], the rest only [lo, index) '''
+        for position, ( k, state ) in enumerate( zip( self.kernels, self.states ) ):
+            hi = index + 1 if winner is None or position <= winner else index
+            self.states[ position ] = k.scan( feed, lo, hi, state )[1]
+
+    def save( self ):
+        for cr, state in zip( self.coroutines, self.states ):
+            _states[ cr ] = state
+
+
+def signals( config, feed ):
+    ''' [ ( index, Signal ) ] the strategy would produce on the feed, exactly as Strategy.tick does '''
+    entry    = Rules( config.entry_rules )
+    exit     = Rules( config.exit_rules )
+    eod_exit = Rules( [ time_based( 15, 59 ) ] ) # end-of-day exit hard-coded rule, fresh each run like Strategy's
+
+    result = []
+    in_position = False
+    i, n = 0, len( feed )
+    while i < n:
+        if not in_position:
+            hit = entry.first( feed, i, n )
+            if hit is None:
+                entry.consume( feed, i, n - 1 )
+                eod_exit.consume( feed, i, n - 1 )
+                break
+            index, winner, desc = hit
+            entry.consume( feed, i, index, winner )
+            eod_exit.consume( feed, i, index )
+            result.append( ( index, Signal( feed.point( index ), desc, is_entry=True, equity_pct=config.equity_pct, symbol=config.symbol ) ) )
+        else:
+            # the end-of-day rule is checked before the exit rules
+            eod = eod_exit.first( feed, i, n )
+            hit = exit.first( feed, i, eod[0] if eod else n )
+            if hit is None and eod is None:
+                exit.consume( feed, i, n - 1 )
+                eod_exit.consume( feed, i, n - 1 )
+                break
+            if hit is None:
+                index, desc = eod[0], eod[2]
+                exit.consume( feed, i, index, -1 )
+                # passed on as-is, the way Strategy.tick returns it
+                signal = Signal( feed.point( index ), desc )
+            else:
+                index, winner, desc = hit
+                exit.consume( feed, i, index, winner )
+                signal = Signal( feed.point( index ), desc, is_entry=False, symbol=config.symbol )
+            eod_exit.consume( feed, i, index )
+            result.append( ( index, signal ) )
+
+        in_position = not in_position
+        i = index + 1
+
+    entry.save()
+    exit.save()
+    return result
+
+
+def load_feed( symbol, specific_day=None, bar_size=None ):
+    ''' Feed of the symbol's data, or of the closes of its bars of 'bar_size' '''
+    store = storage.load( symbol )
+    row_ranges = store.day_rows( specific_day ) if specific_day else [ ( 0, len( store ) ) ]
+    time_stamps = np.concatenate( [ store.time_stamps[ a:b ] for a, b in row_ranges ] ) if row_ranges else np.empty( 0, np.int64 )
+    prices      = np.concatenate( [ store.prices[ a:b ] for a, b in row_ranges ] ) if row_ranges else np.empty( 0, np.float64 )
+    if bar_size:
+        bars = bars_from_arrays( time_stamps, prices, bar_seconds( bar_size ) )
+        time_stamps, prices = bars[ 0 ], bars[ 4 ]
+    return Feed( time_stamps, prices )
+
+def run( configs, specific_day=None, cash=25000, commission=0, save_charts=True, charts=True, session=None, merge=False, bar_size=None ):
+    ''' Vectorized equivalent of app.run() in test mode, for configs the engine supports() '''
+    pnl = session.pnl if session is not None else Pnl()
+    pnl.initialize( configs, cash, commission, keep_points=charts )
+
+    # order events the way the tick loop would: ( position, strategy, market data first ). In round-robin the 
+    # position is the row and the signals of a pass execute in config order; with 'merge' it's ( time_stamp, rank
+    # of the symbol ), and each point goes to the strategies on its symbol in config order
+    ranks = {}
+    for config in configs:
+        ranks.setdefault( config.symbol, len( ranks ) )
+    def position( feed, index, symbol ):
+        if merge:
+            return ( int( feed.time_stamps[ index ] ), ranks[ symbol ] )
+        return int( feed.rows[ index ] )
+
+    feeds, events = {}, []
+    for order, config in enumerate( configs ):
+        feed = feeds.get( config.symbol )
+        if feed is None:
+            feed = feeds[ config.symbol ] = load_feed( config.symbol, specific_day, bar_size )
+            if len( feed ):
+                events.append( ( position( feed, -1, config.symbol ), -1, 0, config.symbol ) )
+        for index, signal in signals( config, feed ):
+            events.append( ( position( feed, index, config.symbol ), order, 1, signal ) )
+
+    events.sort( key=lambda event: event[:3] )
+    for _, _, kind, payload in events:
+        if kind == 0:
+            # only the last update decides the mtm pnl
+            feed = feeds[ payload ]
+            pnl.market_data_update( payload, feed.point( len( feed ) - 1 ) )
+            continue
+        trade = execute_signal( payload, pnl )
+        if trade:
+            pnl.handle_fill( trade )
+
+    if charts:
+        for symbol, feed in feeds.items():
+            pnl.positions[ symbol ].all_points = feed.points()
+
+    logging.debug( 'All Done!' )
+    report = pnl.get_report()
+    logging.info( report )
+    if charts:
+        utils.plot( pnl, save_charts, specific_day is None, os.path.join( 'charts', 'testing' ) )
+    return report